@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import sqlite3
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'db'))
+from import_csvs import quote_identifier, list_data_tables
+from finalize_db import open_snapshot, DEFAULT_MMAP_SIZE
+
+DEFAULT_LOOKUPS = 200
+
+# Indexed key used for the "key lookup" queries when the table has it
+DEFAULT_KEY_COLUMN = 'subject_id'
+
+def drop_file_cache(path):
+    """
+    Evicts a database file from the OS page cache so the next read is cold.
+    Returns False where posix_fadvise is not available (e.g. macOS).
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for candidate in (os.path.realpath(path), os.path.realpath(path) + '-wal'):
+        if os.path.exists(candidate):
+            fd = os.open(candidate, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return True
+
+def pick_table(conn):
+    """
+    Returns the table with the most rows (by last rowid)
+    """
+    return max(list_data_tables(conn),
+               key=lambda t: conn.execute(f'SELECT max(rowid) FROM {quote_identifier(t)}').fetchone()[0] or 0)
+
+def sample_lookups(conn, table_name, key_column, count, seed):
+    """
+    Returns (rowids, key values) to look up, drawn from the existing rows
+    """
+    rng = random.Random(seed)
+    max_rowid = conn.execute(f'SELECT max(rowid) FROM {quote_identifier(table_name)}').fetchone()[0] or 0
+    rowids = [rng.randint(1, max_rowid) for _ in range(count)] if max_rowid else []
+    keys = []
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({quote_identifier(table_name)})')]
+    if key_column in columns:
+        keys = [row[0] for row in conn.execute(
+            f'SELECT {quote_identifier(key_column)} FROM {quote_identifier(table_name)} WHERE rowid IN '
+            f'({",".join("?" * len(rowids))})', rowids
+        ) if row[0] is not None]
+    return rowids, keys
+
+def time_queries(conn, sql, params_list):
+    """
+    Runs sql once per parameter tuple and returns the latencies in milliseconds
+    """
+    latencies = []
+    for params in params_list:
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return None
+    return {
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)], 3),
+        'total_ms': round(sum(latencies), 1),
+    }
+
+def run_workload(conn, table_name, key_column, rowids, keys, last_column):
+    table = quote_identifier(table_name)
+    results = {'rowid_lookup': summarize(time_queries(conn, f'SELECT * FROM {table} WHERE rowid = ?',
+                                                      [(r,) for r in rowids]))}
+    if keys:
+        results['key_lookup'] = summarize(time_queries(
+            conn, f'SELECT * FROM {table} WHERE {quote_identifier(key_column)} = ?', [(k,) for k in keys]
+        ))
+    # A full scan that has to decode every record up to its last column
+    scan = time_queries(conn, f'SELECT count(*) FROM {table} WHERE {quote_identifier(last_column)} IS NOT NULL', [()])
+    results['full_scan_ms'] = round(scan[0], 1)
+    return results
+
+def benchmark_database(path, opener, table_name, key_column, rowids, keys, last_column):
+    """
+    Times the workload cold (file evicted from the OS cache, new connection) and then warm
+    (same connection, run again)
+    """
+    cold_supported = drop_file_cache(path)
+    conn = opener(path)
+    try:
+        cold = run_workload(conn, table_name, key_column, rowids, keys, last_column)
+        warm = run_workload(conn, table_name, key_column, rowids, keys, last_column)
+    finally:
+        conn.close()
+    return {'path': str(path), 'size_mb': round(os.path.getsize(os.path.realpath(path)) / 1024 / 1024, 1),
+            'cold': cold if cold_supported else None, 'warm': warm}
+
+def print_results(results):
+    print(f"\n{'database':<10} {'cache':<5} {'rowid p50 ms':>13} {'key p50 ms':>11} {'scan ms':>9}")
+    for label, result in results.items():
+        for cache in ('cold', 'warm'):
+            workload = result[cache]
+            if workload is None:
+                print(f'{label:<10} {cache:<5} {"(not supported on this platform)":>35}')
+                continue
+            key = workload.get('key_lookup') or {}
+            print(f"{label:<10} {cache:<5} {workload['rowid_lookup']['p50_ms']:>13.3f} "
+                  f"{key.get('p50_ms', float('nan')):>11.3f} {workload['full_scan_ms']:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare cold- and warm-cache reads of an imported database and its finalized snapshot')
+    parser.add_argument('before', type=str, help='Database as imported (opened read/write, like the web app does today)')
+    parser.add_argument('after', type=str, help='Finalized snapshot or its symlink (opened with immutable=1 and mmap)')
+    parser.add_argument('--table', type=str, default=None, help='Table to query (default: the one with the most rows)')
+    parser.add_argument('--key-column', type=str, default=DEFAULT_KEY_COLUMN,
+                        help=f'Indexed column for key lookups (default: {DEFAULT_KEY_COLUMN})')
+    parser.add_argument('--lookups', type=int, default=DEFAULT_LOOKUPS,
+                        help=f'Point lookups per run (default: {DEFAULT_LOOKUPS})')
+    parser.add_argument('--mmap-size', type=int, default=DEFAULT_MMAP_SIZE,
+                        help=f'mmap_size for the snapshot (default: {DEFAULT_MMAP_SIZE})')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the looked-up rows (default: 0)')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f'file:{os.path.abspath(args.before)}?mode=ro', uri=True)
+    try:
+        table_name = args.table or pick_table(conn)
+        rowids, keys = sample_lookups(conn, table_name, args.key_column, args.lookups, args.seed)
+        last_column = [row[1] for row in conn.execute(f'PRAGMA table_info({quote_identifier(table_name)})')][-1]
+    finally:
+        conn.close()
+    print(f'Table {table_name}: {len(rowids)} rowid lookups, {len(keys)} {args.key_column} lookups, 1 full scan')
+
+    results = {
+        'before': benchmark_database(args.before, sqlite3.connect, table_name, args.key_column,
+                                     rowids, keys, last_column),
+        'after': benchmark_database(args.after, lambda p: open_snapshot(p, args.mmap_size), table_name,
+                                    args.key_column, rowids, keys, last_column),
+    }
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print_results(results)
+
+if __name__ == "__main__":
+    main()
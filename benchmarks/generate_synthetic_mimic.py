@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import os
+import csv
+import gzip
+import random
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Rows generated per table for each synthetic patient (admissions-based tables scale with admissions)
+ADMISSIONS_PER_PATIENT = 2
+LABEVENTS_PER_ADMISSION = 50
+OMR_PER_PATIENT = 5
+DRGCODES_PER_ADMISSION = 1.5
+
+# Discharge notes are a few KB of free text, like the real discharge.text
+DISCHARGE_NOTE_PARAGRAPHS = (4, 12)
+
+TABLES = ('admissions', 'labevents', 'omr', 'drgcodes', 'discharge')
+
+ADMISSION_TYPES = ['EW EMER.', 'EU OBSERVATION', 'OBSERVATION ADMIT', 'URGENT', 'SURGICAL SAME DAY ADMISSION', 'ELECTIVE']
+ADMISSION_LOCATIONS = ['EMERGENCY ROOM', 'PHYSICIAN REFERRAL', 'TRANSFER FROM HOSPITAL', 'WALK-IN/SELF REFERRAL', 'CLINIC REFERRAL']
+DISCHARGE_LOCATIONS = ['HOME', 'HOME HEALTH CARE', 'SKILLED NURSING FACILITY', 'REHAB', 'DIED', '']
+INSURANCE = ['Medicare', 'Medicaid', 'Private', 'Other']
+RACES = ['WHITE', 'BLACK/AFRICAN AMERICAN', 'HISPANIC/LATINO - PUERTO RICAN', 'ASIAN', 'OTHER', 'UNKNOWN']
+
+# (itemid, unit, normal low, normal high)
+LAB_ITEMS = [
+    (50912, 'mg/dL', 0.5, 1.2),     # Creatinine
+    (50971, 'mEq/L', 3.3, 5.1),     # Potassium
+    (50983, 'mEq/L', 133, 145),     # Sodium
+    (51222, 'g/dL', 11.2, 15.7),    # Hemoglobin
+    (51301, 'K/uL', 4.0, 10.0),     # White blood cells
+    (50931, 'mg/dL', 70, 100),      # Glucose
+    (51265, 'K/uL', 150, 440),      # Platelet count
+]
+
+OMR_RESULTS = [
+    ('Blood Pressure', lambda rng: f"{rng.randint(95, 170)}/{rng.randint(55, 100)}"),
+    ('Weight (Lbs)', lambda rng: f"{rng.uniform(100, 280):.1f}"),
+    ('BMI (kg/m2)', lambda rng: f"{rng.uniform(17, 42):.1f}"),
+    ('Height (Inches)', lambda rng: f"{rng.uniform(58, 77):.0f}"),
+]
+
+DRG_CODES = [
+    ('HCFA', '871', 'SEPTICEMIA OR SEVERE SEPSIS W/O MV >96 HOURS W MCC'),
+    ('HCFA', '291', 'HEART FAILURE & SHOCK W MCC'),
+    ('APR', '720', 'SEPTICEMIA & DISSEMINATED INFECTIONS'),
+    ('APR', '194', 'HEART FAILURE'),
+    ('HCFA', '065', 'INTRACRANIAL HEMORRHAGE OR CEREBRAL INFARCTION W CC OR TPA IN 24 HRS'),
+    ('APR', '139', 'OTHER PNEUMONIA'),
+]
+
+NOTE_SENTENCES = [
+    "Patient presented to the emergency department with shortness of breath and chest pain.",
+    "Labs on admission were notable for elevated creatinine and mild hyperkalemia.",
+    "He was started on IV antibiotics and fluids with improvement of his symptoms.",
+    "She was evaluated by cardiology, who recommended continuing the current regimen.",
+    "Home medications were reconciled and resumed at discharge except as noted below.",
+    "Follow-up with primary care physician within one week of discharge is recommended.",
+    "Discharge condition: mental status clear and coherent, ambulatory with assistance.",
+    "Chest x-ray showed no acute cardiopulmonary process.",
+]
+
+def open_output(path, compress):
+    """
+    Opens a CSV for writing, gzip-compressed when compress is True
+    """
+    if compress:
+        return gzip.open(str(path) + '.gz', 'wt', newline='', encoding='utf-8', compresslevel=6)
+    return open(path, 'w', newline='', encoding='utf-8')
+
+def timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def generate_admissions(rng, patients):
+    """
+    Yields (subject_id, hadm_id, admittime, dischtime) plus the full admissions row
+    """
+    hadm_id = 20000000
+    base = datetime(2110, 1, 1)
+    for subject_id in range(10000000, 10000000 + patients):
+        for _ in range(max(1, round(rng.gauss(ADMISSIONS_PER_PATIENT, 1)))):
+            hadm_id += rng.randint(1, 50)
+            admit = base + timedelta(days=rng.randint(0, 365 * 60), minutes=rng.randint(0, 1440))
+            discharge = admit + timedelta(hours=rng.randint(6, 24 * 20))
+            died = rng.random() < 0.02
+            row = [
+                subject_id, hadm_id, timestamp(admit), timestamp(discharge),
+                timestamp(discharge) if died else '',
+                rng.choice(ADMISSION_TYPES), f"P{rng.randint(10000, 99999)}",
+                rng.choice(ADMISSION_LOCATIONS), 'DIED' if died else rng.choice(DISCHARGE_LOCATIONS),
+                rng.choice(INSURANCE), rng.choice(['ENGLISH', '?']), rng.choice(['MARRIED', 'SINGLE', 'WIDOWED', '']),
+                rng.choice(RACES), '', '', int(died),
+            ]
+            yield (subject_id, hadm_id, admit, discharge), row
+
+def write_tables(output_dir, patients, seed=0, compress=False):
+    """
+    Writes synthetic admissions, labevents, omr, drgcodes and discharge tables.
+    Returns {table: row count}
+    """
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    counts = dict.fromkeys(TABLES, 0)
+
+    files = {table: open_output(output_dir / f'{table}.csv', compress) for table in TABLES}
+    try:
+        writers = {table: csv.writer(f) for table, f in files.items()}
+        writers['admissions'].writerow([
+            'subject_id', 'hadm_id', 'admittime', 'dischtime', 'deathtime', 'admission_type',
+            'admit_provider_id', 'admission_location', 'discharge_location', 'insurance', 'language',
+            'marital_status', 'race', 'edregtime', 'edouttime', 'hospital_expire_flag',
+        ])
+        writers['labevents'].writerow([
+            'labevent_id', 'subject_id', 'hadm_id', 'specimen_id', 'itemid', 'order_provider_id', 'charttime',
+            'storetime', 'value', 'valuenum', 'valueuom', 'ref_range_lower', 'ref_range_upper', 'flag',
+            'priority', 'comments',
+        ])
+        writers['omr'].writerow(['subject_id', 'chartdate', 'seq_num', 'result_name', 'result_value'])
+        writers['drgcodes'].writerow([
+            'subject_id', 'hadm_id', 'drg_type', 'drg_code', 'description', 'drg_severity', 'drg_mortality',
+        ])
+        writers['discharge'].writerow([
+            'note_id', 'subject_id', 'hadm_id', 'note_type', 'note_seq', 'charttime', 'storetime', 'text',
+        ])
+
+        labevent_id = 0
+        last_subject = None
+        for (subject_id, hadm_id, admit, discharge), row in generate_admissions(rng, patients):
+            writers['admissions'].writerow(row)
+            counts['admissions'] += 1
+
+            for _ in range(rng.randint(LABEVENTS_PER_ADMISSION // 2, LABEVENTS_PER_ADMISSION * 3 // 2)):
+                labevent_id += 1
+                itemid, unit, low, high = rng.choice(LAB_ITEMS)
+                value = rng.gauss((low + high) / 2, (high - low) / 2)
+                charttime = admit + timedelta(minutes=rng.randint(0, int((discharge - admit).total_seconds() // 60)))
+                flag = 'abnormal' if not low <= value <= high else ''
+                writers['labevents'].writerow([
+                    labevent_id, subject_id, hadm_id if rng.random() < 0.9 else '', rng.randint(1, 99999999),
+                    itemid, '', timestamp(charttime), timestamp(charttime + timedelta(minutes=rng.randint(5, 120))),
+                    f"{value:.1f}", f"{value:.1f}", unit, low, high, flag,
+                    rng.choice(['ROUTINE', 'STAT', '']), '',
+                ])
+                counts['labevents'] += 1
+
+            if subject_id != last_subject:
+                last_subject = subject_id
+                for seq_num in range(1, rng.randint(1, OMR_PER_PATIENT * 2) + 1):
+                    name, value = rng.choice(OMR_RESULTS)
+                    chartdate = (admit - timedelta(days=rng.randint(0, 900))).strftime('%Y-%m-%d')
+                    writers['omr'].writerow([subject_id, chartdate, seq_num, name, value(rng)])
+                    counts['omr'] += 1
+
+            for _ in range(int(DRGCODES_PER_ADMISSION + rng.random())):
+                drg_type, code, description = rng.choice(DRG_CODES)
+                severity = rng.randint(1, 4) if drg_type == 'APR' else ''
+                mortality = rng.randint(1, 4) if drg_type == 'APR' else ''
+                writers['drgcodes'].writerow([subject_id, hadm_id, drg_type, code, description, severity, mortality])
+                counts['drgcodes'] += 1
+
+            paragraphs = [
+                ' '.join(rng.choice(NOTE_SENTENCES) for _ in range(rng.randint(3, 8)))
+                for _ in range(rng.randint(*DISCHARGE_NOTE_PARAGRAPHS))
+            ]
+            text = 'Name: ___ Unit No: ___\n\n' + '\n\n'.join(paragraphs)
+            writers['discharge'].writerow([
+                f"{subject_id}-DS-{counts['discharge'] + 1}", subject_id, hadm_id, 'DS', 1,
+                timestamp(discharge), timestamp(discharge + timedelta(hours=rng.randint(1, 48))), text,
+            ])
+            counts['discharge'] += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic MIMIC-lite shaped CSV files for benchmarking')
+    parser.add_argument('output_dir', type=str, help='Folder the tables are written to')
+    parser.add_argument('--patients', type=int, default=1000,
+                        help='Number of synthetic patients; every table scales with it (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--gzip', action='store_true', help='Write .csv.gz files instead of .csv')
+    args = parser.parse_args()
+
+    counts = write_tables(args.output_dir, args.patients, seed=args.seed, compress=args.gzip)
+    for table, rows in counts.items():
+        print(f"{table}: {rows:,} rows")
+    print(f"Written to: {os.path.abspath(args.output_dir)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+from generate_synthetic_mimic import write_tables
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+IMPORTER = REPO_ROOT / 'db' / 'import_csvs.py'
+ANALYZER = REPO_ROOT / 'mimic_lite_analysis' / 'hospital_data_analyzer.py'
+RESULTS_PROCESSOR = REPO_ROOT / 'mimic_lite_analysis' / 'process_analysis_results.py'
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# Importer configurations timed by default: name -> extra command-line flags
+IMPORT_VARIANTS = {
+    'pandas': [],
+    'streaming_typed': ['--streaming', '--typed'],
+}
+
+# Metrics where a higher value is better; for everything else lower is better
+HIGHER_IS_BETTER = ('rows_per_sec', 'files_per_minute')
+
+# Metrics compared against a baseline (wall time, memory, size, throughput)
+COMPARED_METRICS = ('seconds', 'peak_rss_mb', 'db_size_mb', 'rows_per_sec', 'files_per_minute')
+
+def run_process(cmd, cwd, log_path):
+    """
+    Runs a command to completion with its output in log_path.
+    Returns (wall seconds, peak RSS in MB of that process)
+    """
+    with open(log_path, 'w') as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(map(str, cmd))} failed with exit code {process.returncode}, see {log_path}")
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    rss_bytes = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return seconds, rss_bytes / 1024 / 1024
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark_import(csv_dir, work_dir, total_rows, variants):
+    """
+    Times db/import_csvs.py on the synthetic CSVs once per importer configuration
+    """
+    results = {}
+    for name, flags in variants.items():
+        db_path = work_dir / f'import_{name}.db'
+        print(f"Import ({name})...")
+        seconds, rss_mb = run_process(
+            [sys.executable, str(IMPORTER), '--csv-dir', str(csv_dir), '--db', str(db_path), *flags],
+            cwd=work_dir, log_path=work_dir / f'import_{name}.log'
+        )
+        results[name] = {
+            'flags': flags,
+            'seconds': round(seconds, 3),
+            'rows': total_rows,
+            'rows_per_sec': round(total_rows / seconds, 1),
+            'peak_rss_mb': round(rss_mb, 1),
+            'db_size_mb': round(os.path.getsize(db_path) / 1024 / 1024, 2),
+        }
+    return results
+
+def benchmark_analyzer(gz_dir, work_dir, workers, latency):
+    """
+    Times hospital_data_analyzer.py against the fake LLM backend.
+    Returns (results, run folder)
+    """
+    analyzer_dir = work_dir / 'analyzer'
+    analyzer_dir.mkdir()
+    print(f"Analyzer (fake backend, {workers} workers, {latency}s latency)...")
+    seconds, rss_mb = run_process(
+        [sys.executable, str(ANALYZER), str(gz_dir), '--backend', 'fake', '--no-cache',
+         '--workers', str(workers), '--fake-latency', str(latency)],
+        cwd=analyzer_dir, log_path=work_dir / 'analyzer.log'
+    )
+    run_folder = next((analyzer_dir / 'annotation_runs').glob('annotation_run_*'))
+
+    sys.path.insert(0, str(ANALYZER.parent))
+    from pipeline_metrics import load_summary, METRICS_FILENAME
+    summary = load_summary(run_folder / METRICS_FILENAME)
+
+    results = {
+        'workers': workers,
+        'fake_latency': latency,
+        'files': summary['files'],
+        'seconds': round(seconds, 3),
+        'files_per_minute': round(summary['files'] / seconds * 60, 2),
+        'peak_rss_mb': round(rss_mb, 1),
+        'stages': {stage: {'p50': stats['p50'], 'p95': stats['p95']} for stage, stats in summary['stages'].items()},
+    }
+    return results, run_folder
+
+def benchmark_process_results(run_folder, work_dir):
+    """
+    Times process_analysis_results.py merging the analyzer's JSON files into its summary CSV
+    """
+    print("process_analysis_results...")
+    seconds, rss_mb = run_process(
+        [sys.executable, str(RESULTS_PROCESSOR), str(run_folder), str(run_folder / 'analysis_summary.csv'),
+         str(work_dir / 'processed_summary.csv')],
+        cwd=work_dir, log_path=work_dir / 'process_results.log'
+    )
+    return {
+        'json_files': len(list(run_folder.rglob('*.json'))),
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': round(rss_mb, 1),
+    }
+
+def flatten(results, prefix=''):
+    """
+    Returns {'import.pandas.seconds': value, ...} for the compared metrics
+    """
+    flat = {}
+    for key, value in results.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + '.'))
+        elif key in COMPARED_METRICS and isinstance(value, (int, float)):
+            flat[path] = value
+    return flat
+
+def compare(current, baseline, tolerance):
+    """
+    Prints each metric next to its baseline value.
+    Returns the metrics that got worse by more than tolerance (a fraction).
+    """
+    current, baseline = flatten(current['results']), flatten(baseline['results'])
+    regressions = []
+    print(f"\n{'metric':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric in sorted(current.keys() & baseline.keys()):
+        old, new = baseline[metric], current[metric]
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+        flag = '  REGRESSION' if worse > tolerance else ''
+        print(f"{metric:<45} {old:>12g} {new:>12g} {change:>+7.0%}{flag}")
+        if worse > tolerance:
+            regressions.append(metric)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the importer and analyzer on synthetic MIMIC-lite data')
+    parser.add_argument('--patients', type=int, default=1000,
+                        help='Synthetic patients; all tables scale with it (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data (default: 0)')
+    parser.add_argument('--import-workers', type=int, default=0,
+                        help='Also time the importer with --workers N (default: off)')
+    parser.add_argument('--analyzer-workers', type=int, default=4,
+                        help='Analyzer --workers (default: 4)')
+    parser.add_argument('--fake-latency', type=float, default=0.05,
+                        help='Seconds per fake LLM request (default: 0.05)')
+    parser.add_argument('--skip', action='append', default=[], choices=['import', 'analyzer', 'process_results'],
+                        help='Skip a benchmark (repeatable)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Results JSON file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', type=str, default=None, metavar='BASELINE_JSON',
+                        help='Compare against an earlier results file and exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative slowdown before a metric counts as a regression (default: 0.2)')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated data and outputs')
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix='chat_muhc_bench_'))
+    try:
+        csv_dir, gz_dir = work_dir / 'csv', work_dir / 'gz'
+        print(f"Generating synthetic data for {args.patients} patients in {work_dir}...")
+        counts = write_tables(csv_dir, args.patients, seed=args.seed)
+        write_tables(gz_dir, args.patients, seed=args.seed, compress=True)
+        csv_mb = sum(f.stat().st_size for f in csv_dir.glob('*.csv')) / 1024 / 1024
+
+        results = {}
+        if 'import' not in args.skip:
+            variants = dict(IMPORT_VARIANTS)
+            if args.import_workers > 1:
+                variants[f'parallel_{args.import_workers}'] = ['--typed', '--workers', str(args.import_workers)]
+            results['import'] = benchmark_import(csv_dir, work_dir, sum(counts.values()), variants)
+
+        run_folder = None
+        if 'analyzer' not in args.skip:
+            results['analyzer'], run_folder = benchmark_analyzer(gz_dir, work_dir, args.analyzer_workers,
+                                                                 args.fake_latency)
+        if 'process_results' not in args.skip and run_folder is not None:
+            results['process_results'] = benchmark_process_results(run_folder, work_dir)
+    finally:
+        if args.keep:
+            print(f"Benchmark files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'version': git_version(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'patients': args.patients,
+            'seed': args.seed,
+            'rows': counts,
+            'csv_mb': round(csv_mb, 2),
+        },
+        'results': results,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(json.dumps(results, indent=4))
+    print(f"Results saved to: {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+import sqlite3
+
+# pyarrow and duckdb are only needed for the analytics store, not for the SQLite import
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+from import_csvs import (sqlite_db, quote_identifier, infer_value_type, load_type_overrides, list_data_tables,
+                         MANIFEST_TABLE, DEFAULT_TYPE_OVERRIDES, DEFAULT_TYPE_SAMPLE_ROWS)
+
+# Parquet files (one folder per table) and the DuckDB file with a view per table,
+# kept in the same folder as the SQLite database they are exported from
+STORE_DIRNAME = 'dc_analytics'
+DUCKDB_FILENAME = 'dc_analytics.duckdb'
+
+# Records which source table state each Parquet folder was exported from
+STORE_MANIFEST = '_store_manifest.json'
+
+# Rows fetched from SQLite and converted to Arrow at a time
+DEFAULT_EXPORT_BATCH_ROWS = 100000
+
+# Parquet layout: rows per row group (the unit DuckDB skips using min/max statistics) and per part file
+DEFAULT_ROW_GROUP_ROWS = 500000
+DEFAULT_ROWS_PER_FILE = 10000000
+
+ZSTD_LEVEL = 3
+
+# MIMIC timestamps and dates, e.g. '2180-05-06 22:23:00' and '2180-05-06'
+TIMESTAMP_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}$')
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# strptime formats of the temporal column types
+TEMPORAL_FORMATS = {'TIMESTAMP': '%Y-%m-%d %H:%M:%S', 'DATE': '%Y-%m-%d'}
+
+def default_store_dir(sqlite_path):
+    return os.path.join(os.path.dirname(os.path.abspath(sqlite_path)), STORE_DIRNAME)
+
+def default_duckdb_path(sqlite_path):
+    return os.path.join(os.path.dirname(os.path.abspath(sqlite_path)), DUCKDB_FILENAME)
+
+def require_dependencies():
+    if pa is None or duckdb is None:
+        raise ImportError('The analytics store needs pyarrow and duckdb: pip install pyarrow duckdb')
+
+def arrow_type(column_type):
+    return {
+        'INTEGER': pa.int64(),
+        'REAL': pa.float64(),
+        'TIMESTAMP': pa.timestamp('s'),
+        'DATE': pa.date32(),
+    }.get(column_type, pa.string())
+
+def infer_store_value_type(value):
+    """
+    Like infer_value_type, but also recognizes timestamps and dates
+    """
+    if TIMESTAMP_PATTERN.match(value):
+        return 'TIMESTAMP'
+    if DATE_PATTERN.match(value):
+        return 'DATE'
+    return infer_value_type(value)
+
+def infer_store_types(conn, table_name, sample_rows=DEFAULT_TYPE_SAMPLE_ROWS, overrides=None):
+    """
+    Maps each column of a SQLite table to INTEGER, REAL, TIMESTAMP, DATE or TEXT.
+    Columns declared INTEGER/REAL (--typed imports) keep their type; TEXT columns are
+    typed from a sample of their values, so all-TEXT pandas imports get numeric and
+    temporal columns too. Overrides from column_types.json win.
+    """
+    info = conn.execute(f'PRAGMA table_info({quote_identifier(table_name)})').fetchall()
+    columns = [row[1] for row in info]
+    declared = {row[1]: (row[2] or '').upper() for row in info}
+
+    # None means "no non-empty value seen yet"
+    seen = dict.fromkeys(columns)
+    column_list = ', '.join(quote_identifier(c) for c in columns)
+    sample = conn.execute(f'SELECT {column_list} FROM {quote_identifier(table_name)} LIMIT ?', (sample_rows,))
+    for row in sample:
+        for column, value in zip(columns, row):
+            if value is None or value == '' or seen[column] == 'TEXT':
+                continue
+            value_type = infer_store_value_type(str(value))
+            if seen[column] is None or seen[column] == value_type:
+                seen[column] = value_type
+            elif {seen[column], value_type} == {'INTEGER', 'REAL'}:
+                seen[column] = 'REAL'
+            else:
+                seen[column] = 'TEXT'
+
+    column_types = {
+        c: declared[c] if declared[c] in ('INTEGER', 'REAL') else (seen[c] or 'TEXT')
+        for c in columns
+    }
+
+    overrides = overrides or {}
+    for scope in ('*', table_name):
+        for column, column_type in overrides.get(scope, {}).items():
+            if column in column_types:
+                column_types[column] = column_type.upper()
+    return column_types
+
+def to_arrow_array(values, column_type):
+    """
+    Converts one column of a batch to Arrow. Empty strings become NULL, as in --typed imports.
+    Returns (array, number of values that did not parse as column_type and were set to NULL).
+    """
+    target = arrow_type(column_type)
+    if column_type in ('INTEGER', 'REAL'):
+        # --typed imports already hold ints/floats
+        try:
+            return pa.array(values, type=target), 0
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+
+    strings = [None if v is None or v == '' else str(v) for v in values]
+    array = pa.array(strings, type=pa.string())
+    if column_type == 'TEXT':
+        return array, 0
+
+    if column_type in TEMPORAL_FORMATS:
+        parsed = pc.strptime(array, format=TEMPORAL_FORMATS[column_type], unit='s', error_is_null=True)
+        if column_type == 'DATE':
+            parsed = parsed.cast(pa.date32())
+        return parsed, parsed.null_count - array.null_count
+
+    try:
+        return pc.cast(array, target), 0
+    except pa.ArrowInvalid:
+        # Some values do not parse (e.g. '1.5' in a column sampled as INTEGER): convert one by one
+        convert = int if column_type == 'INTEGER' else float
+        converted = []
+        for value in strings:
+            try:
+                converted.append(None if value is None else convert(value))
+            except ValueError:
+                converted.append(None)
+        array = pa.array(converted, type=target)
+        return array, array.null_count - strings.count(None)
+
+def iter_record_batches(conn, table_name, column_types, batch_rows, unparsed):
+    """
+    Streams a SQLite table as Arrow record batches, batch_rows rows at a time.
+    unparsed collects, per column, the values that could not be converted.
+    """
+    columns = list(column_types)
+    schema = pa.schema([(c, arrow_type(t)) for c, t in column_types.items()])
+    column_list = ', '.join(quote_identifier(c) for c in columns)
+    cursor = conn.execute(f'SELECT {column_list} FROM {quote_identifier(table_name)}')
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            break
+        arrays = []
+        for column, values in zip(columns, zip(*rows)):
+            array, failed = to_arrow_array(values, column_types[column])
+            if failed:
+                unparsed[column] = unparsed.get(column, 0) + failed
+            arrays.append(array)
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def table_signature(conn, table_name):
+    """
+    Returns a cheap signature of a source table: its definition, last rowid and the
+    import manifest's CSV hash (when imported with --incremental)
+    """
+    definition = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (table_name,)).fetchone()[0]
+    max_rowid = conn.execute(f'SELECT max(rowid) FROM {quote_identifier(table_name)}').fetchone()[0]
+    try:
+        recorded = conn.execute(f'SELECT sha256, imported_at FROM {MANIFEST_TABLE} WHERE table_name = ?',
+                                (table_name,)).fetchone()
+    except sqlite3.OperationalError:
+        recorded = None
+    return {'definition': definition, 'max_rowid': max_rowid, 'import': list(recorded) if recorded else None}
+
+def load_store_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, STORE_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {'tables': {}}
+
+def save_store_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, STORE_MANIFEST)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, path)
+
+def export_table(conn, table_name, store_dir, partition_by=None, batch_rows=DEFAULT_EXPORT_BATCH_ROWS,
+                 row_group_rows=DEFAULT_ROW_GROUP_ROWS, rows_per_file=DEFAULT_ROWS_PER_FILE, type_overrides=None):
+    """
+    Writes a SQLite table to <store_dir>/<table>/ as typed, zstd-compressed, dictionary-encoded
+    Parquet part files, hive-partitioned by partition_by (e.g. itemid=50912/) when given.
+    The new folder is written beside the old one and swapped in when complete.
+    Returns the table's manifest entry.
+    """
+    column_types = infer_store_types(conn, table_name, overrides=type_overrides)
+    if partition_by and partition_by not in column_types:
+        raise ValueError(f'{table_name} has no column {partition_by!r} to partition by')
+
+    table_dir = os.path.join(store_dir, table_name)
+    tmp_dir, old_dir = table_dir + '.__export_tmp', table_dir + '.__export_old'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    schema = pa.schema([(c, arrow_type(t)) for c, t in column_types.items()])
+    signature = table_signature(conn, table_name)
+    unparsed = {}
+    start = time.perf_counter()
+
+    partitioning = None
+    if partition_by:
+        partitioning = ds.partitioning(pa.schema([schema.field(partition_by)]), flavor='hive')
+    ds.write_dataset(
+        iter_record_batches(conn, table_name, column_types, batch_rows, unparsed),
+        tmp_dir,
+        schema=schema,
+        format='parquet',
+        file_options=ds.ParquetFileFormat().make_write_options(
+            compression='zstd', compression_level=ZSTD_LEVEL, use_dictionary=True
+        ),
+        partitioning=partitioning,
+        basename_template='part-{i}.parquet',
+        max_rows_per_file=rows_per_file,
+        min_rows_per_group=min(row_group_rows, batch_rows),
+        max_rows_per_group=row_group_rows,
+        max_partitions=100000,
+    )
+
+    # Swap the finished export in
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.isdir(table_dir):
+        os.rename(table_dir, old_dir)
+    os.rename(tmp_dir, table_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    files = [os.path.join(root, f) for root, _, names in os.walk(table_dir) for f in names]
+    rows = sum(pq.ParquetFile(f).metadata.num_rows for f in files) if files else 0
+    elapsed = time.perf_counter() - start
+    size_mb = sum(os.path.getsize(f) for f in files) / 1024 / 1024
+    print(f'→ {rows:,} rows, {len(files)} file(s), {size_mb:.1f} MB in {elapsed:.1f}s '
+          f'({rows / max(elapsed, 1e-9):,.0f} rows/sec)')
+    for column, count in unparsed.items():
+        print(f'⚠️  {table_name}.{column}: {count:,} value(s) did not parse as '
+              f'{column_types[column]} and were stored as NULL (pin the column to TEXT in column_types.json)')
+
+    return {
+        'signature': signature,
+        'types': column_types,
+        'partition_by': partition_by,
+        'rows': rows,
+        'files': len(files),
+        'exported_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+def parquet_glob(store_dir, table_name):
+    return os.path.join(os.path.abspath(store_dir), table_name, '**', '*.parquet')
+
+def register_views(duckdb_path, store_dir, manifest):
+    """
+    (Re)creates one DuckDB view per exported table over its Parquet files
+    """
+    con = duckdb.connect(duckdb_path)
+    try:
+        for table_name, entry in manifest['tables'].items():
+            hive = ', hive_partitioning = true' if entry.get('partition_by') else ''
+            con.execute(
+                f'CREATE OR REPLACE VIEW {quote_identifier(table_name)} AS '
+                f"SELECT * FROM read_parquet('{parquet_glob(store_dir, table_name)}'{hive})"
+            )
+    finally:
+        con.close()
+
+def export_store(sqlite_path, store_dir=None, duckdb_path=None, tables=None,
+                 partitions=None, rebuild=(), batch_rows=DEFAULT_EXPORT_BATCH_ROWS,
+                 type_overrides_path=DEFAULT_TYPE_OVERRIDES):
+    """
+    Exports the tables of a SQLite database (all of them unless tables is given) to the
+    Parquet store and registers them as DuckDB views. Tables whose signature matches the
+    last export are skipped; rebuild is True or a collection of tables to export regardless.
+    partitions maps table -> partition column. store_dir and duckdb_path default to
+    dc_analytics/ and dc_analytics.duckdb next to the SQLite database.
+    Returns the names of the exported tables.
+    """
+    require_dependencies()
+    store_dir = store_dir or default_store_dir(sqlite_path)
+    duckdb_path = duckdb_path or default_duckdb_path(sqlite_path)
+    os.makedirs(store_dir, exist_ok=True)
+    partitions = partitions or {}
+    type_overrides = load_type_overrides(type_overrides_path)
+    manifest = load_store_manifest(store_dir)
+
+    # write_dataset pulls the record batches from its own thread (one at a time)
+    conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+    exported = []
+    try:
+        available = list_data_tables(conn)
+        for table_name in (tables or available):
+            if table_name not in available:
+                print(f'❌ No table {table_name} in {sqlite_path}')
+                continue
+
+            recorded = manifest['tables'].get(table_name)
+            partition_by = partitions.get(table_name, recorded.get('partition_by') if recorded else None)
+            forced = rebuild is True or table_name in (rebuild or ())
+            if (not forced and recorded and recorded['signature'] == table_signature(conn, table_name)
+                    and recorded.get('partition_by') == partition_by
+                    and os.path.isdir(os.path.join(store_dir, table_name))):
+                print(f'⏭️  {table_name} is up to date in the analytics store')
+                continue
+
+            print(f'📦 Exporting {table_name} to Parquet'
+                  + (f' partitioned by {partition_by}' if partition_by else ''))
+            try:
+                manifest['tables'][table_name] = export_table(conn, table_name, store_dir,
+                                                              partition_by=partition_by,
+                                                              batch_rows=batch_rows,
+                                                              type_overrides=type_overrides)
+            except (ValueError, sqlite3.Error, pa.ArrowException) as e:
+                print(f'❌ Failed to export {table_name}: {e}')
+                continue
+            save_store_manifest(store_dir, manifest)
+            exported.append(table_name)
+    finally:
+        conn.close()
+
+    register_views(duckdb_path, store_dir, manifest)
+    print(f'🦆 {len(manifest["tables"])} table(s) available in {duckdb_path}')
+    return exported
+
+def query(sql, duckdb_path=None, params=None, sqlite_path=sqlite_db):
+    """
+    Runs a SQL query against the analytics store and returns a pandas DataFrame.
+    duckdb_path defaults to the store exported from sqlite_path.
+    """
+    require_dependencies()
+    con = duckdb.connect(duckdb_path or default_duckdb_path(sqlite_path), read_only=True)
+    try:
+        return con.execute(sql, params or []).df()
+    finally:
+        con.close()
+
+def parse_partition_spec(spec):
+    """
+    Parses 'table:column' into (table, column)
+    """
+    table_name, _, column = spec.partition(':')
+    if not table_name or not column:
+        raise ValueError(f'Expected table:column, got {spec!r}')
+    return table_name, column
+
+def main():
+    parser = argparse.ArgumentParser(description='Export SQLite tables to a Parquet/DuckDB analytics store, or query it')
+    parser.add_argument('--db', default=sqlite_db, help=f'Source SQLite database (default: {sqlite_db})')
+    parser.add_argument('--store', default=None, help=f'Parquet folder (default: {STORE_DIRNAME}/ next to the database)')
+    parser.add_argument('--duckdb', default=None,
+                        help=f'DuckDB file holding a view per table (default: {DUCKDB_FILENAME} next to the database)')
+    parser.add_argument('--table', action='append', default=None, help='Only export this table (repeatable)')
+    parser.add_argument('--partition', action='append', default=[], metavar='TABLE:COLUMN',
+                        help='Hive-partition a table by a low-cardinality column (repeatable), e.g. labevents:itemid')
+    parser.add_argument('--batch-rows', type=int, default=DEFAULT_EXPORT_BATCH_ROWS,
+                        help=f'Rows converted to Arrow at a time (default: {DEFAULT_EXPORT_BATCH_ROWS})')
+    parser.add_argument('--type-overrides', default=DEFAULT_TYPE_OVERRIDES,
+                        help='JSON file of per-table column type overrides (default: column_types.json next to this script)')
+    parser.add_argument('--rebuild', action='store_true', help='Export tables even if they look unchanged')
+    parser.add_argument('--query', default=None, help='Run this SQL against the store instead of exporting')
+    args = parser.parse_args()
+
+    try:
+        require_dependencies()
+        partitions = dict(parse_partition_spec(spec) for spec in args.partition)
+    except (ImportError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.query:
+        start = time.perf_counter()
+        result = query(args.query, args.duckdb, sqlite_path=args.db)
+        elapsed = time.perf_counter() - start
+        print(result.to_string(index=False))
+        print(f'{len(result)} row(s) in {elapsed * 1000:.1f} ms')
+        return
+
+    export_store(args.db, args.store, args.duckdb, tables=args.table, partitions=partitions,
+                 rebuild=args.rebuild, batch_rows=args.batch_rows, type_overrides_path=args.type_overrides)
+
+if __name__ == "__main__":
+    main()
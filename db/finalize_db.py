@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import os
+import re
+import time
+import argparse
+import sqlite3
+from datetime import datetime
+
+from import_csvs import sqlite_db
+
+# Larger pages mean fewer overflow pages for long note text and fewer page reads per scan
+DEFAULT_PAGE_SIZE = 16384
+
+# Readers map up to this much of the snapshot into memory instead of copying pages into the SQLite cache
+DEFAULT_MMAP_SIZE = 1024 * 1024 * 1024
+
+# Snapshots kept in the snapshot folder, newest first; the live one is never deleted
+DEFAULT_KEEP_SNAPSHOTS = 3
+
+VALID_PAGE_SIZES = [2 ** n for n in range(9, 17)]
+
+def default_link_path(db_path):
+    """
+    Returns the symlink readers open: dc_data.db -> dc_data.readonly.db
+    """
+    stem, ext = os.path.splitext(db_path)
+    return f'{stem}.readonly{ext or ".db"}'
+
+def default_snapshot_dir(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'snapshots')
+
+def snapshot_pattern(db_path):
+    """
+    Matches the versioned snapshot file names of a database, e.g. dc_data-20250417_151209.db
+    """
+    stem, ext = os.path.splitext(os.path.basename(db_path))
+    return re.compile(rf'^{re.escape(stem)}-\d{{8}}_\d{{6}}{re.escape(ext or ".db")}$')
+
+def open_snapshot(path, mmap_size=DEFAULT_MMAP_SIZE):
+    """
+    Opens a finalized snapshot for reading. immutable=1 tells SQLite the file never
+    changes, so it takes no locks and never checks for other writers; the file is
+    memory-mapped up to mmap_size bytes.
+    """
+    conn = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro&immutable=1', uri=True)
+    conn.execute(f'PRAGMA mmap_size = {int(mmap_size)}')
+    return conn
+
+def build_snapshot(db_path, snapshot_path, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Writes a defragmented copy of db_path with the given page size (VACUUM INTO, so the
+    source is not modified), then runs ANALYZE and PRAGMA optimize on the copy.
+    Returns the snapshot's page size.
+    """
+    source = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        source.execute(f'PRAGMA page_size = {page_size}')
+        start = time.perf_counter()
+        source.execute('VACUUM INTO ?', (snapshot_path,))
+        print(f'🧱 VACUUM INTO snapshot ({time.perf_counter() - start:.1f}s)')
+    finally:
+        source.close()
+
+    conn = sqlite3.connect(snapshot_path, isolation_level=None)
+    try:
+        actual_page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        if actual_page_size != page_size:
+            # Older SQLite versions keep the source page size in VACUUM INTO; rebuild the copy in place
+            conn.execute('PRAGMA journal_mode = DELETE')
+            conn.execute(f'PRAGMA page_size = {page_size}')
+            conn.execute('VACUUM')
+            actual_page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+
+        start = time.perf_counter()
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA optimize')
+        print(f'📊 ANALYZE + optimize ({time.perf_counter() - start:.1f}s)')
+        # Readers open the snapshot read-only, so it must not need a WAL or journal
+        conn.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        conn.close()
+    return actual_page_size
+
+def swap_symlink(link_path, target_path):
+    """
+    Points link_path at target_path atomically (a new symlink renamed over the old one),
+    so readers opening link_path see either the old or the new snapshot, never nothing.
+    Returns the previous target, if any.
+    """
+    previous = os.path.realpath(link_path) if os.path.islink(link_path) else None
+    if os.path.exists(link_path) and not os.path.islink(link_path):
+        raise FileExistsError(f'{link_path} exists and is not a symlink')
+
+    relative_target = os.path.relpath(target_path, os.path.dirname(os.path.abspath(link_path)))
+    tmp_link = f'{link_path}.tmp{os.getpid()}'
+    os.symlink(relative_target, tmp_link)
+    os.replace(tmp_link, link_path)
+    return previous
+
+def prune_snapshots(db_path, snapshot_dir, keep, live_path):
+    """
+    Deletes all but the newest keep snapshots of a database; the live snapshot is always kept
+    """
+    pattern = snapshot_pattern(db_path)
+    snapshots = sorted((f for f in os.listdir(snapshot_dir) if pattern.match(f)), reverse=True)
+    for name in snapshots[keep:]:
+        path = os.path.join(snapshot_dir, name)
+        if os.path.realpath(path) != os.path.realpath(live_path):
+            os.remove(path)
+            print(f'🧹 Removed old snapshot {name}')
+
+def finalize(db_path, link_path=None, snapshot_dir=None, page_size=DEFAULT_PAGE_SIZE,
+             keep=DEFAULT_KEEP_SNAPSHOTS, check=False):
+    """
+    Builds a read-optimized, read-only snapshot of db_path in snapshot_dir and switches
+    link_path to it. Returns the snapshot path.
+    """
+    link_path = link_path or default_link_path(db_path)
+    snapshot_dir = snapshot_dir or default_snapshot_dir(db_path)
+    os.makedirs(snapshot_dir, exist_ok=True)
+
+    stem, ext = os.path.splitext(os.path.basename(db_path))
+    snapshot_path = os.path.join(snapshot_dir, f"{stem}-{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext or '.db'}")
+    if os.path.exists(snapshot_path):
+        raise FileExistsError(f'{snapshot_path} already exists')
+    tmp_path = snapshot_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    actual_page_size = build_snapshot(db_path, tmp_path, page_size)
+
+    if check:
+        conn = sqlite3.connect(tmp_path)
+        result = conn.execute('PRAGMA quick_check').fetchone()[0]
+        conn.close()
+        if result != 'ok':
+            os.remove(tmp_path)
+            raise sqlite3.DatabaseError(f'quick_check failed on the new snapshot: {result}')
+
+    # Make the finished file durable and read-only before anything points at it
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, snapshot_path)
+
+    previous = swap_symlink(link_path, snapshot_path)
+    source_mb = os.path.getsize(db_path) / 1024 / 1024
+    snapshot_mb = os.path.getsize(snapshot_path) / 1024 / 1024
+    print(f'📸 {snapshot_path}: {snapshot_mb:,.1f} MB (source {source_mb:,.1f} MB), page size {actual_page_size}')
+    print(f'🔗 {link_path} -> {os.path.basename(snapshot_path)}'
+          + (f' (was {os.path.basename(previous)})' if previous else ''))
+
+    prune_snapshots(db_path, snapshot_dir, keep, snapshot_path)
+    return snapshot_path
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a read-optimized, read-only snapshot of an imported SQLite database')
+    parser.add_argument('--db', default=sqlite_db, help=f'Imported SQLite database (default: {sqlite_db})')
+    parser.add_argument('--link', default=None,
+                        help='Symlink switched to the new snapshot (default: <db name>.readonly.db next to the database)')
+    parser.add_argument('--snapshot-dir', default=None, help='Folder of versioned snapshots (default: snapshots/ next to the database)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f'Page size of the snapshot in bytes (default: {DEFAULT_PAGE_SIZE})')
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP_SNAPSHOTS,
+                        help=f'Snapshots kept, including the new one (default: {DEFAULT_KEEP_SNAPSHOTS})')
+    parser.add_argument('--check', action='store_true', help='Run PRAGMA quick_check on the snapshot before switching to it')
+    args = parser.parse_args()
+
+    if args.page_size not in VALID_PAGE_SIZES:
+        parser.error('--page-size must be a power of two between 512 and 65536')
+    if args.keep < 1:
+        parser.error('--keep must be at least 1')
+    if not os.path.isfile(args.db):
+        parser.error(f'Database not found at {args.db}')
+
+    finalize(args.db, link_path=args.link, snapshot_dir=args.snapshot_dir, page_size=args.page_size,
+             keep=args.keep, check=args.check)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+import json
+import time
+import hashlib
+import argparse
+import sqlite3
+
+# Default database, as in import_csvs.py
+sqlite_db = './dc_data.db'
+
+# Rows copied into the index per transaction
+DEFAULT_FTS_BATCH_SIZE = 5000
+
+# Porter stemming so 'infection' also finds 'infections'/'infected'; case and accents are folded
+FTS_TOKENIZER = 'porter unicode61 remove_diacritics 2'
+
+# Full-text index tables are named <table><FTS_SUFFIX>
+FTS_SUFFIX = '_fts'
+
+# Metadata table recording which source rows each full-text index was built from
+FTS_MANIFEST_TABLE = '_fts_manifest'
+
+# Source columns returned with each search hit when the table has them
+RESULT_KEY_COLUMNS = ('note_id', 'subject_id', 'hadm_id', 'charttime')
+
+def quote_identifier(name):
+    """
+    Quotes a table or column name for use in SQL statements
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+def fts_table_name(table_name):
+    return table_name + FTS_SUFFIX
+
+def parse_fts_spec(spec):
+    """
+    Parses 'table:column[,column...]' into (table, [columns])
+    """
+    table_name, _, columns = spec.partition(':')
+    columns = [c.strip() for c in columns.split(',') if c.strip()]
+    if not table_name or not columns:
+        raise ValueError(f"Expected table:column[,column...], got {spec!r}")
+    return table_name, columns
+
+def ensure_fts_manifest(conn):
+    """
+    Creates the full-text index manifest table if needed
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {FTS_MANIFEST_TABLE} (
+            fts_table TEXT PRIMARY KEY,
+            source_table TEXT,
+            columns TEXT,
+            row_count INTEGER,
+            min_rowid INTEGER,
+            max_rowid INTEGER,
+            edge_hash TEXT,
+            source_sha256 TEXT,
+            built_at TEXT
+        )
+    """)
+
+def source_sha256(conn, table_name):
+    """
+    Returns the CSV hash recorded by an --incremental import, or None
+    """
+    try:
+        row = conn.execute('SELECT sha256 FROM _import_manifest WHERE table_name = ?', (table_name,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def edge_hash(conn, table_name, columns, rowids):
+    """
+    Hashes the indexed text of the rows with the given rowids.
+    Used to notice when the first/last indexed rows were replaced.
+    """
+    digest = hashlib.sha256()
+    column_list = ', '.join(quote_identifier(c) for c in columns)
+    for rowid in rowids:
+        row = conn.execute(
+            f'SELECT {column_list} FROM {quote_identifier(table_name)} WHERE rowid = ?', (rowid,)
+        ).fetchone()
+        digest.update(json.dumps([rowid, row], default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+def table_signature(conn, table_name, columns):
+    """
+    Returns a cheap signature of a source table: row count, rowid range, a hash of the
+    first and last rows and the import manifest's CSV hash
+    """
+    row_count, min_rowid, max_rowid = conn.execute(
+        f'SELECT count(*), min(rowid), max(rowid) FROM {quote_identifier(table_name)}'
+    ).fetchone()
+    return {
+        'columns': json.dumps(columns),
+        'row_count': row_count,
+        'min_rowid': min_rowid,
+        'max_rowid': max_rowid,
+        'edge_hash': edge_hash(conn, table_name, columns, [min_rowid, max_rowid]),
+        'source_sha256': source_sha256(conn, table_name),
+    }
+
+def plan_fts_update(conn, table_name, columns):
+    """
+    Compares the source table with the manifest.
+    Returns (action, after_rowid) where action is 'skip', 'append' (only rows with
+    rowid > after_rowid are new) or 'rebuild'.
+    Only tables tracked by an --incremental import can be skipped or appended to: the
+    signature hashes just the first and last rows, so without the manifest's CSV hash an
+    edit to any other row would go unnoticed, and such tables are always rebuilt.
+    """
+    fts_table = fts_table_name(table_name)
+    recorded = conn.execute(
+        f'SELECT columns, row_count, min_rowid, max_rowid, edge_hash, source_sha256 '
+        f'FROM {FTS_MANIFEST_TABLE} WHERE fts_table = ?', (fts_table,)
+    ).fetchone()
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts_table,)).fetchone()
+    if not recorded or not exists:
+        return 'rebuild', None
+
+    old_columns, old_count, old_min, old_max, old_hash, old_sha256 = recorded
+    current = table_signature(conn, table_name, columns)
+    if current['source_sha256'] is None:
+        return 'rebuild', None
+    if old_columns != current['columns'] or old_sha256 != current['source_sha256']:
+        return 'rebuild', None
+    if (current['row_count'], current['max_rowid'], current['edge_hash']) == (old_count, old_max, old_hash):
+        return 'skip', None
+
+    # Appended rows: everything up to the old last rowid is untouched
+    if old_max is not None and current['max_rowid'] is not None and current['max_rowid'] > old_max:
+        kept = conn.execute(
+            f'SELECT count(*) FROM {quote_identifier(table_name)} WHERE rowid <= ?', (old_max,)
+        ).fetchone()[0]
+        if kept == old_count and edge_hash(conn, table_name, columns, [old_min, old_max]) == old_hash:
+            return 'append', old_max
+    return 'rebuild', None
+
+def create_fts_table(conn, table_name, columns):
+    """
+    Drops and recreates the external-content FTS5 table of a source table.
+    The index stores only terms; the text itself stays in the source table.
+    """
+    fts_table = fts_table_name(table_name)
+    column_list = ', '.join(quote_identifier(c) for c in columns)
+    conn.execute(f'DROP TABLE IF EXISTS {quote_identifier(fts_table)}')
+    conn.execute(
+        f'CREATE VIRTUAL TABLE {quote_identifier(fts_table)} USING fts5({column_list}, '
+        f"content={quote_identifier(table_name)}, tokenize='{FTS_TOKENIZER}')"
+    )
+
+def populate_fts(conn, table_name, columns, after_rowid=None, batch_size=DEFAULT_FTS_BATCH_SIZE):
+    """
+    Copies source rows with rowid > after_rowid into the index, batch_size rows per
+    transaction, walking the source table in rowid order. Returns the rows indexed.
+    """
+    fts_table = quote_identifier(fts_table_name(table_name))
+    source = quote_identifier(table_name)
+    column_list = ', '.join(quote_identifier(c) for c in columns)
+    last_rowid = after_rowid if after_rowid is not None else -2 ** 63
+    total = 0
+    start = time.perf_counter()
+
+    while True:
+        batch_end = conn.execute(
+            f'SELECT max(rowid), count(*) FROM (SELECT rowid FROM {source} WHERE rowid > ? ORDER BY rowid LIMIT ?)',
+            (last_rowid, batch_size)
+        ).fetchone()
+        if not batch_end[1]:
+            break
+        conn.execute('BEGIN')
+        try:
+            conn.execute(
+                f'INSERT INTO {fts_table} (rowid, {column_list}) '
+                f'SELECT rowid, {column_list} FROM {source} WHERE rowid > ? AND rowid <= ?',
+                (last_rowid, batch_end[0])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        last_rowid = batch_end[0]
+        total += batch_end[1]
+
+    if total:
+        elapsed = time.perf_counter() - start
+        print(f'→ indexed {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/sec)')
+    return total
+
+def build_fts_index(conn, table_name, columns, batch_size=DEFAULT_FTS_BATCH_SIZE, rebuild=False):
+    """
+    Creates or refreshes the full-text index <table>_fts over the given text columns.
+    For tables imported with --incremental, unchanged tables are skipped, appended rows
+    are added to the existing index and anything else is rebuilt from scratch; other
+    tables are always rebuilt. Returns the action taken.
+    """
+    conn.commit()
+    ensure_fts_manifest(conn)
+    action, after_rowid = ('rebuild', None) if rebuild else plan_fts_update(conn, table_name, columns)
+    fts_table = fts_table_name(table_name)
+
+    if action == 'skip':
+        print(f'⏭️  {fts_table} is up to date')
+        return action
+
+    print(f'🔤 {"Updating" if action == "append" else "Building"} {fts_table} over {table_name}({", ".join(columns)})')
+    if action == 'rebuild':
+        create_fts_table(conn, table_name, columns)
+        conn.commit()
+    populate_fts(conn, table_name, columns, after_rowid=after_rowid, batch_size=batch_size)
+
+    # Merge the per-batch segments so queries probe a single b-tree
+    conn.execute(f"INSERT INTO {quote_identifier(fts_table)} ({quote_identifier(fts_table)}) VALUES ('optimize')")
+    signature = table_signature(conn, table_name, columns)
+    conn.execute(
+        f'INSERT OR REPLACE INTO {FTS_MANIFEST_TABLE} '
+        '(fts_table, source_table, columns, row_count, min_rowid, max_rowid, edge_hash, source_sha256, built_at) '
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+        (fts_table, table_name, signature['columns'], signature['row_count'], signature['min_rowid'],
+         signature['max_rowid'], signature['edge_hash'], signature['source_sha256'])
+    )
+    conn.commit()
+    return action
+
+def keyword_query(text):
+    """
+    Turns plain keywords into an FTS5 query that matches rows containing all of them.
+    Each word is quoted so punctuation (e.g. 'sepsis-related') is not parsed as syntax.
+    """
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+def search(conn, table_name, query, limit=10, raw=False, snippet_tokens=16):
+    """
+    Returns the best matches for query in <table>_fts, most relevant first, as dicts with
+    rowid, score (bm25, lower is better), snippet (matches in [brackets]) and the source
+    table's key columns. query is plain keywords, or FTS5 syntax with raw=True.
+    """
+    fts_table = quote_identifier(fts_table_name(table_name))
+    source_columns = {row[1] for row in conn.execute(f'PRAGMA table_info({quote_identifier(table_name)})')}
+    key_columns = [c for c in RESULT_KEY_COLUMNS if c in source_columns]
+    key_list = ''.join(f', s.{quote_identifier(c)}' for c in key_columns)
+
+    rows = conn.execute(
+        f"SELECT f.rowid, bm25({fts_table}), snippet({fts_table}, -1, '[', ']', '…', ?){key_list} "
+        f'FROM {fts_table} f JOIN {quote_identifier(table_name)} s ON s.rowid = f.rowid '
+        f'WHERE {fts_table} MATCH ? ORDER BY bm25({fts_table}) LIMIT ?',
+        (snippet_tokens, query if raw else keyword_query(query), limit)
+    ).fetchall()
+    return [
+        dict(zip(['rowid', 'score', 'snippet'] + key_columns, row))
+        for row in rows
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query SQLite FTS5 full-text indexes over text columns')
+    parser.add_argument('target', help="'table:column[,column...]' to build an index, or 'table' with --query to search")
+    parser.add_argument('--db', default=sqlite_db, help=f'SQLite database (default: {sqlite_db})')
+    parser.add_argument('--query', default=None, help='Search the index of the table for these keywords instead of building it')
+    parser.add_argument('--raw', action='store_true', help='Pass --query as FTS5 query syntax (AND/OR/NOT, "phrases", prefix*)')
+    parser.add_argument('--limit', type=int, default=10, help='Maximum number of search results (default: 10)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_FTS_BATCH_SIZE,
+                        help=f'Rows indexed per transaction (default: {DEFAULT_FTS_BATCH_SIZE})')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index even if the table looks unchanged')
+    args = parser.parse_args()
+
+    # Autocommit mode so transactions are controlled explicitly per batch
+    conn = sqlite3.connect(args.db, isolation_level=None)
+
+    if args.query is not None:
+        table_name = args.target.partition(':')[0]
+        start = time.perf_counter()
+        results = search(conn, table_name, args.query, limit=args.limit, raw=args.raw)
+        elapsed = time.perf_counter() - start
+        for result in results:
+            keys = ' '.join(f'{k}={result[k]}' for k in RESULT_KEY_COLUMNS if k in result)
+            print(f"{result['score']:8.2f}  {keys}\n          {' '.join(result['snippet'].split())}")
+        print(f'{len(results)} result(s) in {elapsed * 1000:.1f} ms')
+    else:
+        try:
+            table_name, columns = parse_fts_spec(args.target)
+        except ValueError as e:
+            parser.error(str(e))
+        build_fts_index(conn, table_name, columns, batch_size=args.batch_size, rebuild=args.rebuild)
+
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,868 @@
+#!/usr/bin/env python3
 import os
-import pandas as pd
+import sys
+import re
+import csv
+import json
+import time
+import hashlib
+import queue
+import argparse
 import sqlite3
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from fts_index import build_fts_index, parse_fts_spec, DEFAULT_FTS_BATCH_SIZE, FTS_MANIFEST_TABLE
 
 # Path to your CSV folder and output DB file
 csv_dir = './dc_data'
 sqlite_db = './dc_data.db'
 
-# Connect to SQLite database (it'll be created if it doesn't exist)
-conn = sqlite3.connect(sqlite_db)
+# Default number of rows per executemany/transaction in streaming mode
+DEFAULT_BATCH_SIZE = 50000
 
-# Loop through all CSV files
-for filename in os.listdir(csv_dir):
-    if filename.endswith('.csv'):
-        table_name = os.path.splitext(filename)[0]
-        file_path = os.path.join(csv_dir, filename)
+# Print a rows/sec progress line every N rows in streaming mode
+DEFAULT_PROGRESS_EVERY = 1000000
 
-        print(f'📥 Importing {filename} into table: {table_name}')
+# Number of rows sampled per CSV when inferring column types
+DEFAULT_TYPE_SAMPLE_ROWS = 10000
+
+# Per-table column type overrides for ambiguous columns (e.g. codes with leading zeros)
+DEFAULT_TYPE_OVERRIDES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'column_types.json')
+
+SQLITE_TYPES = ('INTEGER', 'REAL', 'TEXT')
+
+# Integers and reals without leading zeros (so codes like '0010' stay TEXT);
+# integers must also fit in SQLite's 64-bit INTEGER
+INTEGER_PATTERN = re.compile(r'^[+-]?(0|[1-9]\d{0,17})$')
+REAL_PATTERN = re.compile(r'^[+-]?((0|[1-9]\d*)(\.\d*)?|\.\d+)([eE][+-]?\d+)?$')
+
+# Page cache used by the single writer connection during parallel bulk loads
+DEFAULT_CACHE_SIZE_MB = 1024
+
+# Metadata table recording which source file each table was last built from
+MANIFEST_TABLE = '_import_manifest'
+
+# Suffix of the staging table a changed CSV is loaded into before being swapped in
+SHADOW_SUFFIX = '__import_shadow'
+
+# Join/filter key columns that get a single-column index in every table that has them
+INDEX_KEY_COLUMNS = ('subject_id', 'hadm_id', 'stay_id', 'itemid', 'admission_id')
+
+# Multi-column indexes built when a table has all of the listed columns
+COMPOSITE_INDEXES = [
+    ('subject_id', 'hadm_id'),
+    ('subject_id', 'admission_id'),
+    ('hadm_id', 'itemid'),
+    ('itemid', 'charttime'),
+]
+
+# Queries whose EXPLAIN QUERY PLAN is printed before and after indexing.
+# Queries against tables that do not exist in the database are skipped.
+DEFAULT_EXPLAIN_QUERIES = [
+    {'sql': 'SELECT * FROM discharge WHERE subject_id = ? AND hadm_id = ?', 'params': [10000032, 22595853]},
+    {'sql': 'SELECT * FROM discharge WHERE subject_id = ? AND admission_id = ?', 'params': [10000032, 22595853]},
+    {'sql': 'SELECT a.hadm_id, d.icd_code FROM admissions a JOIN diagnoses_icd d ON d.hadm_id = a.hadm_id '
+            'WHERE a.subject_id = ?', 'params': [10000032]},
+    {'sql': 'SELECT valuenum FROM labevents WHERE itemid = ? AND charttime >= ?',
+     'params': [50912, '2180-01-01']},
+]
+
+def quote_identifier(name):
+    """
+    Quotes a table or column name for use in SQL statements
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+def dedupe_columns(columns):
+    """
+    Renames repeated header names the way pandas.read_csv does: a, a -> a, a.1
+    """
+    header = set(columns)
+    counts = {}
+    deduped = []
+    for column in columns:
+        original = column
+        count = counts.get(column, 0)
+        while count > 0:
+            counts[original] = count + 1
+            column = f'{original}.{count}'
+            # Skip names that appear later in the header, so a, a, a.1 -> a, a.2, a.1
+            count = count + 1 if column in header else counts.get(column, 0)
+        deduped.append(column)
+        counts[column] = count + 1
+    return deduped
+
+def raise_csv_field_limit():
+    """
+    Allows very large fields (e.g. discharge note text) in the csv module
+    """
+    limit = sys.maxsize
+    while True:
+        try:
+            csv.field_size_limit(limit)
+            return
+        except OverflowError:
+            limit = limit // 10
+
+def import_table_pandas(conn, file_path, table_name):
+    """
+    Loads a whole CSV into memory with pandas and writes it in one go
+    """
+    # Load the CSV into a pandas DataFrame
+    df = pd.read_csv(file_path, dtype=str).fillna('')  # keep all as text for safety
+
+    print(f'→ {len(df)} rows, columns: {list(df.columns)}')
+
+    # Import to SQLite
+    df.to_sql(table_name, conn, if_exists='replace', index=False)
+
+def load_type_overrides(path):
+    """
+    Loads column type overrides from a JSON file shaped like
+    {"table": {"column": "TEXT"}, "*": {"column": "TEXT"}}, where "*" applies to every table
+    """
+    if not path or not os.path.isfile(path):
+        return {}
+
+    with open(path, 'r') as f:
+        overrides = json.load(f)
+
+    for table, columns in overrides.items():
+        for column, column_type in columns.items():
+            if str(column_type).upper() not in SQLITE_TYPES:
+                raise ValueError(f'{path}: invalid type {column_type!r} for {table}.{column}')
+    return overrides
+
+def infer_value_type(value):
+    """
+    Returns the narrowest SQLite type a non-empty CSV value fits in
+    """
+    if INTEGER_PATTERN.match(value):
+        return 'INTEGER'
+    if REAL_PATTERN.match(value):
+        return 'REAL'
+    return 'TEXT'
+
+def infer_column_types(file_path, table_name, sample_rows=DEFAULT_TYPE_SAMPLE_ROWS, overrides=None):
+    """
+    Samples the first rows of a CSV and maps each column to INTEGER, REAL or TEXT.
+    Empty values are ignored (they become NULL); columns with no values fall back to TEXT.
+    """
+    with open(file_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        columns = next(reader, None)
+        if columns is None:
+            return {}
+        columns = dedupe_columns(columns)
+        # None means "no non-empty value seen yet"
+        seen = [None] * len(columns)
+
+        for i, row in enumerate(reader):
+            if i >= sample_rows:
+                break
+            for j, value in enumerate(row[:len(columns)]):
+                if value == '' or seen[j] == 'TEXT':
+                    continue
+                value_type = infer_value_type(value)
+                if seen[j] is None or value_type == 'TEXT' or (seen[j], value_type) == ('INTEGER', 'REAL'):
+                    seen[j] = value_type
+
+    column_types = {c: (t or 'TEXT') for c, t in zip(columns, seen)}
+
+    overrides = overrides or {}
+    for scope in ('*', table_name):
+        for column, column_type in overrides.get(scope, {}).items():
+            if column in column_types:
+                column_types[column] = column_type.upper()
+
+    return column_types
+
+def make_converter(column_type):
+    """
+    Returns a function that turns a CSV string into a value for the given column type.
+    Empty strings become NULL; values that do not parse are kept as text.
+    """
+    def to_integer(value):
+        if value == '':
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return value
+
+    def to_real(value):
+        if value == '':
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+    def to_text(value):
+        return None if value == '' else value
+
+    return {'INTEGER': to_integer, 'REAL': to_real}.get(column_type, to_text)
+
+def create_table(conn, table_name, columns, column_types=None):
+    """
+    Drops and recreates a table with one column per CSV column.
+    Columns are TEXT unless column_types gives a type for them.
+    Repeated column names are renamed like pandas does (a, a.1).
+    """
+    column_types = column_types or {}
+    column_defs = ', '.join(
+        f'{quote_identifier(c)} {column_types.get(c, "TEXT")}' for c in dedupe_columns(columns)
+    )
+    conn.execute(f'DROP TABLE IF EXISTS {quote_identifier(table_name)}')
+    conn.execute(f'CREATE TABLE {quote_identifier(table_name)} ({column_defs})')
+
+def iter_csv_batches(reader, num_columns, batch_size, converters=None):
+    """
+    Yields lists of at most batch_size rows from a csv reader.
+    Short rows are padded with empty strings, mirroring fillna('').
+    If converters is given, each value is passed through its column's converter.
+    """
+    batch = []
+    for row in reader:
+        if len(row) != num_columns:
+            if not row:
+                continue
+            if len(row) > num_columns:
+                raise ValueError(
+                    f'line {reader.line_num}: expected {num_columns} fields, saw {len(row)}'
+                )
+            row = row + [''] * (num_columns - len(row))
+        if converters:
+            row = [convert(value) for convert, value in zip(converters, row)]
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_table_streaming(conn, file_path, table_name, batch_size=DEFAULT_BATCH_SIZE,
+                           progress_every=DEFAULT_PROGRESS_EVERY, column_types=None):
+    """
+    Reads a CSV row by row with the csv module and inserts it with batched
+    executemany calls, one explicit transaction per batch, so memory use is
+    bounded by batch_size regardless of file size.
+    If column_types is given, columns get those SQLite types and empty values become NULL.
+    Returns the number of rows imported.
+    """
+    with open(file_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        try:
+            columns = dedupe_columns(next(reader))
+        except StopIteration:
+            raise ValueError('file is empty (no header row)')
+
+        conn.execute('BEGIN')
+        try:
+            create_table(conn, table_name, columns, column_types)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        converters = None
+        if column_types:
+            converters = [make_converter(column_types.get(c, 'TEXT')) for c in columns]
+
+        placeholders = ', '.join('?' for _ in columns)
+        insert_sql = f'INSERT INTO {quote_identifier(table_name)} VALUES ({placeholders})'
+
+        if column_types:
+            typed_columns = [f'{c} {column_types.get(c, "TEXT")}' for c in columns]
+            print(f'→ columns: {typed_columns}')
+        else:
+            print(f'→ columns: {columns}')
+
+        start = time.perf_counter()
+        total_rows = 0
+        next_report = progress_every
+        for batch in iter_csv_batches(reader, len(columns), batch_size, converters):
+            conn.execute('BEGIN')
+            try:
+                conn.executemany(insert_sql, batch)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            total_rows += len(batch)
+
+            if progress_every and total_rows >= next_report:
+                elapsed = time.perf_counter() - start
+                print(f'   … {total_rows:,} rows ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)')
+                next_report += progress_every
+
+        elapsed = time.perf_counter() - start
+        print(f'→ {total_rows:,} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)')
+        return total_rows
+
+def find_csv_files(directory):
+    """
+    Returns (filename, table_name, file_path) for every CSV in a folder
+    """
+    return [
+        (filename, os.path.splitext(filename)[0], os.path.join(directory, filename))
+        for filename in os.listdir(directory)
+        if filename.endswith('.csv')
+    ]
+
+def apply_bulk_load_pragmas(conn, cache_size_mb=DEFAULT_CACHE_SIZE_MB):
+    """
+    Trades durability for write speed while the database is being rebuilt
+    """
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute(f'PRAGMA cache_size = {-cache_size_mb * 1024}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+
+def restore_safe_pragmas(conn):
+    """
+    Flushes the WAL back into the main file and returns to durable, single-file settings
+    """
+    conn.execute('PRAGMA synchronous = FULL')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.execute('PRAGMA journal_mode = DELETE')
+
+# Queue shared with parse workers, set by init_parse_worker in each worker process
+_batch_queue = None
+
+def init_parse_worker(batch_queue):
+    """
+    Process pool initializer: stores the batch queue and allows large CSV fields
+    """
+    global _batch_queue
+    _batch_queue = batch_queue
+    raise_csv_field_limit()
+
+def parse_csv_worker(file_path, table_name, batch_size, typed, type_sample_rows, type_overrides):
+    """
+    Runs in a worker process: parses and type-converts one CSV and sends its rows
+    to the writer as ('start' | 'rows' | 'done' | 'error', table_name, payload) messages
+    """
+    try:
+        column_types = None
+        if typed:
+            column_types = infer_column_types(file_path, table_name,
+                                              sample_rows=type_sample_rows,
+                                              overrides=type_overrides)
+
+        with open(file_path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            columns = next(reader, None)
+            if columns is None:
+                raise ValueError('file is empty (no header row)')
+            columns = dedupe_columns(columns)
+            _batch_queue.put(('start', table_name, (columns, column_types)))
+
+            converters = None
+            if column_types:
+                converters = [make_converter(column_types.get(c, 'TEXT')) for c in columns]
+
+            for batch in iter_csv_batches(reader, len(columns), batch_size, converters):
+                _batch_queue.put(('rows', table_name, batch))
 
+        _batch_queue.put(('done', table_name, None))
+    except Exception as e:
+        _batch_queue.put(('error', table_name, str(e)))
+
+def write_parallel_message(conn, kind, table_name, payload, insert_sql, row_counts):
+    """
+    Applies one 'start' or 'rows' message from a parse worker on the writer connection
+    """
+    if kind == 'start':
+        columns, column_types = payload
+        conn.execute('BEGIN')
+        try:
+            create_table(conn, table_name, columns, column_types)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        placeholders = ', '.join('?' for _ in columns)
+        insert_sql[table_name] = f'INSERT INTO {quote_identifier(table_name)} VALUES ({placeholders})'
+        row_counts[table_name] = 0
+    elif kind == 'rows':
+        conn.execute('BEGIN')
         try:
-            # Load the CSV into a pandas DataFrame
-            df = pd.read_csv(file_path, dtype=str).fillna('')  # keep all as text for safety
+            conn.executemany(insert_sql[table_name], payload)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        row_counts[table_name] += len(payload)
+
+def import_tables_parallel(conn, csv_files, workers, batch_size=DEFAULT_BATCH_SIZE,
+                           typed=False, type_sample_rows=DEFAULT_TYPE_SAMPLE_ROWS,
+                           type_overrides=None, cache_size_mb=DEFAULT_CACHE_SIZE_MB,
+                           on_table_done=None):
+    """
+    Parses CSVs in a process pool and writes every batch through this single connection.
+    The queue is bounded so parsed-but-unwritten rows never exceed a few batches per worker.
+    on_table_done(table_name, row_count) is called on the writer connection once a table is fully loaded.
+    A table that fails in the writer is reported and the rest of its batches are discarded;
+    the other tables carry on. Returns the list of table names that were imported successfully.
+    """
+    batch_queue = multiprocessing.Queue(maxsize=workers * 2)
+
+    # Largest files first so the longest parse starts as early as possible
+    csv_files = sorted(csv_files, key=lambda f: os.path.getsize(f[2]), reverse=True)
+
+    apply_bulk_load_pragmas(conn, cache_size_mb)
+
+    insert_sql = {}
+    row_counts = {}
+    started_at = {}
+    imported = []
+    start = time.perf_counter()
+
+    failed = set()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_parse_worker,
+                               initargs=(batch_queue,))
+    futures = []
+    try:
+        futures = [
+            pool.submit(parse_csv_worker, file_path, table_name, batch_size,
+                        typed, type_sample_rows, type_overrides)
+            for _, table_name, file_path in csv_files
+        ]
+        for filename, table_name, _ in csv_files:
+            print(f'📥 Queued {filename} for table: {table_name}')
+
+        remaining = len(csv_files)
+        while remaining:
+            try:
+                kind, table_name, payload = batch_queue.get(timeout=1)
+            except queue.Empty:
+                # A worker that died without reporting would otherwise hang the writer
+                crashed = [f for f in futures if f.done() and f.exception() is not None]
+                if crashed:
+                    raise RuntimeError(f'parse worker failed: {crashed[0].exception()}')
+                continue
+
+            if kind in ('done', 'error'):
+                remaining -= 1
+            if table_name in failed:
+                # The writer already gave up on this table; throw away the rest of its batches
+                continue
+            if kind == 'error':
+                print(f'❌ Failed to import {table_name}: {payload}')
+                continue
+
+            try:
+                write_parallel_message(conn, kind, table_name, payload, insert_sql, row_counts)
+                if kind == 'start':
+                    started_at[table_name] = time.perf_counter()
+                elif kind == 'done':
+                    rows = row_counts[table_name]
+                    if on_table_done:
+                        on_table_done(table_name, rows)
+                    elapsed = time.perf_counter() - started_at[table_name]
+                    print(f'✅ Imported table: {table_name} '
+                          f'({rows:,} rows, {rows / max(elapsed, 1e-9):,.0f} rows/sec)')
+                    imported.append(table_name)
+            except Exception as e:
+                failed.add(table_name)
+                print(f'❌ Failed to import {table_name}: {e}')
+    finally:
+        for future in futures:
+            future.cancel()
+        # Workers still running may be blocked on the full queue; keep emptying it until they exit
+        while not all(f.done() for f in futures):
+            try:
+                batch_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        pool.shutdown(wait=True)
+        restore_safe_pragmas(conn)
+
+    total_rows = sum(row_counts[table_name] for table_name in imported)
+    elapsed = time.perf_counter() - start
+    print(f'\n→ {total_rows:,} rows across {len(imported)} tables in {elapsed:.1f}s '
+          f'({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)\n')
+    return imported
+
+def file_fingerprint(file_path, with_hash=True):
+    """
+    Returns the size, mtime and (optionally) SHA-256 of a source file
+    """
+    stat = os.stat(file_path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': None}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+def ensure_manifest(conn):
+    """
+    Creates the import manifest table if needed
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            source_path TEXT,
+            size INTEGER,
+            mtime REAL,
+            sha256 TEXT,
+            row_count INTEGER,
+            imported_at TEXT,
+            options TEXT
+        )
+    """)
+    # Manifests written before import options were recorded
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({MANIFEST_TABLE})')]
+    if 'options' not in columns:
+        conn.execute(f'ALTER TABLE {MANIFEST_TABLE} ADD COLUMN options TEXT')
+
+def table_exists(conn, table_name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+    ).fetchone() is not None
+
+def drop_stale_shadow_tables(conn):
+    """
+    Drops staging tables left behind by an interrupted run
+    """
+    stale = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?", (f'%{SHADOW_SUFFIX}',)
+    )]
+    for name in stale:
+        print(f'🧹 Dropping leftover staging table: {name}')
+        conn.execute(f'DROP TABLE IF EXISTS {quote_identifier(name)}')
+
+def import_options(table_name, typed=False, type_sample_rows=DEFAULT_TYPE_SAMPLE_ROWS, type_overrides=None):
+    """
+    Returns the options that decide how a table is built, as a JSON string stored in the
+    manifest: a table imported with other options is rebuilt even if its CSV is unchanged
+    """
+    options = {'typed': typed}
+    if typed:
+        type_overrides = type_overrides or {}
+        options['type_sample_rows'] = type_sample_rows
+        options['type_overrides'] = {scope: type_overrides[scope] for scope in ('*', table_name)
+                                     if scope in type_overrides}
+    return json.dumps(options, sort_keys=True)
+
+def plan_incremental_imports(conn, csv_files, typed=False, type_sample_rows=DEFAULT_TYPE_SAMPLE_ROWS,
+                             type_overrides=None):
+    """
+    Splits CSVs into those whose table is up to date and those that need rebuilding.
+    Tables built with other import options (see import_options) are always rebuilt.
+    Otherwise, files whose size and mtime match the manifest are skipped without hashing,
+    and the content hash decides for the rest. Returns (to_import, fingerprints) where
+    fingerprints maps table_name to the fingerprint to record after a rebuild.
+    """
+    to_import = []
+    fingerprints = {}
+
+    for filename, table_name, file_path in csv_files:
+        recorded = conn.execute(
+            f'SELECT size, mtime, sha256, options FROM {MANIFEST_TABLE} WHERE table_name = ?', (table_name,)
+        ).fetchone()
+        current = file_fingerprint(file_path, with_hash=False)
+        options = import_options(table_name, typed, type_sample_rows, type_overrides)
+
+        if recorded and table_exists(conn, table_name):
+            size, mtime, sha256, recorded_options = recorded
+            if recorded_options != options:
+                print(f'🔄 {table_name} was imported with other options; rebuilding')
+            elif (size, mtime) == (current['size'], current['mtime']):
+                print(f'⏭️  {table_name} is up to date')
+                continue
+            else:
+                current = file_fingerprint(file_path)
+                if current['sha256'] == sha256:
+                    # Touched but not modified: remember the new mtime so the next run skips hashing
+                    conn.execute(f'UPDATE {MANIFEST_TABLE} SET mtime = ? WHERE table_name = ?',
+                                 (current['mtime'], table_name))
+                    print(f'⏭️  {table_name} is up to date (content unchanged)')
+                    continue
+
+        if current['sha256'] is None:
+            current = file_fingerprint(file_path)
+        fingerprints[table_name] = dict(current, source_path=file_path, options=options)
+        to_import.append((filename, table_name, file_path))
+
+    return to_import, fingerprints
+
+def swap_in_shadow_table(conn, table_name, fingerprint, row_count):
+    """
+    Atomically replaces a table with its freshly loaded staging copy and records it in the manifest
+    """
+    shadow_name = table_name + SHADOW_SUFFIX
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS {quote_identifier(table_name)}')
+        conn.execute(f'ALTER TABLE {quote_identifier(shadow_name)} RENAME TO {quote_identifier(table_name)}')
+        conn.execute(
+            f'INSERT OR REPLACE INTO {MANIFEST_TABLE} '
+            '(table_name, source_path, size, mtime, sha256, row_count, imported_at, options) '
+            "VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?)",
+            (table_name, fingerprint['source_path'], fingerprint['size'], fingerprint['mtime'],
+             fingerprint['sha256'], row_count, fingerprint['options'])
+        )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+def is_index_column(column):
+    """
+    Returns True for join keys and *time/*date columns used in range filters
+    """
+    name = column.lower()
+    return name in INDEX_KEY_COLUMNS or name.endswith('time') or name.endswith('date')
+
+def plan_indexes(conn, table_name):
+    """
+    Returns the list of column tuples to index for a table
+    """
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({quote_identifier(table_name)})')]
+    lowered = {c.lower(): c for c in columns}
+
+    plans = [(c,) for c in columns if is_index_column(c)]
+    for composite in COMPOSITE_INDEXES:
+        if all(c in lowered for c in composite):
+            plans.append(tuple(lowered[c] for c in composite))
+    return plans
+
+def list_data_tables(conn):
+    """
+    Returns the imported tables, leaving out metadata tables, staging tables and
+    full-text index tables with their shadow tables (<name>_data, <name>_idx, ...)
+    """
+    rows = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    virtual = [name for name, sql in rows if (sql or '').upper().startswith('CREATE VIRTUAL TABLE')]
+    return [name for name, _ in rows
+            if name not in (MANIFEST_TABLE, FTS_MANIFEST_TABLE) and name not in virtual
+            and not name.endswith(SHADOW_SUFFIX)
+            and not any(name.startswith(v + '_') for v in virtual)]
+
+def build_indexes(conn):
+    """
+    Creates single-column and composite indexes on key columns of every table, then runs ANALYZE.
+    Returns the number of indexes created.
+    """
+    tables = list_data_tables(conn)
+
+    created = 0
+    for table_name in tables:
+        for columns in plan_indexes(conn, table_name):
+            index_name = f'idx_{table_name}_{"_".join(columns)}'
+            column_list = ', '.join(quote_identifier(c) for c in columns)
+            start = time.perf_counter()
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {quote_identifier(index_name)} '
+                f'ON {quote_identifier(table_name)} ({column_list})'
+            )
+            conn.commit()
+            created += 1
+            print(f'🔑 {index_name} ({time.perf_counter() - start:.1f}s)')
 
-            print(f'→ {len(df)} rows, columns: {list(df.columns)}')
+    print('📊 Running ANALYZE...')
+    conn.execute('ANALYZE')
+    conn.commit()
+    return created
 
-            # Import to SQLite
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
+def load_explain_queries(path):
+    """
+    Loads canonical queries from a JSON list of SQL strings or {"sql": ..., "params": [...]} objects
+    """
+    if not path:
+        return DEFAULT_EXPLAIN_QUERIES
+
+    with open(path, 'r') as f:
+        queries = json.load(f)
+    return [q if isinstance(q, dict) else {'sql': q, 'params': []} for q in queries]
+
+def explain_queries(conn, queries):
+    """
+    Returns {sql: [plan detail lines]} for each query that can be planned against this database
+    """
+    plans = {}
+    for query in queries:
+        sql = query['sql']
+        try:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', query.get('params', [])).fetchall()
+        except sqlite3.Error:
+            # Table or column missing in this database
+            continue
+        plans[sql] = [row[-1] for row in rows]
+    return plans
+
+def print_query_plans(before, after):
+    """
+    Prints before/after EXPLAIN QUERY PLAN output for each canonical query
+    """
+    for sql, after_plan in after.items():
+        print(f'🔎 {sql}')
+        print(f'   before: {"; ".join(before.get(sql, []))}')
+        print(f'   after:  {"; ".join(after_plan)}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Import a folder of CSV files into SQLite')
+    parser.add_argument('--csv-dir', default=csv_dir, help=f'Folder containing CSV files (default: {csv_dir})')
+    parser.add_argument('--db', default=sqlite_db, help=f'Output SQLite database (default: {sqlite_db})')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Stream rows with the csv module and batched inserts instead of loading whole files with pandas')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Rows per insert batch/transaction in streaming mode (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--progress-every', type=int, default=DEFAULT_PROGRESS_EVERY,
+                        help=f'Print a rows/sec progress line every N rows in streaming mode, 0 to disable (default: {DEFAULT_PROGRESS_EVERY})')
+    parser.add_argument('--typed', action='store_true',
+                        help='Infer INTEGER/REAL/TEXT column types from a sample and store empty values as NULL (implies --streaming)')
+    parser.add_argument('--type-sample-rows', type=int, default=DEFAULT_TYPE_SAMPLE_ROWS,
+                        help=f'Rows sampled per CSV for type inference (default: {DEFAULT_TYPE_SAMPLE_ROWS})')
+    parser.add_argument('--type-overrides', default=DEFAULT_TYPE_OVERRIDES,
+                        help='JSON file of per-table column type overrides (default: column_types.json next to this script)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parse CSVs in this many processes feeding a single SQLite writer (implies --streaming; default: 1)')
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help=f'SQLite page cache for the writer during parallel loads (default: {DEFAULT_CACHE_SIZE_MB})')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip tables whose CSV is unchanged since the last import; rebuild changed ones in a staging table and swap them in (implies --streaming)')
+    parser.add_argument('--build-indexes', action='store_true',
+                        help='After importing, index join/filter key columns and run ANALYZE')
+    parser.add_argument('--index-only', action='store_true',
+                        help='Skip importing and only run the indexing stage on an existing database')
+    parser.add_argument('--explain-queries', default=None,
+                        help='JSON file of canonical queries to EXPLAIN before and after indexing (default: built-in discharge/admissions/labevents queries)')
+    parser.add_argument('--fts', action='append', default=[], metavar='TABLE:COLUMN[,COLUMN...]',
+                        help='Build an FTS5 full-text index over text columns after importing (repeatable), e.g. discharge:text')
+    parser.add_argument('--analytics-store', action='store_true',
+                        help='After importing, export the tables to typed Parquet files and a DuckDB file for aggregate queries (see analytics_store.py; needs pyarrow and duckdb)')
+    parser.add_argument('--fts-batch-size', type=int, default=DEFAULT_FTS_BATCH_SIZE,
+                        help=f'Rows added to a full-text index per transaction (default: {DEFAULT_FTS_BATCH_SIZE})')
+    args = parser.parse_args()
+
+    if args.index_only:
+        args.build_indexes = True
+
+    if args.batch_size < 1:
+        parser.error('--batch-size must be at least 1')
+
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    try:
+        fts_specs = [parse_fts_spec(spec) for spec in args.fts]
+    except ValueError as e:
+        parser.error(str(e))
+
+    type_overrides = {}
+    if args.workers > 1:
+        args.streaming = True
+    if args.typed or args.incremental:
+        args.streaming = True
+        type_overrides = load_type_overrides(args.type_overrides)
+
+    if args.streaming:
+        raise_csv_field_limit()
+        # Autocommit mode so transactions are controlled explicitly per batch
+        conn = sqlite3.connect(args.db, isolation_level=None)
+    else:
+        # Connect to SQLite database (it'll be created if it doesn't exist)
+        conn = sqlite3.connect(args.db)
+
+    csv_files = [] if args.index_only else find_csv_files(args.csv_dir)
+
+    fingerprints = {}
+    if args.incremental and csv_files:
+        ensure_manifest(conn)
+        drop_stale_shadow_tables(conn)
+        csv_files, fingerprints = plan_incremental_imports(conn, csv_files, typed=args.typed,
+                                                           type_sample_rows=args.type_sample_rows,
+                                                           type_overrides=type_overrides)
+        print(f'🔁 {len(csv_files)} table(s) to rebuild\n')
+
+    # Tables (re)loaded in this run; their full-text indexes are rebuilt rather than updated
+    reloaded = set()
+
+    def load_target(table_name):
+        # Changed tables are loaded beside the live one and swapped in when complete
+        return table_name + SHADOW_SUFFIX if args.incremental else table_name
+
+    if args.workers > 1 and csv_files:
+        def on_table_done(loaded_name, row_count):
+            if args.incremental:
+                table_name = loaded_name[:-len(SHADOW_SUFFIX)]
+                swap_in_shadow_table(conn, table_name, fingerprints[table_name], row_count)
+
+        imported = import_tables_parallel(conn,
+                               [(f, load_target(t), p) for f, t, p in csv_files],
+                               args.workers,
+                               batch_size=args.batch_size,
+                               typed=args.typed,
+                               type_sample_rows=args.type_sample_rows,
+                               type_overrides=type_overrides,
+                               cache_size_mb=args.cache_size_mb,
+                               on_table_done=on_table_done)
+        reloaded.update(name[:-len(SHADOW_SUFFIX)] if args.incremental else name for name in imported)
+        csv_files = []
+
+    # Loop through all CSV files
+    for filename, table_name, file_path in csv_files:
+        print(f'📥 Importing {filename} into table: {table_name}')
+
+        try:
+            if args.streaming:
+                column_types = None
+                if args.typed:
+                    column_types = infer_column_types(file_path, table_name,
+                                                      sample_rows=args.type_sample_rows,
+                                                      overrides=type_overrides)
+                row_count = import_table_streaming(conn, file_path, load_target(table_name),
+                                                   batch_size=args.batch_size,
+                                                   progress_every=args.progress_every,
+                                                   column_types=column_types)
+                if args.incremental:
+                    swap_in_shadow_table(conn, table_name, fingerprints[table_name], row_count)
+            else:
+                import_table_pandas(conn, file_path, table_name)
+            reloaded.add(table_name)
             print(f'✅ Imported table: {table_name}\n')
         except Exception as e:
             print(f'❌ Failed to import {filename}: {e}\n')
 
-# Done
-conn.close()
-print("🏁 All imports complete. Database saved to:", sqlite_db)
+    if args.build_indexes:
+        queries = load_explain_queries(args.explain_queries)
+        before = explain_queries(conn, queries)
+        count = build_indexes(conn)
+        print(f'✅ Built {count} indexes\n')
+        print_query_plans(before, explain_queries(conn, queries))
+
+    for table_name, columns in fts_specs:
+        try:
+            build_fts_index(conn, table_name, columns, batch_size=args.fts_batch_size,
+                            rebuild=table_name in reloaded)
+        except sqlite3.Error as e:
+            print(f'❌ Failed to build full-text index for {table_name}: {e}')
+    if fts_specs:
+        print()
+
+    if args.analytics_store:
+        # Imported here so pyarrow and duckdb are only needed when the store is used
+        from analytics_store import export_store, default_store_dir, default_duckdb_path
+        conn.commit()
+        try:
+            export_store(args.db, store_dir=default_store_dir(args.db), duckdb_path=default_duckdb_path(args.db),
+                         rebuild=reloaded, type_overrides_path=args.type_overrides)
+        except ImportError as e:
+            print(f'❌ {e}')
+        print()
+
+    # Done
+    conn.close()
+    print("🏁 All imports complete. Database saved to:", args.db)
+
+if __name__ == "__main__":
+    main()
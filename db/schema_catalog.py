@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+import os
+import re
+import csv
+import json
+import time
+import argparse
+import sqlite3
+
+from import_csvs import quote_identifier, list_data_tables
+from fts_index import FTS_SUFFIX
+
+# Defaults of schema_extractor.sh
+DEFAULT_DB = './data.db'
+DEFAULT_DESCRIPTIONS = 'data/table_descriptions.csv'
+DEFAULT_OUTPUT = 'schema.md'
+DEFAULT_COMPACT_OUTPUT = 'schema_compact.md'
+
+# Catalog cache, reused while the database and descriptions are unchanged
+DEFAULT_CACHE = 'schema_catalog.json'
+
+# Bumped when the catalog layout changes so older caches are rebuilt
+CATALOG_VERSION = 1
+
+# Characters of a table description kept in the compact schema
+COMPACT_DESCRIPTION_CHARS = 120
+
+# Type names shortened in the compact schema; TEXT columns are listed without a type
+COMPACT_TYPES = {'INTEGER': 'int', 'REAL': 'real', 'TEXT': ''}
+
+# Rough characters per token, for reporting schema sizes
+CHARS_PER_TOKEN = 4
+
+# Tables kept for a question by default; 0 keeps all matching tables
+DEFAULT_MAX_TABLES = 6
+
+# Question-to-table match weights
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+# Words ignored when matching a question against the catalog
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'what', 'which', 'who', 'how', 'many', 'much', 'are', 'was', 'were',
+    'is', 'of', 'in', 'on', 'to', 'a', 'an', 'by', 'from', 'all', 'any', 'each', 'per', 'that', 'this',
+    'their', 'there', 'have', 'has', 'had', 'show', 'list', 'give', 'find', 'me', 'do', 'does', 'did',
+    'data', 'table', 'tables', 'dataset', 'number', 'count', 'average', 'most', 'than', 'between',
+}
+
+def file_fingerprint(path):
+    """
+    Returns the size and mtime of a file (and of its WAL, where writes may still sit), or None if missing
+    """
+    fingerprint = []
+    for candidate in (path, path + '-wal'):
+        if os.path.exists(candidate):
+            stat = os.stat(candidate)
+            fingerprint.append([os.path.basename(candidate), stat.st_size, stat.st_mtime_ns])
+    return fingerprint or None
+
+def load_descriptions(path):
+    """
+    Returns {table: description} from an analyzer analysis_summary.csv.
+    The csv module handles the quoted, multi-line descriptions the analyzer writes.
+    """
+    if not path or not os.path.isfile(path):
+        return {}
+
+    descriptions = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            filename = row.get('Filename') or ''
+            description = (row.get('Description') or row.get('Full_Description') or '').strip()
+            table_name = re.sub(r'\.csv(\.gz)?$', '', filename)
+            if table_name and description:
+                descriptions[table_name] = description
+    return descriptions
+
+def table_row_counts(conn, tables):
+    """
+    Returns {table: row count}, read from sqlite_stat1 when ANALYZE has been run
+    (approximate if rows changed since) and counted otherwise
+    """
+    counts = {}
+    try:
+        # The first number of every sqlite_stat1 entry is the table's row count
+        for table_name, stat in conn.execute('SELECT tbl, stat FROM sqlite_stat1'):
+            if table_name in tables and table_name not in counts:
+                counts[table_name] = int(stat.split()[0])
+    except sqlite3.OperationalError:
+        pass
+    for table_name in tables:
+        if table_name not in counts:
+            counts[table_name] = conn.execute(f'SELECT count(*) FROM {quote_identifier(table_name)}').fetchone()[0]
+    return counts
+
+def build_catalog(db_path, descriptions_path=None):
+    """
+    Reads columns, row counts, indexes and full-text indexes of every table, plus the
+    analyzer's table descriptions, into one catalog dict
+    """
+    descriptions = load_descriptions(descriptions_path)
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        tables = sorted(list_data_tables(conn))
+        row_counts = table_row_counts(conn, tables)
+
+        catalog_tables = {}
+        for table_name in tables:
+            table = quote_identifier(table_name)
+            columns = [
+                {'name': row[1], 'type': (row[2] or 'TEXT').upper(), 'pk': bool(row[5])}
+                for row in conn.execute(f'PRAGMA table_info({table})')
+            ]
+            indexes = []
+            for row in conn.execute(f'PRAGMA index_list({table})'):
+                index_columns = [r[2] for r in conn.execute(f'PRAGMA index_info({quote_identifier(row[1])})')]
+                indexes.append({'name': row[1], 'columns': index_columns, 'unique': bool(row[2])})
+            catalog_tables[table_name] = {
+                'description': descriptions.get(table_name, ''),
+                'rows': row_counts[table_name],
+                'columns': columns,
+                'indexes': indexes,
+            }
+
+        # External-content FTS5 tables named <table>_fts (see fts_index.py)
+        for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name LIKE ?",
+                                      (f'%{FTS_SUFFIX}',)):
+            source = name[:-len(FTS_SUFFIX)]
+            if source in catalog_tables and (sql or '').upper().startswith('CREATE VIRTUAL TABLE'):
+                catalog_tables[source]['fts'] = {
+                    'table': name,
+                    'columns': [row[1] for row in conn.execute(f'PRAGMA table_info({quote_identifier(name)})')],
+                }
+    finally:
+        conn.close()
+
+    return {'built_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'tables': catalog_tables}
+
+def load_catalog(db_path, descriptions_path=None, cache_path=DEFAULT_CACHE, refresh=False):
+    """
+    Returns (catalog, from_cache). The cached catalog is reused while the database and
+    description file fingerprints match; otherwise it is rebuilt and saved.
+    """
+    key = {
+        'version': CATALOG_VERSION,
+        'db': file_fingerprint(db_path),
+        'descriptions': file_fingerprint(descriptions_path) if descriptions_path else None,
+    }
+    if not refresh and cache_path and os.path.isfile(cache_path):
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached.get('key') == key:
+                return cached['catalog'], True
+        except (OSError, json.JSONDecodeError, KeyError):
+            pass
+
+    catalog = build_catalog(db_path, descriptions_path)
+    if cache_path:
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': key, 'catalog': catalog}, f, indent=4)
+        os.replace(tmp_path, cache_path)
+    return catalog, False
+
+def fts_example(table_name, fts):
+    return (f"SELECT * FROM {table_name} WHERE rowid IN "
+            f"(SELECT rowid FROM {fts['table']} WHERE {fts['table']} MATCH 'sepsis')")
+
+def render_markdown(catalog, tables=None):
+    """
+    Renders the full schema in the layout of schema_extractor.sh, plus row counts and indexes
+    """
+    lines = ['# SQLite Database Schema', '', f"_Generated on {catalog['built_at']}_", '']
+    for table_name in tables or catalog['tables']:
+        table = catalog['tables'][table_name]
+        lines += [f'## Table: `{table_name}`', '']
+        if table['description']:
+            lines += [f"**Description:** {table['description']}", '']
+        lines += [f"**Rows:** {table['rows']:,}", '', '**Columns:**', '',
+                  '| Column | Type | PK |', '|--------|------|----|']
+        lines += [f"| `{c['name']}` | `{c['type']}` | {'✅' if c['pk'] else ''} |" for c in table['columns']]
+        lines.append('')
+        if table['indexes']:
+            lines += ['**Indexes:** ' + ', '.join(
+                f"`({', '.join(i['columns'])})`" + (' unique' if i['unique'] else '') for i in table['indexes']
+            ), '']
+        if table.get('fts'):
+            fts = table['fts']
+            lines += [f"**Full-text index:** `{fts['table']}` over `{', '.join(fts['columns'])}`. "
+                      f"For keyword searches use `{fts_example(table_name, fts)}` instead of `LIKE`.", '']
+        lines.append('')
+    return '\n'.join(lines)
+
+def short_description(description, limit=COMPACT_DESCRIPTION_CHARS):
+    """
+    Returns the first sentence of a description, cut to limit characters
+    """
+    sentence = re.split(r'(?<=[.!?])\s', ' '.join(description.split()), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit - 1].rstrip() + '…'
+
+def compact_column(column, indexed):
+    column_type = COMPACT_TYPES.get(column['type'], column['type'].lower())
+    return column['name'] + ('*' if column['name'] in indexed else '') + (f' {column_type}' if column_type else '')
+
+def render_compact(catalog, tables=None):
+    """
+    Renders one line per table: name(columns with short types, * = indexed) ~rows, then a
+    short description. TEXT columns carry no type.
+    """
+    lines = []
+    for table_name in tables or catalog['tables']:
+        table = catalog['tables'][table_name]
+        indexed = {i['columns'][0] for i in table['indexes'] if i['columns']}
+        columns = ', '.join(compact_column(c, indexed) for c in table['columns'])
+        line = f"{table_name}({columns}) ~{table['rows']:,} rows"
+        if table['description']:
+            line += f" -- {short_description(table['description'])}"
+        lines.append(line)
+        if table.get('fts'):
+            fts = table['fts']
+            lines.append(f"  {fts['table']}({', '.join(fts['columns'])}) FTS5 over {table_name}, "
+                         f"join on rowid: {fts['table']} MATCH 'term'")
+    lines.append('* = indexed')
+    return '\n'.join(lines) + '\n'
+
+def normalize_word(word):
+    """
+    Lowercases a word and drops a plural 's' so 'admission' matches 'admissions'
+    """
+    word = word.lower()
+    return word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+
+def words(text):
+    return {normalize_word(w) for w in re.findall(r'[A-Za-z][A-Za-z0-9]+', text)} - STOPWORDS
+
+def score_tables(catalog, question):
+    """
+    Returns {table: score} for tables whose name, column names or description share
+    words with the question
+    """
+    question_words = words(question.replace('_', ' ')) | words(question)
+    scores = {}
+    for table_name, table in catalog['tables'].items():
+        name_words = words(table_name.replace('_', ' ')) | {normalize_word(table_name)}
+        column_words = set()
+        for column in table['columns']:
+            column_words |= words(column['name'].replace('_', ' ')) | {normalize_word(column['name'])}
+        score = (TABLE_NAME_WEIGHT * len(question_words & name_words)
+                 + COLUMN_NAME_WEIGHT * len(question_words & column_words)
+                 + DESCRIPTION_WEIGHT * len(question_words & words(table['description'])))
+        if score:
+            scores[table_name] = score
+    return scores
+
+def select_tables(catalog, question, max_tables=DEFAULT_MAX_TABLES):
+    """
+    Returns the tables relevant to a question, best match first. Falls back to every
+    table when nothing matches, so the prompt is never left without a schema.
+    """
+    scores = score_tables(catalog, question)
+    if not scores:
+        return list(catalog['tables'])
+    ranked = sorted(scores, key=lambda t: (-scores[t], t))
+    return ranked[:max_tables] if max_tables else ranked
+
+def write_text(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the schema files sent to the LLM with NL-to-SQL requests')
+    parser.add_argument('--db', default=DEFAULT_DB, help=f'SQLite database (default: {DEFAULT_DB})')
+    parser.add_argument('--descriptions', default=DEFAULT_DESCRIPTIONS,
+                        help=f'Analyzer analysis_summary.csv with table descriptions (default: {DEFAULT_DESCRIPTIONS})')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help=f'Full markdown schema (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--compact-output', default=DEFAULT_COMPACT_OUTPUT,
+                        help=f'Compact one-line-per-table schema (default: {DEFAULT_COMPACT_OUTPUT})')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help=f'Catalog cache file (default: {DEFAULT_CACHE})')
+    parser.add_argument('--refresh', action='store_true', help='Rebuild the catalog even if the cache is current')
+    parser.add_argument('--question', default=None,
+                        help='Print the compact schema of only the tables relevant to this question instead of writing files')
+    parser.add_argument('--max-tables', type=int, default=DEFAULT_MAX_TABLES,
+                        help=f'Tables kept for --question, 0 for all matches (default: {DEFAULT_MAX_TABLES})')
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.db):
+        parser.error(f'Database not found at {args.db}')
+    if not os.path.isfile(args.descriptions):
+        print(f'⚠️  Description CSV not found at {args.descriptions}; tables will have no descriptions')
+
+    start = time.perf_counter()
+    catalog, from_cache = load_catalog(args.db, args.descriptions, args.cache, refresh=args.refresh)
+    print(f"{'♻️  Reused cached' if from_cache else '🔍 Built'} catalog of {len(catalog['tables'])} tables "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    if args.question:
+        tables = select_tables(catalog, args.question, args.max_tables)
+        print(render_compact(catalog, tables), end='')
+        return
+
+    for path, text in ((args.output, render_markdown(catalog)), (args.compact_output, render_compact(catalog))):
+        write_text(path, text)
+        print(f'✅ {path}: {len(text):,} characters (~{len(text) // CHARS_PER_TOKEN:,} tokens)')
+
+if __name__ == "__main__":
+    main()
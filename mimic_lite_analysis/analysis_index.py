@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import os
+import json
+from pathlib import Path
+
+# Index of the run folders in an annotation_runs archive, kept at its top level
+INDEX_FILENAME = 'analysis_index.json'
+
+RUN_PREFIX = 'annotation_run_'
+ANALYSIS_SUFFIX = '.analysis.json'
+
+def scan_run(run_path):
+    """
+    Returns the sorted table names that have an .analysis.json in a run folder.
+    Only the folder itself is listed; subfolders (batches, extracted data) are never walked.
+    """
+    with os.scandir(run_path) as entries:
+        return sorted(
+            entry.name[:-len(ANALYSIS_SUFFIX)]
+            for entry in entries
+            if entry.name.endswith(ANALYSIS_SUFFIX) and entry.is_file()
+        )
+
+def load_index(archive):
+    try:
+        with open(Path(archive) / INDEX_FILENAME) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_index(archive, index):
+    path = Path(archive) / INDEX_FILENAME
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=4)
+    os.replace(tmp_path, path)
+
+def update_index(archive, rebuild=False):
+    """
+    Brings the archive's index up to date and returns {run name: {'mtime_ns', 'tables'}}.
+    Each run folder costs one stat; it is only listed again when its modification
+    time changed (files were added, removed or atomically replaced).
+    archive must be the annotation_runs folder, not a single run folder: the index
+    is only ever written at the top of the archive.
+    """
+    if Path(archive).name.startswith(RUN_PREFIX):
+        raise ValueError(f'{archive} is a run folder; pass the annotation_runs folder that contains it')
+    runs = {} if rebuild else load_index(archive).get('runs', {})
+    fresh = {}
+    changed = False
+
+    with os.scandir(archive) as entries:
+        for entry in entries:
+            if not entry.name.startswith(RUN_PREFIX) or not entry.is_dir():
+                continue
+            mtime_ns = entry.stat().st_mtime_ns
+            cached = runs.get(entry.name)
+            if cached is not None and cached.get('mtime_ns') == mtime_ns:
+                fresh[entry.name] = cached
+            else:
+                fresh[entry.name] = {'mtime_ns': mtime_ns, 'tables': scan_run(entry.path)}
+                changed = True
+
+    if changed or fresh.keys() != runs.keys():
+        save_index(archive, {'runs': fresh})
+    return fresh
+
+def select_analysis_files(directory, runs=None, latest_per_table=False, rebuild=False):
+    """
+    Lists .analysis.json files of the run folders in an annotation_runs archive,
+    oldest run first, so that newer analyses win when merged in order.
+    runs restricts the selection to the named run folders; with latest_per_table
+    only the newest analysis of each table is returned. Runs are ordered by name,
+    i.e. by their timestamp. directory may also be a single run folder, which is
+    listed directly: no index is read or written for it.
+    """
+    archive = Path(directory)
+    if archive.name.startswith(RUN_PREFIX):
+        return [archive / f'{table}{ANALYSIS_SUFFIX}' for table in scan_run(archive)]
+
+    index = update_index(archive, rebuild=rebuild)
+    names = sorted(index)
+    if runs:
+        missing = sorted(set(runs) - set(index))
+        if missing:
+            print(f"Warning: run folders not found in {archive}: {', '.join(missing)}")
+        names = [name for name in names if name in set(runs)]
+
+    if latest_per_table:
+        latest = {}
+        for name in names:
+            for table in index[name]['tables']:
+                latest[table] = name
+        return [archive / run / f'{table}{ANALYSIS_SUFFIX}' for table, run in sorted(latest.items())]
+
+    return [archive / name / f'{table}{ANALYSIS_SUFFIX}' for name in names for table in index[name]['tables']]
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import json
+
+QUESTION_CATEGORIES = ('administrative_questions', 'research_questions', 'clinical_questions')
+
+# JSON schema of a single-call annotation; sent as a structured-output response_format
+ANNOTATION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'description': {'type': 'string'},
+        **{category: {'type': 'array', 'items': {'type': 'string'}} for category in QUESTION_CATEGORIES},
+    },
+    'required': ['description', *QUESTION_CATEGORIES],
+    'additionalProperties': False,
+}
+
+ANNOTATION_RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'table_annotation',
+        'strict': True,
+        'schema': ANNOTATION_SCHEMA,
+    },
+}
+
+def extract_json_object(text):
+    """
+    Returns the JSON object in an LLM response, or None when there is none.
+    Accepts a bare object, a ```json fenced block or an object embedded in other text.
+    """
+    text = text.strip()
+    candidates = [text]
+
+    if '```' in text:
+        fenced = text.split('```')[1]
+        if fenced.startswith('json'):
+            fenced = fenced[4:]
+        candidates.append(fenced.strip())
+
+    start = text.find('{')
+    end = text.rfind('}') + 1
+    if start >= 0 and end > start:
+        candidates.append(text[start:end])
+
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+def validate_annotation(annotation):
+    """
+    Checks an annotation against ANNOTATION_SCHEMA.
+    Returns a list of problems; an empty list means the annotation is valid.
+    """
+    if not isinstance(annotation, dict):
+        return ['the response is not a JSON object']
+
+    problems = []
+    description = annotation.get('description')
+    if not isinstance(description, str) or not description.strip():
+        problems.append('"description" must be a non-empty string')
+
+    for category in QUESTION_CATEGORIES:
+        questions = annotation.get(category)
+        if not isinstance(questions, list) or not questions:
+            problems.append(f'"{category}" must be a non-empty array of strings')
+        elif not all(isinstance(q, str) and q.strip() for q in questions):
+            problems.append(f'every item of "{category}" must be a non-empty string')
+
+    extra = sorted(set(annotation) - set(ANNOTATION_SCHEMA['properties']))
+    if extra:
+        problems.append(f'unexpected keys: {", ".join(extra)}')
+
+    return problems
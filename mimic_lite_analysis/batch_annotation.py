@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import io
+import json
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+# Endpoint used for every request in a batch
+BATCH_ENDPOINT = '/v1/chat/completions'
+
+# Batch statuses after which polling stops
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+DEFAULT_POLL_INTERVAL = 30
+
+def batch_request(custom_id, model, messages, temperature, response_format=None):
+    """
+    Returns one line of a Batch API input file
+    """
+    body = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+    }
+    if response_format is not None:
+        body['response_format'] = response_format
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': body,
+    }
+
+def parse_batch_output(text):
+    """
+    Parses a Batch API output (or error) file.
+    Returns {custom_id: (content, error)} where exactly one of content/error is None.
+    """
+    outcomes = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record.get('custom_id')
+        response = record.get('response') or {}
+        error = record.get('error')
+        body = response.get('body') or {}
+
+        if error is None and response.get('status_code', 200) >= 400:
+            error = body.get('error') or f"HTTP {response.get('status_code')}"
+        if error is not None:
+            outcomes[custom_id] = (None, error.get('message', str(error)) if isinstance(error, dict) else str(error))
+            continue
+
+        try:
+            outcomes[custom_id] = (body['choices'][0]['message']['content'], None)
+        except (KeyError, IndexError, TypeError):
+            outcomes[custom_id] = (None, 'malformed batch response')
+    return outcomes
+
+def run_batch(client, requests, work_dir, name, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Writes requests to a JSONL batch file in work_dir, submits it through client
+    (an OpenAI client or anything with the same files/batches interface), polls
+    until the batch finishes and returns {custom_id: (content, error)}.
+    Requests missing from the output are reported as errors.
+    """
+    if not requests:
+        return {}
+
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    input_path = work_dir / f'{name}.batch_input.jsonl'
+    with open(input_path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+
+    with open(input_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose='batch')
+
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window='24h',
+    )
+    print(f"Submitted batch {batch.id} ({len(requests)} requests, input: {input_path})")
+
+    while batch.status not in TERMINAL_STATUSES:
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+        counts = getattr(batch, 'request_counts', None)
+        progress = f" ({counts.completed}/{counts.total} done)" if counts else ''
+        print(f"Batch {batch.id}: {batch.status}{progress}")
+
+    outcomes = {}
+    for file_id, suffix in ((batch.output_file_id, 'output'), (batch.error_file_id, 'errors')):
+        if not file_id:
+            continue
+        text = client.files.content(file_id).text
+        (work_dir / f'{name}.batch_{suffix}.jsonl').write_text(text, encoding='utf-8')
+        outcomes.update(parse_batch_output(text))
+
+    for request in requests:
+        outcomes.setdefault(request['custom_id'], (None, f'batch {batch.status} without a result'))
+
+    return outcomes
+
+class LocalBatchClient:
+    """
+    File-based stand-in for the OpenAI files/batches API. Batches are executed
+    locally by calling responder(body) -> content for each request, so batch mode
+    can run against a local server, a fake backend or in tests without the
+    hosted Batch API. Files live under storage_dir.
+    """
+    def __init__(self, responder, storage_dir):
+        self.responder = responder
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_records = {}
+        self.files = SimpleNamespace(create=self.create_file, content=self.file_content)
+        self.batches = SimpleNamespace(create=self.create_batch, retrieve=self.retrieve_batch)
+
+    def create_file(self, file, purpose):
+        file_id = f'file-local-{uuid.uuid4().hex[:12]}'
+        data = file.read() if hasattr(file, 'read') else Path(file).read_bytes()
+        (self.storage_dir / file_id).write_bytes(data)
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def file_content(self, file_id):
+        return SimpleNamespace(text=(self.storage_dir / file_id).read_text(encoding='utf-8'))
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = f'batch-local-{uuid.uuid4().hex[:12]}'
+        output = io.StringIO()
+        errors = io.StringIO()
+        completed = failed = 0
+
+        for line in self.file_content(input_file_id).text.splitlines():
+            request = json.loads(line)
+            try:
+                content = self.responder(request['body'])
+                record = {
+                    'custom_id': request['custom_id'],
+                    'response': {'status_code': 200, 'body': {
+                        'choices': [{'message': {'role': 'assistant', 'content': content}}]
+                    }},
+                    'error': None,
+                }
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                completed += 1
+            except Exception as e:
+                record = {'custom_id': request['custom_id'], 'response': None,
+                          'error': {'message': str(e)}}
+                errors.write(json.dumps(record, ensure_ascii=False) + '\n')
+                failed += 1
+
+        output_file = self.create_file(io.BytesIO(output.getvalue().encode('utf-8')), 'batch_output')
+        error_file = self.create_file(io.BytesIO(errors.getvalue().encode('utf-8')), 'batch_output') if failed else None
+
+        self.batch_records[batch_id] = SimpleNamespace(
+            id=batch_id,
+            status='completed',
+            output_file_id=output_file.id,
+            error_file_id=error_file.id if error_file else None,
+            request_counts=SimpleNamespace(total=completed + failed, completed=completed, failed=failed),
+        )
+        return self.batch_records[batch_id]
+
+    def retrieve_batch(self, batch_id):
+        return self.batch_records[batch_id]
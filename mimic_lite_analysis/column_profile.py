@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+import json
+import argparse
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Rows parsed per pandas chunk when profiling large files
+DEFAULT_CHUNK_SIZE = 100000
+
+# Number of most frequent values reported per column
+DEFAULT_TOP_K = 5
+
+# Distinct values tracked per column before counts become approximate
+MAX_TRACKED_VALUES = 50000
+
+# Numeric values kept per column for quantile estimates
+QUANTILE_SAMPLE_SIZE = 20000
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Text values are counted by their first characters so long notes do not fill memory
+MAX_COUNTED_VALUE_CHARS = 200
+
+# Share of non-null values that must parse as dates for a text column to be profiled as datetime
+DATETIME_MIN_PARSE_RATE = 0.9
+
+def to_datetime(values):
+    """
+    Parses values as timestamps, returning NaT for anything that does not parse
+    """
+    try:
+        return pd.to_datetime(values, errors='coerce', format='ISO8601')
+    except (TypeError, ValueError):
+        return pd.to_datetime(values, errors='coerce')
+
+def json_value(value):
+    """
+    Converts NumPy/pandas scalars into plain JSON-serializable values
+    """
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating,)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, (np.bool_,)):
+        return bool(value)
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+class ColumnProfile:
+    """
+    Accumulates statistics for one column across DataFrame chunks
+    """
+    def __init__(self, name, top_k=DEFAULT_TOP_K, rng=None):
+        self.name = name
+        self.top_k = top_k
+        self.rng = rng or np.random.default_rng(0)
+        self.dtype = None
+        self.count = 0
+        self.nulls = 0
+        self.value_counts = Counter()
+        self.counts_exact = True
+        self.numeric_min = None
+        self.numeric_max = None
+        self.numeric_sum = 0.0
+        self.numeric_count = 0
+        self.numeric_sample = np.empty(0)
+        self.is_datetime = None
+        self.date_min = None
+        self.date_max = None
+
+    def merge_dtype(self, series):
+        dtype = 'object'
+        if pd.api.types.is_bool_dtype(series):
+            dtype = 'bool'
+        elif pd.api.types.is_integer_dtype(series):
+            dtype = 'int64'
+        elif pd.api.types.is_float_dtype(series):
+            dtype = 'float64'
+
+        if self.dtype is None or self.dtype == dtype:
+            self.dtype = dtype
+        elif {self.dtype, dtype} <= {'int64', 'float64'}:
+            self.dtype = 'float64'
+        else:
+            self.dtype = 'object'
+
+    def update(self, series):
+        self.merge_dtype(series)
+        self.count += len(series)
+        non_null = series.dropna()
+        self.nulls += len(series) - len(non_null)
+        if non_null.empty:
+            return
+
+        # Frequent values and cardinality
+        counted = non_null
+        if counted.dtype == object:
+            counted = counted.astype(str).str.slice(0, MAX_COUNTED_VALUE_CHARS)
+        self.value_counts.update(counted.value_counts().to_dict())
+        if len(self.value_counts) > MAX_TRACKED_VALUES:
+            self.value_counts = Counter(dict(self.value_counts.most_common(MAX_TRACKED_VALUES)))
+            self.counts_exact = False
+
+        if pd.api.types.is_numeric_dtype(non_null) and not pd.api.types.is_bool_dtype(non_null):
+            values = non_null.to_numpy(dtype=float)
+            chunk_min, chunk_max = values.min(), values.max()
+            self.numeric_min = chunk_min if self.numeric_min is None else min(self.numeric_min, chunk_min)
+            self.numeric_max = chunk_max if self.numeric_max is None else max(self.numeric_max, chunk_max)
+            self.numeric_sum += values.sum()
+            self.add_to_sample(values)
+            self.numeric_count += len(values)
+        elif self.is_datetime is not False:
+            parsed = to_datetime(non_null.astype(str))
+            valid = parsed.dropna()
+            if self.is_datetime is None:
+                # Decide once, from the first chunk with values
+                self.is_datetime = len(valid) >= DATETIME_MIN_PARSE_RATE * len(non_null)
+            if self.is_datetime and not valid.empty:
+                chunk_min, chunk_max = valid.min(), valid.max()
+                self.date_min = chunk_min if self.date_min is None else min(self.date_min, chunk_min)
+                self.date_max = chunk_max if self.date_max is None else max(self.date_max, chunk_max)
+
+    def add_to_sample(self, values):
+        """
+        Keeps a bounded uniform random sample of numeric values for quantile estimates.
+        Must be called before numeric_count includes `values`.
+        """
+        seen = self.numeric_count
+        if seen + len(values) <= QUANTILE_SAMPLE_SIZE:
+            self.numeric_sample = np.concatenate([self.numeric_sample, values])
+            return
+
+        # Split the sample between old and new values in proportion to how many each side represents
+        from_new = self.rng.hypergeometric(len(values), seen, QUANTILE_SAMPLE_SIZE) if seen else QUANTILE_SAMPLE_SIZE
+        from_old = QUANTILE_SAMPLE_SIZE - from_new
+        self.numeric_sample = np.concatenate([
+            self.rng.choice(self.numeric_sample, from_old, replace=False),
+            self.rng.choice(values, from_new, replace=False),
+        ])
+
+    def result(self):
+        total = sum(self.value_counts.values())
+        profile = {
+            'name': self.name,
+            'dtype': 'datetime' if self.is_datetime else (self.dtype or 'object'),
+            'count': self.count,
+            'null_rate': round(self.nulls / self.count, 4) if self.count else 0.0,
+            'distinct': len(self.value_counts),
+            'distinct_exact': self.counts_exact,
+            'top_values': [
+                {'value': json_value(value), 'count': int(count),
+                 'share': round(count / total, 4) if total else 0.0}
+                for value, count in self.value_counts.most_common(self.top_k)
+            ],
+        }
+
+        if self.numeric_count:
+            quantiles = np.quantile(self.numeric_sample, QUANTILES)
+            profile.update({
+                'min': json_value(self.numeric_min),
+                'max': json_value(self.numeric_max),
+                'mean': round(self.numeric_sum / self.numeric_count, 4),
+                'quantiles': {f'p{int(q * 100)}': round(float(v), 4) for q, v in zip(QUANTILES, quantiles)},
+            })
+
+        if self.is_datetime and self.date_min is not None:
+            profile.update({
+                'min': json_value(self.date_min),
+                'max': json_value(self.date_max),
+            })
+
+        return profile
+
+def profile_csv(source, chunksize=DEFAULT_CHUNK_SIZE, max_rows=None, top_k=DEFAULT_TOP_K, seed=0):
+    """
+    Profiles every column of a CSV (path or open file) by streaming it in chunks.
+    max_rows limits how much of a very large file is read.
+    Returns {'rows_profiled': int, 'columns': [column profile dicts]}
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    rows = 0
+
+    for chunk in pd.read_csv(source, chunksize=chunksize, nrows=max_rows):
+        for name in chunk.columns:
+            if name not in columns:
+                columns[name] = ColumnProfile(name, top_k=top_k, rng=rng)
+            columns[name].update(chunk[name])
+        rows += len(chunk)
+
+    return {
+        'rows_profiled': rows,
+        'columns': [column.result() for column in columns.values()],
+    }
+
+def shorten(value, max_chars):
+    text = str(value).replace('\n', ' ')
+    return text if len(text) <= max_chars else text[:max_chars - 1] + '…'
+
+def format_number(value):
+    """
+    Formats a numeric statistic: whole numbers in full (IDs keep every digit),
+    other values to 6 significant digits
+    """
+    if float(value).is_integer():
+        return str(int(value))
+    if abs(value) >= 1e6:
+        return f'{value:.1f}'
+    return f'{value:g}'
+
+def render_profile(profile, max_value_chars=40):
+    """
+    Renders a profile as compact text for an LLM prompt, one line per column
+    """
+    lines = []
+    for column in profile['columns']:
+        parts = [column['dtype'], f"nulls {column['null_rate']:.0%}"]
+        distinct = column['distinct'] if column['distinct_exact'] else f">={column['distinct']}"
+        parts.append(f"distinct {distinct}")
+
+        if 'quantiles' in column:
+            q = column['quantiles']
+            parts.append(f"range {format_number(column['min'])}..{format_number(column['max'])}, "
+                         f"p25/p50/p75 {'/'.join(format_number(q[p]) for p in ('p25', 'p50', 'p75'))}")
+        elif column['dtype'] == 'datetime' and 'min' in column:
+            parts.append(f"{column['min']} .. {column['max']}")
+
+        # Skip top values for numeric columns and for columns where no value repeats (IDs, free text)
+        if column['top_values'] and 'quantiles' not in column and column['top_values'][0]['count'] > 1:
+            top = ', '.join(
+                f"{shorten(v['value'], max_value_chars)} ({v['share']:.0%})" for v in column['top_values']
+            )
+            parts.append(f"top: {top}")
+
+        lines.append(f"- {column['name']}: " + '; '.join(parts))
+
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile the columns of a CSV file')
+    parser.add_argument('csv_path', type=str, help='CSV (or .csv.gz) file to profile')
+    parser.add_argument('--max-rows', type=int, default=None, help='Only profile the first N rows')
+    parser.add_argument('--json', action='store_true', help='Print the full JSON profile instead of the compact rendering')
+    args = parser.parse_args()
+
+    profile = profile_csv(Path(args.csv_path), max_rows=args.max_rows)
+    if args.json:
+        print(json.dumps(profile, indent=4))
+    else:
+        print(render_profile(profile))
+
+if __name__ == "__main__":
+    main()
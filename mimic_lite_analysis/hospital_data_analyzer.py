@@ -2,21 +2,244 @@
 import os
 import sys
 import argparse
+import io
+import csv
 import gzip
 import json
+import time
+import random
+import threading
 import pandas as pd
-from openai import OpenAI
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import pytz
 import shutil
 
+# Prefer a faster gzip implementation when one is installed
+try:
+    from isal import igzip as fast_gzip
+except ImportError:
+    try:
+        from zlib_ng import gzip_ng as fast_gzip
+    except ImportError:
+        fast_gzip = gzip
+
+from column_profile import profile_csv, render_profile
+from batch_annotation import LocalBatchClient, batch_request, run_batch, DEFAULT_POLL_INTERVAL
+from annotation_schema import ANNOTATION_RESPONSE_FORMAT, extract_json_object, validate_annotation
+from llm_backends import make_backend, is_retryable_error, OpenAIBackend
+from token_budget import (count_tokens, count_message_tokens, fit_to_budget, track_usage, record_usage,
+                          record_cached, UsageTracker, truncate_cells, DEFAULT_SAMPLE_TOKEN_BUDGET)
+from pipeline_metrics import PipelineMetrics, file_metrics, stage, record_stage, add_counters, render_summary
+from llm_cache import ResponseCache, make_cache_key, DEFAULT_CACHE_PATH, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_SIZE_MB
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# LLM backend used by chat_completion; configured in main(), or an OpenAI
+# backend is created on first use
+backend = None
+backend_lock = threading.Lock()
+
+# DataFrame.to_string sets pandas' global display.max_colwidth while it renders, so
+# concurrent calls from worker threads can pick up each other's setting; rendering is serialized
+render_lock = threading.Lock()
+
+# Model used for all annotation requests
+MODEL = "gpt-4o-mini"
+
+# Retry settings for rate-limit (429) and server (5xx) errors
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Rough completion size used to reserve tokens-per-minute quota before a call
+ESTIMATED_COMPLETION_TOKENS = 800
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` units per minute
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """
+        Blocks until `amount` units are available, then takes them
+        """
+        # A single request larger than the bucket can never fit; let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """
+        Corrects an earlier estimate once the real usage is known (negative refunds tokens)
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class RateLimiter:
+    """
+    Enforces requests-per-minute and tokens-per-minute quotas across worker threads
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens):
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens:
+            self.tokens.acquire(estimated_tokens)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        if self.tokens and actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+# Shared by all worker threads; configured from the command line in main()
+rate_limiter = RateLimiter()
+
+# Per-stage timings written to metrics.jsonl in the run folder (None records nothing)
+metrics = None
+
+# Persistent response cache (None disables caching); with refresh_cache, cached entries are ignored and overwritten
+response_cache = None
+refresh_cache = False
+
+# Number of rows shown to the LLM per file
+SAMPLE_ROWS = 20
+
+# 'head' reads only the first SAMPLE_ROWS rows; 'reservoir' draws a uniform random
+# sample in one bounded-memory pass over the file (useful for time-sorted tables)
+sample_mode = 'head'
+sample_seed = None
+
+# When False, .csv.gz samples are read straight from the compressed stream and
+# nothing is written to the run folder; when True, files are extracted first
+extract_gz = False
+
+# Chunk size used when extracting .gz files
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+# When True, a column profile is computed for each file and saved as <name>.profile.json
+profile_columns = False
+
+# 'rows' sends the sample rows to the LLM; 'profile' sends the compact column profile
+# plus a few example rows instead
+prompt_style = 'rows'
+
+# Upper bound on rows streamed when profiling a file (None profiles the whole file)
+profile_max_rows = 1000000
+
+# Example rows included alongside the profile in 'profile' prompts
+PROFILE_EXAMPLE_ROWS = 3
+
+# Longest text value shown in those example rows; the profile already describes the columns
+PROFILE_EXAMPLE_CELL_CHARS = 80
+
+# 'chained' asks for the description, then the questions (two requests per file);
+# 'single' asks for both in one structured-output request
+annotation_mode = 'chained'
+
+# Token budget of the data sample in each prompt (None disables shrinking)
+sample_token_budget = DEFAULT_SAMPLE_TOKEN_BUDGET
+
+# Seconds between status checks of a submitted batch in --batch mode
+batch_poll_interval = DEFAULT_POLL_INTERVAL
+
+def get_backend():
+    """
+    Returns the configured LLM backend, creating the default OpenAI backend on first use
+    """
+    global backend
+    with backend_lock:
+        if backend is None:
+            backend = OpenAIBackend(api_key=os.environ.get("OPENAI_API_KEY"))
+        return backend
+
+def cached_response(messages, temperature, model=None, response_format=None):
+    """
+    Returns the cached response for a request, or None when it is not cached,
+    caching is disabled or a refresh was requested
+    """
+    if response_cache is None or refresh_cache:
+        return None
+    return response_cache.get(make_cache_key(model or MODEL, messages, temperature, response_format))
+
+def cache_response(messages, temperature, content, model=None, response_format=None):
+    """
+    Stores a response in the cache when caching is enabled
+    """
+    if response_cache is not None:
+        model = model or MODEL
+        response_cache.put(make_cache_key(model, messages, temperature, response_format), model, content)
+
+def chat_completion(messages, temperature, model=None, response_format=None, use_cache=True):
+    """
+    Sends a chat completion request, respecting the shared rate limiter and
+    retrying 429/5xx errors with jittered exponential backoff.
+    response_format requests structured output (e.g. a JSON schema).
+    Identical requests are answered from the response cache when it is enabled;
+    use_cache=False is for callers that already looked the request up and cache the result themselves.
+    Returns the message content.
+    """
+    model = model or MODEL
+    started = time.perf_counter()
+    cached = cached_response(messages, temperature, model, response_format) if use_cache else None
+    if cached is not None:
+        record_cached()
+        record_stage('llm_cache_hit', time.perf_counter() - started)
+        return cached
+    llm = get_backend()
+
+    prompt_tokens = count_message_tokens(messages, model)
+    estimated_tokens = prompt_tokens + ESTIMATED_COMPLETION_TOKENS
+
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire(estimated_tokens)
+        try:
+            content, usage = llm.complete(model, messages, temperature, response_format)
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_retryable_error(e):
+                raise
+            # Full jitter: sleep a random time up to the exponential cap
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            print(f"Retryable API error ({e.__class__.__name__}), retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{MAX_RETRIES})")
+            time.sleep(delay)
+            continue
+
+        # Servers that do not report usage are measured locally
+        if usage is None:
+            usage = (prompt_tokens, count_tokens(content, model))
+        rate_limiter.record_usage(estimated_tokens, sum(usage))
+        record_usage(*usage)
+        # Latency includes backoff and rate-limiter waits
+        record_stage('llm_request', time.perf_counter() - started, retries=attempt,
+                     prompt_tokens=usage[0], completion_tokens=usage[1])
+        add_counters(llm_requests=1, retries=attempt, prompt_tokens=usage[0], completion_tokens=usage[1])
+        if use_cache:
+            cache_response(messages, temperature, content, model, response_format)
+        return content
 
 def get_est_timestamp():
     """
@@ -39,33 +262,131 @@ def create_annotation_run_folder():
     print(f"Created annotation run folder: {run_folder}")
     return run_folder
 
-def init_summary_df():
+# Columns of analysis_summary.csv, in order
+SUMMARY_COLUMNS = [
+    'Filename', 
+    'File Type', 
+    'File Path', 
+    'Analysis JSON Path',
+    'Description Summary',
+    'Number of Questions',
+    'Timestamp',
+    'Description',  # Full description
+    'Administrative_Questions', # Questions for hospital administrators
+    'Research_Questions',       # Questions for researchers 
+    'Clinical_Questions',       # Questions for doctors/clinicians
+    'Full_Description',         # Same as Description but explicitly named for clarity
+    'Full_Questions',           # Raw questions data as JSON string
+    'Raw_JSON',                 # Complete JSON response
+    'Prompt Tokens',            # Tokens sent for this file (cached responses excluded)
+    'Completion Tokens',        # Tokens received for this file
+    'Estimated Cost (USD)'      # From MODEL_PRICES in token_budget.py; empty for unknown models
+]
+
+def init_summary_df(rows=None):
     """
     Initializes a DataFrame to track results of the analysis
     """
     # Create DataFrame with columns
-    summary_df = pd.DataFrame(columns=[
-        'Filename', 
-        'File Type', 
-        'File Path', 
-        'Analysis JSON Path',
-        'Description Summary',
-        'Number of Questions',
-        'Timestamp',
-        'Description',  # Full description
-        'Administrative_Questions', # Questions for hospital administrators
-        'Research_Questions',       # Questions for researchers 
-        'Clinical_Questions',       # Questions for doctors/clinicians
-        'Full_Description',         # Same as Description but explicitly named for clarity
-        'Full_Questions',           # Raw questions data as JSON string
-        'Raw_JSON'                  # Complete JSON response
-    ])
+    summary_df = pd.DataFrame(rows or [], columns=SUMMARY_COLUMNS)
     
     return summary_df
 
-def process_gz_file(gz_file_path, run_folder, summary_df):
+def summary_row(fields):
+    """
+    Returns a complete summary record: every column in SUMMARY_COLUMNS,
+    with '' for any column not given in fields
+    """
+    row = {column: '' for column in SUMMARY_COLUMNS}
+    row['Timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    row.update(fields)
+    return row
+
+def write_json_atomic(path, data):
+    """
+    Writes JSON to a temporary file and renames it into place, so a crash
+    never leaves a partially written file behind
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def source_fingerprint(file_path):
+    """
+    Returns a cheap fingerprint (size and modification time) of a source file
+    """
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+class SummaryWriter:
+    """
+    Collects summary records and appends each one to analysis_summary.jsonl as soon
+    as its file finishes, so partial results survive a crash. The CSV is built once
+    from the collected records at the end of the run.
     """
-    Unpacks a gzip file and returns the extracted content
+    def __init__(self, run_folder):
+        self.jsonl_path = Path(run_folder) / 'analysis_summary.jsonl'
+        self.rows = {}
+        self.lock = threading.Lock()
+        self.file = open(self.jsonl_path, 'a', encoding='utf-8')
+        
+        # Terminate a last line cut short by a crash so new records start on their own line
+        if self.jsonl_path.stat().st_size:
+            with open(self.jsonl_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.file.write('\n')
+
+    def append(self, index, row, fingerprint=None, persist=True):
+        """
+        Records the summary row for the index-th file in directory-walk order.
+        The source fingerprint is stored alongside the row in the JSONL file so
+        a resumed run can tell whether the file changed since.
+        """
+        with self.lock:
+            self.rows[index] = row
+            if persist:
+                record = dict(row, _source_fingerprint=fingerprint)
+                self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self.file.flush()
+
+    def to_dataframe(self):
+        """
+        Builds the summary DataFrame once, in directory-walk order
+        """
+        with self.lock:
+            return init_summary_df([self.rows[i] for i in sorted(self.rows)])
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def open_compressed(file_path, mode='rb', **kwargs):
+    """
+    Opens a .gz file with the fastest available gzip implementation
+    """
+    return fast_gzip.open(file_path, mode, **kwargs)
+
+def process_gz_file(gz_file_path, run_folder):
+    """
+    Analyzes a gzip file. By default CSV samples are read directly from the
+    compressed stream; with extraction enabled the file is first unpacked
+    into the run folder in fixed-size chunks.
+    """
+    csv_args, new_row = resolve_gz_file(gz_file_path, run_folder)
+    if csv_args is not None:
+        return process_csv_file(**csv_args)
+    return None, new_row
+
+def resolve_gz_file(gz_file_path, run_folder):
+    """
+    Works out how a gzip file is analyzed, extracting it first if enabled.
+    Returns (csv_args, None) for a CSV, where csv_args are the keyword arguments
+    for process_csv_file, or (None, summary row) for anything else
     """
     print(f"Processing .gz file: {gz_file_path}")
     
@@ -75,139 +396,247 @@ def process_gz_file(gz_file_path, run_folder, summary_df):
     # Create a copy in the run folder
     run_output_file = run_folder / output_file.name
     
-    # Extract the file
-    with gzip.open(gz_file_path, 'rb') as f_in:
-        with open(run_output_file, 'wb') as f_out:
-            f_out.write(f_in.read())
-    
-    print(f"Extracted to: {run_output_file}")
-    
-    # If the extracted file is a CSV, process it
-    if run_output_file.suffix.lower() == '.csv':
-        return process_csv_file(run_output_file, run_folder, summary_df, original_path=gz_file_path)
-    
-    # Add entry to summary DataFrame for non-CSV files
-    new_row = pd.DataFrame({
-        'Filename': [output_file.name],
-        'File Type': ['Extracted from GZ'],
-        'File Path': [str(gz_file_path)],
-        'Analysis JSON Path': ['N/A'],
-        'Description Summary': ['Not analyzed (not a CSV)'],
-        'Number of Questions': [0],
-        'Timestamp': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-        'Description': [''],
-        'Administrative_Questions': [''],
-        'Research_Questions': [''],
-        'Clinical_Questions': [''],
-        'Full_Description': [''],
-        'Full_Questions': [''],
-        'Raw_JSON': ['']
+    if not extract_gz:
+        if run_output_file.suffix.lower() == '.csv':
+            # run_output_file is only used for naming; the sample comes from the .gz stream
+            return dict(csv_file_path=run_output_file, run_folder=run_folder,
+                        original_path=gz_file_path, sample_path=gz_file_path), None
+    else:
+        # Extract the file without holding it in memory
+        with stage('extract'):
+            with open_compressed(gz_file_path, 'rb') as f_in:
+                with open(run_output_file, 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out, COPY_CHUNK_SIZE)
+        add_counters(bytes_read=os.path.getsize(gz_file_path), bytes_extracted=os.path.getsize(run_output_file))
+        
+        print(f"Extracted to: {run_output_file}")
+        
+        # If the extracted file is a CSV, process it
+        if run_output_file.suffix.lower() == '.csv':
+            return dict(csv_file_path=run_output_file, run_folder=run_folder,
+                        original_path=gz_file_path), None
+    
+    # Add summary entry for non-CSV files
+    new_row = summary_row({
+        'Filename': output_file.name,
+        'File Type': 'Extracted from GZ' if extract_gz else 'GZ',
+        'File Path': str(gz_file_path),
+        'Analysis JSON Path': 'N/A',
+        'Description Summary': 'Not analyzed (not a CSV)',
+        'Number of Questions': 0,
     })
     
     return None, new_row
 
-def process_csv_file(csv_file_path, run_folder, summary_df, original_path=None):
+def reservoir_sample_csv(file_obj, n_rows, seed=None):
     """
-    Reads a CSV file, extracts the header and first 20 lines, 
-    and sends them to OpenAI for interpretation
+    Draws a uniform random sample of n_rows data rows from an open CSV text stream
+    in a single pass (Algorithm R), keeping only n_rows rows in memory.
+    Returns the sample as a DataFrame with rows in file order.
     """
-    print(f"Processing CSV file: {csv_file_path}")
+    csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+    rng = random.Random(seed)
+    reader = csv.reader(file_obj)
+    header = next(reader)
     
-    try:
-        # Read the CSV file
-        df = pd.read_csv(csv_file_path)
-        
-        # Get the header and first 20 rows
-        header = list(df.columns)
-        first_20_rows = df.head(20).to_string(index=False)
-        
-        # Construct the data sample
-        data_sample = f"Header: {header}\n\nFirst 20 rows:\n{first_20_rows}"
-        
-        # Send to OpenAI for interpretation
-        result = analyze_with_openai(data_sample, csv_file_path.name)
-        
-        # Generate output paths
-        if original_path is None:
-            original_path = csv_file_path
-            
-            # If input file is not already in the run folder, copy it there
-            if run_folder not in str(csv_file_path):
-                dest_file = run_folder / csv_file_path.name
-                shutil.copy2(csv_file_path, dest_file)
-                csv_file_path = dest_file
-        
-        # Save the result
-        output_json = run_folder / f"{csv_file_path.stem}.analysis.json"
-        with open(output_json, 'w') as f:
-            json.dump(result, f, indent=4)
-        
-        print(f"Analysis saved to: {output_json}")
-        
-        # Extract the description and questions
-        description = result.get('description', '')
-        admin_questions = result.get('administrative_questions', [])
-        research_questions = result.get('research_questions', [])
-        clinical_questions = result.get('clinical_questions', [])
-        
-        
+    reservoir = []
+    for i, row in enumerate(reader):
+        if i < n_rows:
+            reservoir.append((i, row))
+        else:
+            j = rng.randint(0, i)
+            if j < n_rows:
+                reservoir[j] = (i, row)
     
-        # Count total number of questions
-        num_questions = (
-            len(admin_questions) + 
-            len(research_questions) + 
-            len(clinical_questions)
-        ) if isinstance(admin_questions, list) and isinstance(research_questions, list) and isinstance(clinical_questions, list) else 'N/A'
-        
-        # Determine file type
-        file_type = 'CSV from GZ' if original_path and original_path.suffix.lower() == '.gz' else 'CSV'
-        
+    # Re-serialize the sample so pandas parses it exactly as it would the original file
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(row for _, row in sorted(reservoir, key=lambda item: item[0]))
+    buffer.seek(0)
+    return pd.read_csv(buffer)
 
+def rows_to_text(rows):
+    """
+    Renders sample rows as a table with every cell in full, the same way on every thread
+    """
+    with render_lock:
+        return rows.to_string(index=False, max_colwidth=None)
+
+def read_sample(csv_file_path, n_rows=SAMPLE_ROWS, mode=None, seed=None):
+    """
+    Reads only the rows needed for the prompt instead of the whole file.
+    Returns (DataFrame, label) where label describes how the rows were chosen.
+    """
+    mode = mode or sample_mode
+    seed = sample_seed if seed is None else seed
+    
+    # .gz files are decompressed on the fly; reading stops once the sample is complete
+    is_gz = Path(csv_file_path).suffix.lower() == '.gz'
+    
+    with open(csv_file_path, 'rb') as raw:
+        source = open_compressed(raw, 'rb') if is_gz else raw
+        if mode == 'reservoir':
+            text = io.TextIOWrapper(source, encoding='utf-8', newline='')
+            df, label = reservoir_sample_csv(text, n_rows, seed), f"Random sample of {n_rows} rows"
+        else:
+            df, label = pd.read_csv(source, nrows=n_rows), f"First {n_rows} rows"
         
-        # Format the questions for each category as bulleted lists
-        admin_questions_str = '\n'.join([f"- {q}" for q in admin_questions]) if isinstance(admin_questions, list) else str(admin_questions)
-        research_questions_str = '\n'.join([f"- {q}" for q in research_questions]) if isinstance(research_questions, list) else str(research_questions)
-        clinical_questions_str = '\n'.join([f"- {q}" for q in clinical_questions]) if isinstance(clinical_questions, list) else str(clinical_questions)
-        
-        # Add entry to summary DataFrame
-        new_row = pd.DataFrame({
-            'Filename': [csv_file_path.name],
-            'File Type': [file_type],
-            'File Path': [str(original_path)],
-            'Analysis JSON Path': [str(output_json)],
-            'Timestamp': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            'Description': [description],
-            'Administrative_Questions': [admin_questions_str],
-            'Research_Questions': [research_questions_str],
-            'Clinical_Questions': [clinical_questions_str],
-            'Full_Description': [description],
+        # Bytes taken from disk (compressed bytes for .gz files)
+        add_counters(bytes_read=raw.tell(), rows_sampled=len(df))
+    
+    return df, label
+
+def profile_file(file_path):
+    """
+    Streams a CSV or .csv.gz file in chunks and returns its column profile
+    """
+    if Path(file_path).suffix.lower() == '.gz':
+        with open_compressed(file_path, 'rb') as f:
+            return profile_csv(f, max_rows=profile_max_rows)
+    return profile_csv(file_path, max_rows=profile_max_rows)
+
+def process_csv_file(csv_file_path, run_folder, original_path=None, sample_path=None):
+    """
+    Reads the header and a 20-row sample of a CSV file
+    and sends them to OpenAI for interpretation.
+    sample_path, if given, is where the rows are read from (e.g. the original .csv.gz)
+    """
+    print(f"Processing CSV file: {csv_file_path}")
+    
+    # Token usage of every request made for this file ends up in its summary row
+    with track_usage() as usage:
+        try:
+            data_sample, profile = build_data_sample(csv_file_path, sample_path)
             
+            # Send to OpenAI for interpretation
+            result = analyze_with_openai(data_sample, csv_file_path.name)
+            
+            with stage('write_outputs'):
+                row = save_csv_analysis(result, csv_file_path, run_folder, original_path, profile)
+            
+        except Exception as e:
+            print(f"Error processing CSV file {csv_file_path}: {str(e)}")
+            result, row = None, csv_error_row(csv_file_path, original_path)
+    
+    row.update(usage.summary_fields(MODEL))
+    return result, row
 
-        })
-        
-        return result, new_row
-        
-    except Exception as e:
-        print(f"Error processing CSV file {csv_file_path}: {str(e)}")
+def build_data_sample(csv_file_path, sample_path=None):
+    """
+    Builds the data sample sent to the LLM for a CSV file.
+    Returns (data_sample, profile), where profile is None unless profiling is enabled
+    """
+    # Read only the sample rows, not the whole file
+    with stage('read_sample'):
+        df, sample_label = read_sample(sample_path or csv_file_path)
+    
+    # Get the header and sample rows
+    header = list(df.columns)
+    
+    profile = None
+    if profile_columns or prompt_style == 'profile':
+        with stage('profile'):
+            profile = profile_file(sample_path or csv_file_path)
+    
+    # Construct the data sample
+    if prompt_style == 'profile':
+        df = truncate_cells(df.head(PROFILE_EXAMPLE_ROWS), PROFILE_EXAMPLE_CELL_CHARS)
+        rendered_profile = render_profile(profile)
         
-        # Add error entry to summary DataFrame
-        new_row = pd.DataFrame({
-            'Filename': [csv_file_path.name],
-            'File Type': ['CSV (Error)'],
-            'File Path': [str(original_path or csv_file_path)],
-            'Analysis JSON Path': ['N/A'],
-            
-            'Number of Questions': [0],
-            'Timestamp': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            'Description': [''],
-            'Administrative_Questions': [''],
-            'Research_Questions': [''],
-            'Clinical_Questions': [''],
-            'Full_Description': [''],
-      
-        })
+        def render(rows, note):
+            return (
+                f"Header: {header}\n\n"
+                f"Column profile ({profile['rows_profiled']} rows profiled):\n{rendered_profile}\n\n"
+                f"Example rows{' ' + note if note else ''}:\n{rows_to_text(rows)}"
+            )
+    else:
+        def render(rows, note):
+            label = f"{sample_label} {note}" if note else sample_label
+            return f"Header: {header}\n\n{label}:\n{rows_to_text(rows)}"
+    
+    # Shrink wide or text-heavy samples to the token budget
+    with stage('build_prompt'):
+        data_sample, tokens, actions = fit_to_budget(df, render, sample_token_budget, MODEL)
+    if actions:
+        print(f"Sample of {csv_file_path.name} shrunk to {tokens} tokens: {', '.join(actions)}")
+    
+    return data_sample, profile
+
+def save_csv_analysis(result, csv_file_path, run_folder, original_path=None, profile=None):
+    """
+    Writes the analysis (and profile) JSON for a CSV file and returns its summary row
+    """
+    # Generate output paths
+    if original_path is None:
+        original_path = csv_file_path
         
-        return None, new_row
+        # If input file is not already in the run folder, copy it there
+        if str(run_folder) not in str(csv_file_path):
+            dest_file = run_folder / csv_file_path.name
+            shutil.copy2(csv_file_path, dest_file)
+            csv_file_path = dest_file
+    
+    # Save the result
+    output_json = run_folder / f"{csv_file_path.stem}.analysis.json"
+    write_json_atomic(output_json, result)
+    
+    print(f"Analysis saved to: {output_json}")
+    
+    if profile is not None:
+        output_profile = run_folder / f"{csv_file_path.stem}.profile.json"
+        write_json_atomic(output_profile, profile)
+        print(f"Column profile saved to: {output_profile}")
+    
+    # Extract the description and questions
+    description = result.get('description', '')
+    admin_questions = result.get('administrative_questions', [])
+    research_questions = result.get('research_questions', [])
+    clinical_questions = result.get('clinical_questions', [])
+    
+    # Count total number of questions
+    num_questions = (
+        len(admin_questions) + 
+        len(research_questions) + 
+        len(clinical_questions)
+    ) if isinstance(admin_questions, list) and isinstance(research_questions, list) and isinstance(clinical_questions, list) else 'N/A'
+    
+    # Determine file type; a failed description or questions step marks the row as an error
+    if result.get('error'):
+        file_type = 'CSV (Error)'
+    else:
+        file_type = 'CSV from GZ' if original_path and original_path.suffix.lower() == '.gz' else 'CSV'
+    
+    # Format the questions for each category as bulleted lists
+    admin_questions_str = '\n'.join([f"- {q}" for q in admin_questions]) if isinstance(admin_questions, list) else str(admin_questions)
+    research_questions_str = '\n'.join([f"- {q}" for q in research_questions]) if isinstance(research_questions, list) else str(research_questions)
+    clinical_questions_str = '\n'.join([f"- {q}" for q in clinical_questions]) if isinstance(clinical_questions, list) else str(clinical_questions)
+    
+    # Add summary entry
+    return summary_row({
+        'Filename': csv_file_path.name,
+        'File Type': file_type,
+        'File Path': str(original_path),
+        'Analysis JSON Path': str(output_json),
+        'Number of Questions': num_questions,
+        'Description': description,
+        'Administrative_Questions': admin_questions_str,
+        'Research_Questions': research_questions_str,
+        'Clinical_Questions': clinical_questions_str,
+        'Full_Description': description,
+    })
+
+def csv_error_row(csv_file_path, original_path=None):
+    """
+    Returns the summary row for a CSV file that could not be analyzed
+    """
+    return summary_row({
+        'Filename': csv_file_path.name,
+        'File Type': 'CSV (Error)',
+        'File Path': str(original_path or csv_file_path),
+        'Analysis JSON Path': 'N/A',
+        'Number of Questions': 0,
+    })
 
 def parse_questions(questions_data):
     """
@@ -222,22 +651,10 @@ def parse_questions(questions_data):
     try:
         # Handle case where questions_data is a string that needs parsing
         if isinstance(questions_data, str):
-            # Check if it's a markdown code block with JSON
-            if "```json" in questions_data:
-                # Extract json from markdown code block
-                json_match = questions_data.split("```json")[1].split("```")[0].strip()
-                questions_dict = json.loads(json_match)
-            else:
-                # Try to extract JSON if it's present without markdown
-                json_start = questions_data.find('{')
-                json_end = questions_data.rfind('}') + 1
-                
-                if json_start >= 0 and json_end > json_start:
-                    json_str = questions_data[json_start:json_end]
-                    questions_dict = json.loads(json_str)
-                else:
-                    # If no JSON structure, return the string as is for all types
-                    return questions_data, questions_data, questions_data, questions_data
+            questions_dict = extract_json_object(questions_data)
+            if questions_dict is None:
+                # If no JSON structure, return the string as is for all types
+                return questions_data, questions_data, questions_data, questions_data
             
             # Extract categories from the JSON
             # Check both naming conventions (with or without "_questions" suffix)
@@ -311,15 +728,30 @@ def analyze_with_openai(data_sample, filename):
     Sends data to OpenAI API for interpretation using a two-step chained prompting approach:
     1. First generates a description of the data
     2. Then uses that description along with the original data to generate questions
+    In 'single' annotation mode both are requested in one structured-output call instead.
     """
     print(f"Sending data from {filename} to OpenAI for analysis...")
     
+    if annotation_mode == 'single':
+        return annotate_single_call(data_sample, filename)
+    
     # Step 1: Generate description
-    description = generate_description(data_sample, filename)
+    description, error = generate_description(data_sample, filename)
+    if error:
+        return build_analysis_result(error, error, error)
     
     # Step 2: Generate questions using the description and data
-    questions_data = generate_questions(data_sample, filename, description)
+    questions_data, error = generate_questions(data_sample, filename, description)
+    if error:
+        return build_analysis_result(description, error, error)
     
+    return build_analysis_result(description, questions_data)
+
+def build_analysis_result(description, questions_data, error=None):
+    """
+    Combines a description and the raw questions response into the analysis JSON structure.
+    error, if given, is recorded so the file is marked failed and retried on --resume
+    """
     # Parse questions into categories
     admin_questions, research_questions, clinical_questions, _ = parse_questions(questions_data)
     
@@ -331,15 +763,63 @@ def analyze_with_openai(data_sample, filename):
         "clinical_questions": clinical_questions,
         
     }
+    if error:
+        result["error"] = error
     
     return result
 
+# Sampling temperatures of the two chained steps
+DESCRIPTION_TEMPERATURE = 0.5
+QUESTIONS_TEMPERATURE = 0.7
+
+# Sampling temperature of the single-call annotation
+ANNOTATION_TEMPERATURE = 0.5
+
+# Example questions shown to the model in both annotation modes
+QUESTION_EXAMPLES = """#Examples of questions
+## Administrative questions
+- How many patients were admitted with a certain diagnosis?
+- How many patients were readmitted with a certain diagnosis?
+- Average length of stay for patients with a certain diagnosis?
+- Average length of stay in a certain unit?
+
+## Research questions
+- What is the relationship between the length of stay and the severity of the illness?
+- Demographics of patients with a certain diagnosis?
+- What is the relationship between the length of stay and the mortality rate?
+- What is the relationship between the length of stay and the readmission rate?
+
+## Clinical questions
+ - How long has patient X been in the hospital?
+ - What are lab values for patient X?
+ - How many previous admissions has patient X had?
+ - What procedures has patient X had?
+"""
+
 def generate_description(data_sample, filename):
     """
     First step: Generate a description of the data
+    Returns (description, error); error is None on success
     """
     print(f"Step 1: Generating description for {filename}...")
     
+    try:
+        with stage('describe'):
+            description = chat_completion(
+                messages=description_messages(data_sample, filename),
+                temperature=DESCRIPTION_TEMPERATURE
+            ).strip()
+        print(f"✓ Description generated ({len(description)} chars)")
+        return description, None
+        
+    except Exception as e:
+        print(f"Error generating description: {str(e)}")
+        return None, f"Error generating description: {str(e)}"
+
+def description_messages(data_sample, filename):
+    """
+    Builds the chat messages for the description step
+    """
     system_prompt = """
 You are a healthcare data analysis expert. Your goal is to read tabular hospital data and provide a clear and comprehensive description of the data.
 
@@ -360,30 +840,34 @@ File: {filename}
 {data_sample}
 """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.5
-        )
-        
-        description = response.choices[0].message.content.strip()
-        print(f"✓ Description generated ({len(description)} chars)")
-        return description
-        
-    except Exception as e:
-        print(f"Error generating description: {str(e)}")
-        return f"Error generating description: {str(e)}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
 
 def generate_questions(data_sample, filename, description):
     """
     Second step: Generate questions based on the description and original data
+    Returns (questions_data, error); error is None on success
     """
     print(f"Step 2: Generating questions for {filename} based on description...")
     
+    try:
+        with stage('questions'):
+            content = chat_completion(
+                messages=question_messages(data_sample, filename, description),
+                temperature=QUESTIONS_TEMPERATURE
+            ).strip()
+        return parse_questions_response(content), None
+        
+    except Exception as e:
+        print(f"Error generating questions: {str(e)}")
+        return None, f"Error generating questions: {str(e)}"
+
+def question_messages(data_sample, filename, description):
+    """
+    Builds the chat messages for the questions step
+    """
     system_prompt = """
 You are a healthcare data analysis expert. You goal is to generate 3 types of questions based on the description and the data sample.
 
@@ -397,25 +881,7 @@ Based on this information, generate a comprehensive LIST of questions that:
 - A hospital administrator might ask for operational/management insights
 - A researcher might ask to identify biomedically relevant patterns or research opportunities 
 
-#Examples of questions
-## Administrative questions
-- How many patients were admitted with a certain diagnosis?
-- How many patients were readmitted with a certain diagnosis?
-- Average length of stay for patients with a certain diagnosis?
-- Average length of stay in a certain unit?
-
-## Research questions
-- What is the relationship between the length of stay and the severity of the illness?
-- Demographics of patients with a certain diagnosis?
-- What is the relationship between the length of stay and the mortality rate?
-- What is the relationship between the length of stay and the readmission rate?
-
-## Clinical questions
- - How long has patient X been in the hospital?
- - What are lab values for patient X?
- - How many previous admissions has patient X had?
- - What procedures has patient X had?
-
+""" + QUESTION_EXAMPLES + """
 
 Focus on questions that would require analysis of the data and would provide actionable insights to the doctor, administrator, or researcher.
 The questions should be specific to the data columns available and overall relevant to the description of the data.
@@ -441,70 +907,398 @@ DESCRIPTION OF THE DATA:
 {description}
 """
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def parse_questions_response(content):
+    """
+    Parses the questions step response into a dict when it contains JSON,
+    otherwise returns the raw text for parse_questions to handle
+    """
+    parsed_content = extract_json_object(content)
+    if parsed_content is not None:
+        print(f"✓ Questions generated in JSON format")
+        return parsed_content
+    
+    # If we get here, we couldn't parse it as a JSON object
+    # Return the raw content so the parse_questions function can try to handle it
+    print(f"✓ Questions generated as text - will attempt to parse ({len(content)} chars)")
+    return content
+
+def annotation_messages(data_sample, filename):
+    """
+    Builds the chat messages for the single-call annotation: description and
+    all three question categories in one structured response
+    """
+    system_prompt = """
+You are a healthcare data analysis expert. Your goal is to read tabular hospital data, describe it and generate 3 types of questions that could be answered with it.
+
+#Precise Instructions
+You will be provided with hospital data (headers and sample rows).
+
+First, write a detailed description of the data (1-2 paragraphs) that includes:
+1. The purpose/function of this dataset in a hospital context
+2. Description of key columns, examples of data points/values and their significance
+3. The type of data captured and how it would be used in a hospital setting
+4. Explain any abbreviations or acronyms used in the data
+
+Then, based on the data and your description, generate a comprehensive LIST of questions that:
+- A doctor might ask to gain clinical insights for a specific individual patient
+- A hospital administrator might ask for operational/management insights
+- A researcher might ask to identify biomedically relevant patterns or research opportunities 
+
+""" + QUESTION_EXAMPLES + """
+Focus on questions that would require analysis of the data and would provide actionable insights to the doctor, administrator, or researcher.
+The questions should be specific to the data columns available and overall relevant to the description of the data.
+
+Return ONLY a JSON object of this form:
+{
+    "description": "...",
+    "administrative_questions": ["Question 1?", "Question 2?", "Question 3?"],
+    "research_questions": ["Question 4?", "Question 5?", "Question 6?"],
+    "clinical_questions": ["Question 7?", "Question 8?", "Question 9?"]
+}
+"""
+
+    user_prompt = f"""
+File: {filename}
+
+{data_sample}
+"""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def repair_messages(messages, content, problems):
+    """
+    Builds the follow-up request asking the model to fix an annotation that failed validation
+    """
+    return messages + [
+        {"role": "assistant", "content": content},
+        {"role": "user", "content": "Your response does not match the required JSON format:\n"
+                                    + "\n".join(f"- {problem}" for problem in problems)
+                                    + "\nReturn the corrected JSON object only."}
+    ]
+
+def check_annotation(content):
+    """
+    Parses and validates a single-call annotation response.
+    Returns (annotation, problems); problems is empty when the annotation is valid.
+    """
+    annotation = extract_json_object(content)
+    if annotation is None:
+        return None, ['the response does not contain a JSON object']
+    return annotation, validate_annotation(annotation)
+
+def annotation_result(annotation, problems):
+    """
+    Converts a validated annotation into the analysis JSON structure; when it is
+    still invalid after the repair attempt, the problems are recorded as the error
+    """
+    if problems:
+        error = f"Error generating annotation: invalid response ({'; '.join(problems)})"
+        print(error)
+        return build_analysis_result(error, error, error)
+    return build_analysis_result(annotation['description'].strip(), annotation)
+
+def annotate_single_call(data_sample, filename):
+    """
+    Generates the description and questions in one structured-output request.
+    A response that fails validation gets one repair request listing the problems.
+    """
+    print(f"Generating description and questions for {filename} in one request...")
+    messages = annotation_messages(data_sample, filename)
+    
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7
-        )
+        with stage('annotate'):
+            content = chat_completion(messages, ANNOTATION_TEMPERATURE, response_format=ANNOTATION_RESPONSE_FORMAT)
+        annotation, problems = check_annotation(content)
         
-        content = response.choices[0].message.content.strip()
-        
-        # Try to parse as JSON 
+        if problems:
+            print(f"Annotation for {filename} failed validation ({'; '.join(problems)}), asking for a repair...")
+            with stage('annotate_repair'):
+                content = chat_completion(repair_messages(messages, content, problems), ANNOTATION_TEMPERATURE,
+                                          response_format=ANNOTATION_RESPONSE_FORMAT)
+            annotation, problems = check_annotation(content)
+    
+    except Exception as e:
+        print(f"Error generating annotation: {str(e)}")
+        error = f"Error generating annotation: {str(e)}"
+        return build_analysis_result(error, error, error)
+    
+    if not problems:
+        print(f"✓ Annotation generated and validated")
+    return annotation_result(annotation, problems)
+
+def load_previous_summary(run_folder):
+    """
+    Reads analysis_summary.jsonl from an earlier (possibly interrupted) run.
+    Returns {source file path: summary record}, keeping the latest record per file.
+    """
+    jsonl_path = Path(run_folder) / 'analysis_summary.jsonl'
+    previous = {}
+    if not jsonl_path.exists():
+        return previous
+    
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash
+                continue
+            previous[record.get('File Path')] = record
+    
+    return previous
+
+def reusable_result(record, file_path):
+    """
+    Returns (True, result) if a previous run's record for file_path can be reused:
+    the source is unchanged and its analysis JSON exists, parses and records no
+    failed step. Error rows are never reused, so failed files are retried.
+    """
+    if record is None or record.get('File Type') == 'CSV (Error)':
+        return False, None
+    if record.get('_source_fingerprint') != source_fingerprint(file_path):
+        return False, None
+    
+    json_path = record.get('Analysis JSON Path')
+    if json_path in (None, '', 'N/A'):
+        return True, None
+    try:
+        with open(json_path, 'r') as f:
+            result = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False, None
+    if analysis_failed(result):
+        return False, None
+    return True, result
+
+def analysis_failed(result):
+    """
+    True if the description or questions step of an analysis JSON failed
+    """
+    if result.get('error'):
+        return True
+    # Runs from before failures were recorded separately only carry the error text
+    fields = ('description', 'administrative_questions', 'research_questions', 'clinical_questions')
+    return any(isinstance(result.get(field), str) and result[field].startswith('Error generating')
+               for field in fields)
+
+def run_annotation_batch(batch_client, run_folder, name, jobs, build_messages, temperature, poll_interval,
+                         response_format=None):
+    """
+    Runs one annotation step for all jobs through the Batch API, answering
+    cached requests locally. build_messages(job) returns the chat messages.
+    Returns {index: (content, error)}
+    """
+    outcomes = {}
+    requests = []
+    messages_by_index = {}
+    for index, job in jobs.items():
+        messages = build_messages(job)
+        cached = cached_response(messages, temperature, response_format=response_format)
+        if cached is not None:
+            outcomes[index] = (cached, None)
+        else:
+            messages_by_index[index] = messages
+            requests.append(batch_request(str(index), MODEL, messages, temperature, response_format))
+    
+    if outcomes:
+        print(f"{name}: {len(outcomes)} responses served from cache")
+    
+    started = time.perf_counter()
+    batch_outcomes = run_batch(batch_client, requests, Path(run_folder) / 'batches', name, poll_interval)
+    if metrics is not None:
+        metrics.record_stage(f'batch_{name}', time.perf_counter() - started,
+                             requests=len(requests), cached=len(outcomes))
+    for custom_id, (content, error) in batch_outcomes.items():
+        index = int(custom_id)
+        if content is not None:
+            cache_response(messages_by_index[index], temperature, content, response_format=response_format)
+            # Batch output files are not read for usage; tokens are counted locally
+            jobs[index]['usage'].add(count_message_tokens(messages_by_index[index], MODEL),
+                                     count_tokens(content, MODEL))
+        outcomes[index] = (content, error)
+    
+    return outcomes
+
+def batch_chained_analyses(jobs, run_folder, batch_client, poll_interval):
+    """
+    Chained annotation in two batches: all descriptions first, then all question
+    requests built from them. Returns {index: analysis result}
+    """
+    analyses = {}
+    
+    # Step 1: descriptions
+    print(f"Step 1: Generating descriptions for {len(jobs)} files in a batch...")
+    description_outcomes = run_annotation_batch(
+        batch_client, run_folder, 'descriptions', jobs,
+        lambda job: description_messages(job['data_sample'], job['csv_file_path'].name),
+        DESCRIPTION_TEMPERATURE, poll_interval
+    )
+    described = {}
+    for index, (content, error) in description_outcomes.items():
+        if content is None:
+            message = f"Error generating description: {error}"
+            analyses[index] = build_analysis_result(message, message, message)
+        else:
+            jobs[index]['description'] = content.strip()
+            described[index] = jobs[index]
+    
+    # Step 2: questions, built from the descriptions that succeeded
+    print(f"Step 2: Generating questions for {len(described)} files in a batch...")
+    question_outcomes = run_annotation_batch(
+        batch_client, run_folder, 'questions', described,
+        lambda job: question_messages(job['data_sample'], job['csv_file_path'].name, job['description']),
+        QUESTIONS_TEMPERATURE, poll_interval
+    )
+    
+    for index, job in described.items():
+        content, error = question_outcomes[index]
+        if content is None:
+            message = f"Error generating questions: {error}"
+            analyses[index] = build_analysis_result(job['description'], message, message)
+        else:
+            analyses[index] = build_analysis_result(job['description'], parse_questions_response(content.strip()))
+    
+    return analyses
+
+def batch_single_analyses(jobs, run_folder, batch_client, poll_interval):
+    """
+    Single-call annotation in one structured-output batch, followed by one
+    repair batch for responses that fail validation. Returns {index: analysis result}
+    """
+    analyses = {}
+    
+    def messages_for(job):
+        return annotation_messages(job['data_sample'], job['csv_file_path'].name)
+    
+    print(f"Generating annotations for {len(jobs)} files in a batch...")
+    outcomes = run_annotation_batch(batch_client, run_folder, 'annotations', jobs, messages_for,
+                                    ANNOTATION_TEMPERATURE, poll_interval, ANNOTATION_RESPONSE_FORMAT)
+    
+    checked = {}
+    repairs = {}
+    for index, (content, error) in outcomes.items():
+        if content is None:
+            message = f"Error generating annotation: {error}"
+            analyses[index] = build_analysis_result(message, message, message)
+            continue
+        checked[index] = check_annotation(content)
+        if checked[index][1]:
+            repairs[index] = dict(jobs[index], content=content, problems=checked[index][1])
+    
+    if repairs:
+        print(f"Repairing {len(repairs)} annotations that failed validation in a batch...")
+        repair_outcomes = run_annotation_batch(
+            batch_client, run_folder, 'annotation_repairs', repairs,
+            lambda job: repair_messages(messages_for(job), job['content'], job['problems']),
+            ANNOTATION_TEMPERATURE, poll_interval, ANNOTATION_RESPONSE_FORMAT
+        )
+        for index, (content, error) in repair_outcomes.items():
+            if content is not None:
+                checked[index] = check_annotation(content)
+    
+    for index, (annotation, problems) in checked.items():
+        analyses[index] = annotation_result(annotation, problems)
+    
+    return analyses
+
+def process_files_batch(pending, run_folder, summary, batch_client, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Analyzes files through Batch API submissions instead of per-file calls,
+    in the configured annotation mode.
+    pending is a list of (index, process_file, file_path); rows are appended to summary.
+    Per-file metrics cover sample preparation; batch submissions and output
+    writing are recorded as run-level stages.
+    Returns {index: result}
+    """
+    results = {}
+    jobs = {}
+    
+    # Build every data sample up front
+    for index, process_file, file_path in pending:
+        with file_metrics(metrics, file_path):
+            job = prepare_batch_job(index, process_file, file_path, run_folder, summary)
+        if job is not None:
+            jobs[index] = job
+    
+    if annotation_mode == 'single':
+        analyses = batch_single_analyses(jobs, run_folder, batch_client, poll_interval)
+    else:
+        analyses = batch_chained_analyses(jobs, run_folder, batch_client, poll_interval)
+    
+    # Write the same per-file outputs as the synchronous path
+    started = time.perf_counter()
+    for index, job in jobs.items():
         try:
-            # Check for markdown code block
-            if content.startswith("```") and "```" in content[3:]:
-                # Extract content from code block
-                json_content = content.split("```")[1]
-                if json_content.startswith("json\n"):
-                    json_content = json_content[5:]
-                parsed_content = json.loads(json_content)
-                print(f"✓ Questions generated from markdown code block")
-                return parsed_content
-            
-            # Try to parse as direct JSON object
-            if content.startswith("{") and content.endswith("}"):
-                parsed_content = json.loads(content)
-                if isinstance(parsed_content, dict):
-                    print(f"✓ Questions generated in correct JSON format")
-                    return parsed_content
-            
-            # Look for JSON structure within text
-            json_start = content.find('{')
-            json_end = content.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = content[json_start:json_end]
-                parsed_content = json.loads(json_str)
-                if isinstance(parsed_content, dict):
-                    print(f"✓ Questions generated and extracted from text")
-                    return parsed_content
-        
-        except json.JSONDecodeError as e:
-            print(f"Could not parse questions as JSON: {e}")
-        
-        # If we get here, we couldn't parse it as a JSON object
-        # Return the raw content so the parse_questions function can try to handle it
-        print(f"✓ Questions generated as text - will attempt to parse ({len(content)} chars)")
-        return content
-        
+            result = analyses[index]
+            new_row = save_csv_analysis(result, job['csv_file_path'], run_folder,
+                                        job.get('original_path'), job['profile'])
+            results[index] = result
+        except Exception as e:
+            print(f"Error processing CSV file {job['csv_file_path']}: {str(e)}")
+            new_row = csv_error_row(job['csv_file_path'], job.get('original_path'))
+        new_row.update(job['usage'].summary_fields(MODEL, batch=not isinstance(batch_client, LocalBatchClient)))
+        summary.append(index, new_row, fingerprint=job['fingerprint'])
+    if metrics is not None:
+        metrics.record_stage('write_outputs', time.perf_counter() - started, files=len(jobs))
+    
+    return results
+
+def prepare_batch_job(index, process_file, file_path, run_folder, summary):
+    """
+    Resolves a file and builds its data sample for batch annotation.
+    Returns the job, or None when the file was handled (summary row appended) without one
+    """
+    fingerprint = source_fingerprint(file_path)
+    if process_file is process_gz_file:
+        csv_args, new_row = resolve_gz_file(file_path, run_folder)
+    else:
+        csv_args, new_row = dict(csv_file_path=file_path, run_folder=run_folder), None
+    
+    if csv_args is None:
+        summary.append(index, new_row, fingerprint=fingerprint)
+        return None
+    
+    csv_file_path = csv_args['csv_file_path']
+    print(f"Processing CSV file: {csv_file_path}")
+    try:
+        data_sample, profile = build_data_sample(csv_file_path, csv_args.get('sample_path'))
     except Exception as e:
-        print(f"Error generating questions: {str(e)}")
-        return f"Error generating questions: {str(e)}"
+        print(f"Error processing CSV file {csv_file_path}: {str(e)}")
+        summary.append(index, csv_error_row(csv_file_path, csv_args.get('original_path')),
+                       fingerprint=fingerprint)
+        return None
+    
+    return dict(csv_args, data_sample=data_sample, profile=profile, fingerprint=fingerprint,
+                usage=UsageTracker())
 
-def scan_directory(directory_path, run_folder, summary_df):
+def scan_directory(directory_path, run_folder, summary, workers=1, previous=None, batch_client=None):
     """
-    Recursively scans a directory for .gz and .csv files and processes them
+    Recursively scans a directory for .gz and .csv files and processes them.
+    Each file's summary row is handed to the SummaryWriter as soon as it finishes.
+    With workers > 1, files are processed concurrently in a thread pool; results
+    and summary rows are still collected in directory-walk order, so the output
+    matches a serial run.
+    previous, from load_previous_summary(), lets a resumed run skip files that
+    were already analyzed and have not changed.
+    With a batch_client, the LLM steps are submitted through the Batch API instead.
+    Returns (results, summary DataFrame)
     """
+    previous = previous or {}
     dir_path = Path(directory_path)
-    results = []
     
     print(f"Scanning directory: {dir_path}")
     
     # Walk through all files in the directory and its subdirectories
+    scan_started = time.perf_counter()
+    tasks = []
     for root, _, files in os.walk(dir_path):
         root_path = Path(root)
         
@@ -513,38 +1307,181 @@ def scan_directory(directory_path, run_folder, summary_df):
             
             # Process based on file extension
             if file.lower().endswith('.gz'):
-                result, new_row = process_gz_file(file_path, run_folder, summary_df)
-                summary_df = pd.concat([summary_df, new_row], ignore_index=True)
-                if result:
-                    results.append(result)
+                tasks.append((process_gz_file, file_path))
             elif file.lower().endswith('.csv'):
-                result, new_row = process_csv_file(file_path, run_folder, summary_df)
-                summary_df = pd.concat([summary_df, new_row], ignore_index=True)
-                if result:
-                    results.append(result)
+                tasks.append((process_csv_file, file_path))
+    
+    if metrics is not None:
+        metrics.record_stage('scan', time.perf_counter() - scan_started, files_found=len(tasks))
+    
+    # Reuse files a resumed run already analyzed
+    results_by_index = {}
+    pending = []
+    for index, (process_file, file_path) in enumerate(tasks):
+        record = previous.get(str(file_path))
+        reusable, result = reusable_result(record, file_path)
+        if reusable:
+            print(f"Skipping {file_path} (already analyzed, unchanged)")
+            row = {column: record.get(column, '') for column in SUMMARY_COLUMNS}
+            summary.append(index, row, persist=False)
+            results_by_index[index] = result
+        else:
+            pending.append((index, process_file, file_path))
+    
+    def run_task(pending_task):
+        index, process_file, file_path = pending_task
+        fingerprint = source_fingerprint(file_path)
+        with file_metrics(metrics, file_path):
+            result, new_row = process_file(file_path, run_folder)
+        summary.append(index, new_row, fingerprint=fingerprint)
+        return index, result
     
-    return results, summary_df
+    if batch_client is not None:
+        results_by_index.update(process_files_batch(pending, run_folder, summary, batch_client,
+                                                    poll_interval=batch_poll_interval))
+    elif workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results_by_index.update(executor.map(run_task, pending))
+    else:
+        results_by_index.update(map(run_task, pending))
+    
+    results = [results_by_index[i] for i in sorted(results_by_index) if results_by_index[i]]
+    
+    return results, summary.to_dataframe()
 
 def main():
+    global rate_limiter, response_cache, refresh_cache, sample_mode, sample_seed, extract_gz
+    global profile_columns, prompt_style, profile_max_rows, batch_poll_interval, backend, MODEL
+    global annotation_mode, sample_token_budget, metrics
+    
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Process hospital data files')
     parser.add_argument('directory', type=str, help='Directory containing data files')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of files analyzed concurrently (default: 1, serial)')
+    parser.add_argument('--requests-per-minute', type=int, default=None,
+                        help='OpenAI requests-per-minute quota to stay under (default: unlimited)')
+    parser.add_argument('--tokens-per-minute', type=int, default=None,
+                        help='OpenAI tokens-per-minute quota to stay under (default: unlimited)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the LLM response cache')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignore cached responses and overwrite them with fresh ones')
+    parser.add_argument('--cache-path', type=str, default=str(DEFAULT_CACHE_PATH),
+                        help=f'LLM response cache file (default: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--cache-max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help=f'Evict cached responses older than this (default: {DEFAULT_MAX_AGE_DAYS})')
+    parser.add_argument('--cache-max-size-mb', type=float, default=DEFAULT_MAX_SIZE_MB,
+                        help=f'Evict least recently used responses beyond this size (default: {DEFAULT_MAX_SIZE_MB})')
+    parser.add_argument('--sample-mode', choices=['head', 'reservoir'], default='head',
+                        help='How sample rows are chosen: the first rows (default) or a random reservoir sample over the whole file')
+    parser.add_argument('--sample-seed', type=int, default=None,
+                        help='Random seed for --sample-mode reservoir, for reproducible prompts')
+    parser.add_argument('--extract', action='store_true',
+                        help='Extract .gz files into the run folder (default: read samples directly from the compressed stream)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Compute a column profile (dtype, nulls, cardinality, ranges, top values) for each file and save it as <name>.profile.json')
+    parser.add_argument('--prompt-style', choices=['rows', 'profile'], default='rows',
+                        help='Send the raw sample rows (default) or the compact column profile to the LLM')
+    parser.add_argument('--profile-max-rows', type=int, default=profile_max_rows,
+                        help=f'Maximum rows streamed when profiling a file (default: {profile_max_rows})')
+    parser.add_argument('--resume', type=str, default=None, metavar='RUN_FOLDER',
+                        help='Continue an earlier annotation run, only analyzing files that are missing, failed or changed')
+    parser.add_argument('--annotation-mode', choices=['chained', 'single'], default='chained',
+                        help="'chained' (default) requests the description, then the questions; 'single' requests both in one JSON-schema structured-output call")
+    parser.add_argument('--sample-token-budget', type=int, default=DEFAULT_SAMPLE_TOKEN_BUDGET,
+                        help=f'Shrink each data sample to at most this many tokens by truncating long cells, dropping rows or columns (default: {DEFAULT_SAMPLE_TOKEN_BUDGET}, 0 disables)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Submit all description requests, then all question requests, as Batch API jobs instead of per-file calls')
+    parser.add_argument('--batch-backend', choices=['openai', 'local'], default='openai',
+                        help="Batch backend: the OpenAI Batch API (default) or 'local', which runs batch files through the regular chat endpoint")
+    parser.add_argument('--batch-poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f'Seconds between batch status checks (default: {DEFAULT_POLL_INTERVAL})')
+    parser.add_argument('--backend', choices=['openai', 'compatible', 'fake'], default='openai',
+                        help="LLM backend: OpenAI (default), an OpenAI-compatible server at --base-url, or 'fake', a deterministic offline stand-in")
+    parser.add_argument('--base-url', type=str, default=None,
+                        help='Base URL of an OpenAI-compatible server, e.g. http://localhost:8000/v1 (llama.cpp, vLLM)')
+    parser.add_argument('--model', type=str, default=MODEL,
+                        help=f'Model name sent with every request (default: {MODEL})')
+    parser.add_argument('--fake-latency', type=float, default=0.0,
+                        help='Seconds each request takes with --backend fake (default: 0)')
+    parser.add_argument('--fake-failure-rate', type=float, default=0.0,
+                        help='Share of requests that fail with a retryable 429 error with --backend fake (default: 0)')
+    parser.add_argument('--fake-seed', type=int, default=0,
+                        help='Seed for fake responses and failures (default: 0)')
     args = parser.parse_args()
     
-    # Check if OPENAI_API_KEY is set
-    if not os.environ.get("OPENAI_API_KEY"):
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.backend == 'compatible' and not args.base_url:
+        parser.error('--backend compatible needs --base-url')
+    if args.batch and args.batch_backend == 'openai' and args.backend != 'openai':
+        parser.error("--batch with a non-OpenAI backend needs --batch-backend local")
+    
+    # Apply command-line settings to the module-level configuration
+    sample_mode = args.sample_mode
+    sample_seed = args.sample_seed
+    extract_gz = args.extract
+    profile_columns = args.profile
+    prompt_style = args.prompt_style
+    profile_max_rows = args.profile_max_rows
+    batch_poll_interval = args.batch_poll_interval
+    annotation_mode = args.annotation_mode
+    sample_token_budget = args.sample_token_budget or None
+    rate_limiter = RateLimiter(args.requests_per_minute, args.tokens_per_minute)
+    
+    if not args.no_cache:
+        response_cache = ResponseCache(args.cache_path, args.cache_max_age_days, args.cache_max_size_mb)
+        refresh_cache = args.refresh
+    
+    # Check if OPENAI_API_KEY is set (local servers and the fake backend do not need one)
+    if args.backend == 'openai' and not os.environ.get("OPENAI_API_KEY"):
         print("Error: OPENAI_API_KEY environment variable is not set.")
         print("Please set it in your .env file or export it with: export OPENAI_API_KEY='your-api-key'")
         sys.exit(1)
     
-    # Create annotation run folder
-    run_folder = create_annotation_run_folder()
+    MODEL = args.model
+    backend = make_backend(args.backend, base_url=args.base_url, api_key=os.environ.get("OPENAI_API_KEY"),
+                           latency=args.fake_latency, failure_rate=args.fake_failure_rate, seed=args.fake_seed)
+    
+    # Create annotation run folder, or continue an earlier one
+    previous = None
+    if args.resume:
+        run_folder = Path(args.resume)
+        if not run_folder.is_dir():
+            print(f"Error: run folder '{run_folder}' does not exist")
+            sys.exit(1)
+        previous = load_previous_summary(run_folder)
+        print(f"Resuming annotation run in {run_folder} ({len(previous)} files recorded)")
+    else:
+        run_folder = create_annotation_run_folder()
+    
+    # Summary rows are streamed to analysis_summary.jsonl as each file finishes
+    summary = SummaryWriter(run_folder)
     
-    # Initialize summary DataFrame
-    summary_df = init_summary_df()
+    # Stage timings, API latency, retries and tokens are streamed to metrics.jsonl
+    metrics = PipelineMetrics(run_folder)
+    
+    batch_client = None
+    if args.batch:
+        if args.batch_backend == 'local':
+            # run_annotation_batch already checked the cache for these requests and stores the results
+            batch_client = LocalBatchClient(
+                responder=lambda body: chat_completion(body['messages'], body['temperature'], body['model'],
+                                                      body.get('response_format'), use_cache=False),
+                storage_dir=run_folder / 'batches' / 'local_files'
+            )
+        else:
+            batch_client = backend.client
     
     # Process the directory
-    results, summary_df = scan_directory(args.directory, run_folder, summary_df)
+    try:
+        results, summary_df = scan_directory(args.directory, run_folder, summary,
+                                             workers=args.workers, previous=previous,
+                                             batch_client=batch_client)
+    finally:
+        summary.close()
+        metrics.close()
     
     # Save the summary DataFrame to CSV
     summary_csv_path = run_folder / 'analysis_summary.csv'
@@ -554,7 +1491,25 @@ def main():
     print(f"\nSummary: Processed {len(results)} files")
     print(f"Results saved to: {run_folder}")
     print(f"Summary CSV: {summary_csv_path}")
+    
+    prompt_tokens = pd.to_numeric(summary_df['Prompt Tokens'], errors='coerce').sum()
+    completion_tokens = pd.to_numeric(summary_df['Completion Tokens'], errors='coerce').sum()
+    cost = pd.to_numeric(summary_df['Estimated Cost (USD)'], errors='coerce').sum()
+    print(f"Tokens: {prompt_tokens:,.0f} prompt, {completion_tokens:,.0f} completion (estimated cost ${cost:.4f})")
     print(f"\nThe CSV includes full descriptions and questions, so there's no need to run process_analysis_results.py separately.")
+    
+    print(f"\nTimings (details in {metrics.path}):")
+    print(render_summary(metrics.summary()))
+    
+    if response_cache is not None:
+        evicted = response_cache.evict()
+        stats = response_cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries ({stats['size_bytes'] / 1024 / 1024:.1f} MB), {evicted} evicted")
+        response_cache.close()
+    
+    if args.backend == 'fake':
+        print(f"Fake backend: {backend.calls} requests, {backend.failures} simulated failures")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
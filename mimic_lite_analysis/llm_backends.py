@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import json
+import time
+import random
+import hashlib
+import threading
+
+from token_budget import count_message_tokens, count_tokens
+
+# API key sent to OpenAI-compatible servers that do not check one
+PLACEHOLDER_API_KEY = 'not-needed'
+
+class BackendError(Exception):
+    """
+    Error raised by a backend request. status_code follows HTTP conventions so
+    that 429/5xx errors are retried like OpenAI API errors.
+    """
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+def is_retryable_error(error):
+    """
+    Returns True for rate-limit, server-side and connection errors
+    """
+    try:
+        from openai import APIConnectionError
+        if isinstance(error, APIConnectionError):
+            return True
+    except ImportError:
+        pass
+    status_code = getattr(error, 'status_code', None)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+class OpenAIBackend:
+    """
+    Chat completions through the OpenAI API, or through any OpenAI-compatible
+    server (llama.cpp, vLLM, ...) when base_url is given.
+    The openai package is only imported when this backend is created.
+    """
+    name = 'openai'
+
+    def __init__(self, api_key=None, base_url=None):
+        from openai import OpenAI
+
+        if base_url and not api_key:
+            api_key = PLACEHOLDER_API_KEY
+        # Retries are handled by the caller
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.base_url = base_url
+
+    def complete(self, model, messages, temperature, response_format=None):
+        """
+        Returns (content, usage) where usage is (prompt_tokens, completion_tokens),
+        or None when the server does not report usage
+        """
+        extra = {'response_format': response_format} if response_format is not None else {}
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            **extra
+        )
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            usage = (usage.prompt_tokens, usage.completion_tokens)
+        return response.choices[0].message.content, usage
+
+class FakeBackend:
+    """
+    Deterministic offline stand-in for load tests and benchmarks.
+    Every request sleeps for `latency` seconds and fails with a retryable 429
+    error with probability failure_rate. Responses and failures depend only on
+    the request and seed, so runs are reproducible regardless of thread scheduling.
+    """
+    name = 'fake'
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.attempts = {}
+        self.calls = 0
+        self.failures = 0
+
+    def request_digest(self, model, messages, temperature, response_format=None):
+        payload = json.dumps([model, messages, temperature, response_format], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def complete(self, model, messages, temperature, response_format=None):
+        digest = self.request_digest(model, messages, temperature, response_format)
+        with self.lock:
+            attempt = self.attempts.get(digest, 0)
+            self.attempts[digest] = attempt + 1
+            self.calls += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        # The n-th attempt of a given request always succeeds or fails the same way
+        rng = random.Random(f'{self.seed}:{digest}:{attempt}')
+        if rng.random() < self.failure_rate:
+            with self.lock:
+                self.failures += 1
+            raise BackendError('fake backend: simulated rate limit', status_code=429)
+
+        content = self.fake_content(messages, random.Random(f'{self.seed}:{digest}'), response_format)
+        return content, (count_message_tokens(messages, model), count_tokens(content, model))
+
+    def fake_content(self, messages, rng, response_format=None):
+        """
+        Returns a full annotation object for structured-output requests, a JSON
+        object of questions when the prompt asks for JSON, otherwise a short
+        description naming the file from the user prompt
+        """
+        prompt = '\n'.join(m['content'] for m in messages)
+        user_prompt = messages[1]['content'].strip() if len(messages) > 1 else ''
+        subject = user_prompt.splitlines()[0] if user_prompt else 'the data'
+        tag = rng.randrange(10000)
+        description = f"Fake description of {subject} (#{tag}). This text was generated offline by the fake backend."
+        questions = {
+            f'{category}_questions': [f"Fake {category} question {i + 1} about {subject} (#{tag})" for i in range(3)]
+            for category in ('administrative', 'research', 'clinical')
+        }
+
+        if response_format is not None:
+            return json.dumps({'description': description, **questions})
+        if 'JSON' in prompt:
+            return json.dumps(questions)
+        return description
+
+def make_backend(name, base_url=None, api_key=None, latency=0.0, failure_rate=0.0, seed=0):
+    """
+    Creates a backend by name: 'openai', 'compatible' (needs base_url) or 'fake'
+    """
+    if name == 'fake':
+        return FakeBackend(latency=latency, failure_rate=failure_rate, seed=seed)
+    if name == 'compatible' and not base_url:
+        raise ValueError("the 'compatible' backend needs a base URL")
+    if name in ('openai', 'compatible'):
+        return OpenAIBackend(api_key=api_key, base_url=base_url)
+    raise ValueError(f"unknown backend: {name}")
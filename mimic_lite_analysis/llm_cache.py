@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+# Default location, shared by all annotation runs
+DEFAULT_CACHE_PATH = Path('annotation_runs') / 'llm_cache.sqlite'
+
+# Entries older than this are evicted
+DEFAULT_MAX_AGE_DAYS = 90
+
+# Least recently used entries are evicted once the cache grows past this size
+DEFAULT_MAX_SIZE_MB = 512
+
+def make_cache_key(model, messages, temperature, response_format=None):
+    """
+    Returns a content hash of everything that determines a completion:
+    model, system prompt, user prompt, temperature and structured-output format
+    """
+    request = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+    }
+    # Only part of the key when set, so keys of plain requests are unchanged
+    if response_format is not None:
+        request['response_format'] = response_format
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of LLM responses keyed on make_cache_key().
+    Safe to share between worker threads.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                 max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age_seconds = max_age_days * 24 * 3600 if max_age_days else None
+        self.max_size_bytes = max_size_mb * 1024 * 1024 if max_size_mb else None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                created_at REAL,
+                last_used REAL
+            )
+        """)
+
+    def get(self, key):
+        """
+        Returns the cached response for a key, or None
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT response, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (self.max_age_seconds and now - row[1] > self.max_age_seconds):
+                self.misses += 1
+                return None
+            self.conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, response):
+        """
+        Stores a response
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, response, len(response.encode('utf-8')), now, now)
+            )
+
+    def evict(self):
+        """
+        Removes expired entries, then least recently used ones until the cache fits its size limit.
+        Returns the number of entries removed.
+        """
+        removed = 0
+        with self.lock:
+            if self.max_age_seconds:
+                cursor = self.conn.execute(
+                    'DELETE FROM responses WHERE created_at < ?', (time.time() - self.max_age_seconds,)
+                )
+                removed += cursor.rowcount
+
+            if self.max_size_bytes:
+                total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+                if total > self.max_size_bytes:
+                    to_delete = []
+                    for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY last_used'):
+                        if total <= self.max_size_bytes:
+                            break
+                        to_delete.append((key,))
+                        total -= size
+                    self.conn.executemany('DELETE FROM responses WHERE key = ?', to_delete)
+                    removed += len(to_delete)
+        return removed
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current number of entries and size
+        """
+        with self.lock:
+            entries, size = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'size_bytes': size}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import json
+import time
+import argparse
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+METRICS_FILENAME = 'metrics.jsonl'
+
+def percentile(values, q):
+    """
+    Returns the q-th percentile (0-100) of values by linear interpolation
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+class PipelineMetrics:
+    """
+    Writes one JSON line per stage (LLM requests included) and per file to metrics.jsonl in the
+    run folder, and keeps the stage timings for the end-of-run summary.
+    Safe to share between worker threads.
+    """
+    def __init__(self, run_folder):
+        self.path = Path(run_folder) / METRICS_FILENAME
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stage_seconds = defaultdict(list)
+        self.files = 0
+
+    def record(self, record):
+        record = dict(record, time=round(time.time(), 3))
+        with self.lock:
+            self.file.write(json.dumps(record, default=str) + '\n')
+            self.file.flush()
+            if record['type'] == 'stage':
+                self.stage_seconds[record['stage']].append(record['seconds'])
+            elif record['type'] == 'file':
+                self.files += 1
+                self.stage_seconds['file_total'].append(record['seconds'])
+
+    def record_stage(self, name, seconds, **fields):
+        """
+        Records a run-level stage that does not belong to a single file
+        """
+        self.record({'type': 'stage', 'file': None, 'stage': name, 'seconds': round(seconds, 6), **fields})
+
+    def summary(self):
+        """
+        Returns {'files', 'wall_seconds', 'files_per_minute', 'stages': {stage: {count, total, p50, p95}}}
+        """
+        with self.lock:
+            wall = time.perf_counter() - self.started
+            return summarize_stages(self.stage_seconds, self.files, wall)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def summarize_stages(stage_seconds, files, wall_seconds):
+    return {
+        'files': files,
+        'wall_seconds': round(wall_seconds, 3),
+        'files_per_minute': round(files / wall_seconds * 60, 2) if wall_seconds > 0 else None,
+        'stages': {
+            stage: {
+                'count': len(seconds),
+                'total': round(sum(seconds), 3),
+                'p50': round(percentile(seconds, 50), 4),
+                'p95': round(percentile(seconds, 95), 4),
+            }
+            for stage, seconds in stage_seconds.items()
+        },
+    }
+
+def render_summary(summary):
+    """
+    Formats a summary as a table, one line per stage
+    """
+    lines = [f"{summary['files']} files in {summary['wall_seconds']:.1f}s "
+             f"({summary['files_per_minute'] or 0:.1f} files/min)",
+             f"{'stage':<20} {'count':>6} {'total s':>9} {'p50 s':>8} {'p95 s':>8}"]
+    for stage, stats in sorted(summary['stages'].items(), key=lambda item: -item[1]['total']):
+        lines.append(f"{stage:<20} {stats['count']:>6} {stats['total']:>9.2f} "
+                     f"{stats['p50']:>8.3f} {stats['p95']:>8.3f}")
+    return '\n'.join(lines)
+
+class FileMetrics:
+    """
+    Collects the stages and counters of one file; written as a 'file' record when done
+    """
+    def __init__(self, metrics, file_path):
+        self.metrics = metrics
+        self.file = str(file_path)
+        self.started = time.perf_counter()
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add_stage(self, name, seconds, fields):
+        with self.lock:
+            self.stages[name] += seconds
+        if self.metrics is not None:
+            self.metrics.record({'type': 'stage', 'file': self.file, 'stage': name,
+                                 'seconds': round(seconds, 6), **fields})
+
+    def add(self, **counters):
+        with self.lock:
+            for name, value in counters.items():
+                self.counters[name] += value
+
+    def finish(self):
+        if self.metrics is None:
+            return
+        self.metrics.record({
+            'type': 'file',
+            'file': self.file,
+            'seconds': round(time.perf_counter() - self.started, 6),
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            **self.counters,
+        })
+
+# Metrics of the file being processed in this thread/context
+current_file = contextvars.ContextVar('current_file', default=None)
+
+@contextmanager
+def file_metrics(metrics, file_path):
+    """
+    Attributes the stages and counters recorded inside the block to file_path.
+    With metrics None, stages are still timed but nothing is written.
+    """
+    tracker = FileMetrics(metrics, file_path)
+    token = current_file.set(tracker)
+    try:
+        yield tracker
+    finally:
+        current_file.reset(token)
+        tracker.finish()
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Times the block as a stage of the current file
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started, **fields)
+
+def record_stage(name, seconds, **fields):
+    """
+    Records an already timed stage (e.g. an LLM request) for the current file
+    """
+    tracker = current_file.get()
+    if tracker is not None:
+        tracker.add_stage(name, seconds, fields)
+
+def add_counters(**counters):
+    """
+    Adds to the current file's counters, e.g. bytes_read or rows_sampled
+    """
+    tracker = current_file.get()
+    if tracker is not None:
+        tracker.add(**counters)
+
+def load_summary(path):
+    """
+    Rebuilds the end-of-run summary from a metrics.jsonl file
+    """
+    stage_seconds = defaultdict(list)
+    files = 0
+    first = last = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            first = record['time'] if first is None else min(first, record['time'])
+            last = record['time'] if last is None else max(last, record['time'])
+            if record['type'] == 'stage':
+                stage_seconds[record['stage']].append(record['seconds'])
+            elif record['type'] == 'file':
+                files += 1
+                stage_seconds['file_total'].append(record['seconds'])
+                # The earliest file started before its record was written
+                first = min(first, record['time'] - record['seconds'])
+    return summarize_stages(stage_seconds, files, (last - first) if first is not None else 0)
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the metrics of an annotation run')
+    parser.add_argument('run_folder', type=str, help='Annotation run folder containing metrics.jsonl')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    summary = load_summary(Path(args.run_folder) / METRICS_FILENAME)
+    print(json.dumps(summary, indent=4) if args.json else render_summary(summary))
+
+if __name__ == "__main__":
+    main()
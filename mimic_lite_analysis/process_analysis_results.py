@@ -5,6 +5,8 @@ import argparse
 import json
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from analysis_index import select_analysis_files
 
 def find_json_files(directory):
     """
@@ -31,12 +33,63 @@ def extract_base_name(filename):
         return name.split('.')[0]
     return name
 
-def process_json_files(directory, csv_path, output_path):
+# Columns filled in from the analysis JSON files
+ANALYSIS_COLUMNS = ['Description', 'Questions', 'Full_Description', 'Full_Questions', 'Raw_JSON']
+
+# Threads used to read JSON files (the work is I/O bound)
+DEFAULT_WORKERS = 8
+
+def load_analysis_json(json_path):
+    """
+    Reads one analysis JSON file into its summary fields.
+    Returns a dict keyed by ANALYSIS_COLUMNS plus 'csv_filename', or None if the file cannot be used
+    """
+    try:
+        # Read the JSON file
+        with open(json_path, 'r') as f:
+            json_data = json.load(f)
+        if not isinstance(json_data, dict):
+            raise ValueError('not a JSON object')
+    except Exception as e:
+        print(f"  Error processing {json_path}: {e}")
+        return None
+    
+    # Extract description and questions
+    description = json_data.get('description', '')
+    questions = json_data.get('questions', '')
+    
+    # If questions is a list, convert to string for display
+    questions_display = questions
+    if isinstance(questions_display, list):
+        questions_display = '\n'.join([f"- {q}" for q in questions_display])
+    
+    return {
+        'csv_filename': f"{extract_base_name(Path(json_path).name)}.csv",
+        'Description': description,
+        'Questions': questions_display,
+        'Full_Description': description,
+        'Full_Questions': questions if isinstance(questions, str) else json.dumps(questions),
+        'Raw_JSON': json.dumps(json_data),  # Store the full JSON content
+    }
+
+def load_analyses(json_files, workers=DEFAULT_WORKERS):
+    """
+    Reads all JSON files in parallel into one DataFrame, one row per file that could be read,
+    in json_files order
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        records = [record for record in executor.map(load_analysis_json, json_files) if record is not None]
+    
+    return pd.DataFrame(records, columns=['csv_filename'] + ANALYSIS_COLUMNS, dtype=object)
+
+def process_json_files(directory, csv_path, output_path, workers=DEFAULT_WORKERS, json_files=None):
     """
-    Process all JSON files in the directory and update the CSV
+    Process all JSON files in the directory (or the given json_files, in order) and update the CSV.
+    All JSON files are parsed first, then merged into the CSV in one join on Filename.
     """
     # Find all JSON files
-    json_files = find_json_files(directory)
+    if json_files is None:
+        json_files = find_json_files(directory)
     print(f"Found {len(json_files)} JSON files")
     
     # Read the input CSV
@@ -52,63 +105,24 @@ def process_json_files(directory, csv_path, output_path):
         print("Error: CSV file does not have a 'Filename' column")
         sys.exit(1)
     
-    # Add columns for description and questions if they don't exist
-    if 'Description' not in df.columns:
-        df['Description'] = ''
-    if 'Questions' not in df.columns:
-        df['Questions'] = ''
-    if 'Full_Description' not in df.columns:  # Add column for full description
-        df['Full_Description'] = ''
-    if 'Full_Questions' not in df.columns:   # Add column for full questions
-        df['Full_Questions'] = ''
-    if 'Raw_JSON' not in df.columns:         # Add column for raw JSON content
-        df['Raw_JSON'] = ''
-    
-    # Track how many files were processed
-    processed_count = 0
-    
-    # Process each JSON file
-    for json_path in json_files:
-        try:
-            # Extract base name
-            base_name = extract_base_name(json_path.name)
-            csv_filename = f"{base_name}.csv"
-            
-            print(f"Processing: {json_path.name} (looking for {csv_filename})")
-            
-            # Find matching rows in DataFrame
-            matching_rows = df['Filename'] == csv_filename
-            
-            if not matching_rows.any():
-                print(f"  No matching row found for {csv_filename}")
-                continue
-            
-            # Read the JSON file
-            with open(json_path, 'r') as f:
-                json_data = json.load(f)
-                raw_json = json.dumps(json_data)  # Store the full JSON content
-            
-            # Extract description and questions
-            description = json_data.get('description', '')
-            questions = json_data.get('questions', '')
-            
-            # If questions is a list, convert to string for display
-            questions_display = questions
-            if isinstance(questions_display, list):
-                questions_display = '\n'.join([f"- {q}" for q in questions_display])
-            
-            # Update the DataFrame
-            df.loc[matching_rows, 'Description'] = description
-            df.loc[matching_rows, 'Questions'] = questions_display
-            df.loc[matching_rows, 'Full_Description'] = description
-            df.loc[matching_rows, 'Full_Questions'] = questions if isinstance(questions, str) else json.dumps(questions)
-            df.loc[matching_rows, 'Raw_JSON'] = raw_json
-            
-            processed_count += 1
-            print(f"  Updated information for {csv_filename}")
-            
-        except Exception as e:
-            print(f"  Error processing {json_path}: {e}")
+    # Add columns for description and questions if they don't exist; existing
+    # ones may have been read as numeric when empty, so hold them as text
+    for column in ANALYSIS_COLUMNS:
+        df[column] = df[column].astype(object) if column in df.columns else ''
+    
+    records = load_analyses(json_files, workers)
+    # Analysis files read successfully that have a matching row; files for the same CSV each count
+    processed_count = int(records['csv_filename'].isin(df['Filename']).sum())
+    if len(records) > processed_count:
+        print(f"No matching row found for {len(records) - processed_count} analyzed files")
+    
+    # When several files map to the same CSV, the last one in json_files wins
+    analyses = records.drop_duplicates('csv_filename', keep='last').set_index('csv_filename')
+    
+    # One left join aligns every row with its analysis (if any)
+    merged = df[['Filename']].join(analyses, on='Filename')
+    matched = df['Filename'].isin(analyses.index).to_numpy()
+    df.loc[matched, ANALYSIS_COLUMNS] = merged.loc[matched, ANALYSIS_COLUMNS].to_numpy()
     
     # Save the updated DataFrame
     try:
@@ -125,6 +139,16 @@ def main():
     parser.add_argument('directory', type=str, help='Directory containing JSON files to process')
     parser.add_argument('csv_path', type=str, help='Path to the CSV file to update')
     parser.add_argument('output_path', type=str, help='Path where the updated CSV will be saved')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Threads used to read JSON files (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--runs', action='store_true',
+                        help='Treat the directory as an annotation_runs archive (or one run folder) and only read *.analysis.json in its run folders, oldest run first so newer analyses win')
+    parser.add_argument('--run', action='append', default=None, metavar='RUN_NAME',
+                        help='Only read the named run folder (repeatable); implies --runs')
+    parser.add_argument('--latest-per-table', action='store_true',
+                        help='Only read the newest analysis of each table; implies --runs')
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help='Rebuild the archive\'s analysis_index.json instead of updating it; implies --runs')
     args = parser.parse_args()
     
     # Check if input directory exists
@@ -137,8 +161,16 @@ def main():
         print(f"Error: CSV file '{args.csv_path}' does not exist")
         sys.exit(1)
     
+    # Run-aware discovery lists analysis files from the archive index instead of walking the tree
+    json_files = None
+    if args.runs or args.run or args.latest_per_table or args.rebuild_index:
+        json_files = select_analysis_files(args.directory, runs=args.run,
+                                           latest_per_table=args.latest_per_table,
+                                           rebuild=args.rebuild_index)
+    
     # Process the files
-    process_json_files(args.directory, args.csv_path, args.output_path)
+    process_json_files(args.directory, args.csv_path, args.output_path, workers=args.workers,
+                       json_files=json_files)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import math
+import time
+import zlib
+import argparse
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+
+from analysis_index import update_index, ANALYSIS_SUFFIX
+
+# Index files, kept in this folder at the top of the annotation_runs archive
+INDEX_DIRNAME = 'question_index'
+MATRIX_FILENAME = 'matrix.npz'
+QUESTIONS_FILENAME = 'questions.json'
+
+# Hashed feature space; there is no vocabulary to store or grow, so new runs never change old rows
+N_FEATURES = 2 ** 20
+
+# Word n-grams and character n-grams (within words) used as features
+WORD_NGRAMS = (1, 2)
+CHAR_NGRAMS = (3, 4)
+
+# Bumped when features change; indexes built with another version are rebuilt
+FEATURE_VERSION = 1
+
+QUESTION_CATEGORIES = ('administrative', 'research', 'clinical')
+
+DEFAULT_TOP_K = 5
+
+def question_features(text):
+    """
+    Returns {feature bucket: count} for a question: word unigrams and bigrams plus
+    character 3/4-grams of each word, hashed into N_FEATURES buckets with CRC32
+    (stable across processes, unlike hash())
+    """
+    tokens = re.findall(r'[a-z0-9]+', text.lower())
+    features = []
+    for n in range(WORD_NGRAMS[0], WORD_NGRAMS[1] + 1):
+        features += ['w:' + ' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+    for token in tokens:
+        padded = f'<{token}>'
+        for n in range(CHAR_NGRAMS[0], CHAR_NGRAMS[1] + 1):
+            features += ['c:' + padded[i:i + n] for i in range(len(padded) - n + 1)]
+    return Counter(zlib.crc32(f.encode('utf-8')) % N_FEATURES for f in features)
+
+def count_matrix(questions):
+    """
+    Returns a CSR matrix of sublinear term frequencies (1 + log count), one row per question
+    """
+    indptr, indices, data = [0], [], []
+    for question in questions:
+        features = question_features(question)
+        indices.extend(features.keys())
+        data.extend(1 + math.log(count) for count in features.values())
+        indptr.append(len(indices))
+    return sp.csr_matrix((np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32),
+                          np.array(indptr, dtype=np.int64)), shape=(len(questions), N_FEATURES))
+
+def normalize_question(question):
+    return ' '.join(re.findall(r'[a-z0-9]+', question.lower()))
+
+def read_questions(path):
+    """
+    Yields (category, question) from an .analysis.json file.
+    Category lists may also be '- question' lines from older runs.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            analysis = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading {path}: {e}")
+        return
+    if not isinstance(analysis, dict):
+        return
+
+    for category in QUESTION_CATEGORIES:
+        questions = analysis.get(f'{category}_questions', analysis.get(category, []))
+        if isinstance(questions, str):
+            questions = [line.strip().lstrip('-• ').strip() for line in questions.splitlines()]
+        for question in questions:
+            if isinstance(question, str) and question.strip():
+                yield category, question.strip()
+
+class QuestionIndex:
+    """
+    TF-IDF index of generated questions over hashed n-gram features.
+    Raw term frequencies and document frequencies are stored, so adding questions only
+    appends rows; IDF weights and row norms are recomputed when the index is searched.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.counts = sp.csr_matrix((0, N_FEATURES), dtype=np.float32)
+        self.document_frequency = np.zeros(N_FEATURES, dtype=np.int32)
+        self.entries = []
+        self.runs = {}
+        self.keys = set()
+        self.idf = None
+        self.weighted = None
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Loads a saved index, or returns an empty one if there is none or it was built
+        with different features
+        """
+        index = cls(directory)
+        try:
+            with open(index.directory / QUESTIONS_FILENAME, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            arrays = np.load(index.directory / MATRIX_FILENAME)
+        except (OSError, ValueError):
+            return index
+        if meta.get('feature_version') != FEATURE_VERSION or meta.get('n_features') != N_FEATURES:
+            print('Question index was built with other features; rebuilding')
+            return index
+
+        if arrays['indptr'].size - 1 != len(meta['entries']):
+            print('Question index files do not match; rebuilding')
+            return index
+
+        index.counts = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                     shape=(len(meta['entries']), N_FEATURES))
+        index.document_frequency = arrays['document_frequency']
+        index.entries = meta['entries']
+        index.runs = meta['runs']
+        index.keys = {(e['table'], normalize_question(e['question'])) for e in index.entries}
+        return index
+
+    def save(self):
+        """
+        Writes the matrix, then the question list; each file is replaced atomically
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        matrix_tmp = self.directory / f'.{MATRIX_FILENAME}.tmp.npz'
+        np.savez_compressed(matrix_tmp, data=self.counts.data, indices=self.counts.indices, indptr=self.counts.indptr,
+                 document_frequency=self.document_frequency)
+        os.replace(matrix_tmp, self.directory / MATRIX_FILENAME)
+
+        questions_tmp = self.directory / f'.{QUESTIONS_FILENAME}.tmp'
+        with open(questions_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'feature_version': FEATURE_VERSION, 'n_features': N_FEATURES,
+                       'runs': self.runs, 'entries': self.entries}, f, indent=1)
+        os.replace(questions_tmp, self.directory / QUESTIONS_FILENAME)
+
+    def add(self, entries):
+        """
+        Appends entries ({'question', 'category', 'table', 'run'}) whose question is not
+        indexed yet for the same table. Returns the number added.
+        """
+        new = []
+        for entry in entries:
+            key = (entry['table'], normalize_question(entry['question']))
+            if key not in self.keys:
+                self.keys.add(key)
+                new.append(entry)
+        if not new:
+            return 0
+
+        counts = count_matrix([entry['question'] for entry in new])
+        self.counts = sp.vstack([self.counts, counts], format='csr')
+        self.document_frequency += np.bincount(counts.indices, minlength=N_FEATURES).astype(np.int32)
+        self.entries.extend(new)
+        self.idf = self.weighted = None
+        return len(new)
+
+    def prepare(self):
+        """
+        Computes the IDF weights and the unit-length TF-IDF rows searched against.
+        Done once after loading or adding; search() calls it when needed.
+        The rows are kept column-major, so a query only reads the columns of its own features.
+        """
+        self.idf = (np.log((1 + len(self.entries)) / (1 + self.document_frequency)) + 1).astype(np.float32)
+        self.weighted = self.vectorize(self.counts).tocsc()
+
+    def vectorize(self, counts):
+        """
+        Applies IDF weights to term-frequency rows and scales each row to unit length
+        """
+        weighted = counts.copy()
+        weighted.data *= self.idf[weighted.indices]
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sp.csr_matrix(sp.diags(1 / norms) @ weighted)
+
+    def search(self, query, k=DEFAULT_TOP_K, category=None, table=None):
+        """
+        Returns up to k indexed questions most similar to query (cosine similarity),
+        best first, as entry dicts with a 'score'
+        """
+        if not self.entries:
+            return []
+        if self.weighted is None:
+            self.prepare()
+
+        query_vector = self.vectorize(count_matrix([query]))
+        scores = self.weighted[:, query_vector.indices] @ query_vector.data
+        if category or table:
+            keep = np.array([(not category or e['category'] == category) and (not table or e['table'] == table)
+                             for e in self.entries])
+            scores[~keep] = 0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.entries[i], score=round(float(scores[i]), 4)) for i in top if scores[i] > 0]
+
+def update_question_index(archive, index_dir=None, rebuild=False):
+    """
+    Adds the questions of new or changed run folders in an annotation_runs archive to its
+    question index and saves it. Runs are read oldest first. Returns (index, questions added).
+    """
+    archive = Path(archive)
+    index_dir = Path(index_dir) if index_dir else archive / INDEX_DIRNAME
+    index = QuestionIndex(index_dir) if rebuild else QuestionIndex.load(index_dir)
+
+    added = 0
+    runs = update_index(archive)
+    for run in sorted(runs):
+        if index.runs.get(run) == runs[run]['mtime_ns']:
+            continue
+        entries = [
+            {'question': question, 'category': category, 'table': table, 'run': run}
+            for table in runs[run]['tables']
+            for category, question in read_questions(archive / run / f'{table}{ANALYSIS_SUFFIX}')
+        ]
+        added += index.add(entries)
+        index.runs[run] = runs[run]['mtime_ns']
+
+    index.save()
+    return index, added
+
+def main():
+    parser = argparse.ArgumentParser(description='Index generated analysis questions and look up similar ones')
+    parser.add_argument('archive', type=str, help='annotation_runs folder containing annotation_run_* folders')
+    parser.add_argument('--index-dir', type=str, default=None,
+                        help=f'Where the index is stored (default: <archive>/{INDEX_DIRNAME})')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index from all runs instead of adding new ones')
+    parser.add_argument('--query', type=str, default=None, help='Print the indexed questions most similar to this one')
+    parser.add_argument('-k', type=int, default=DEFAULT_TOP_K, help=f'Number of results (default: {DEFAULT_TOP_K})')
+    parser.add_argument('--category', choices=QUESTION_CATEGORIES, default=None, help='Only return questions of this category')
+    parser.add_argument('--table', type=str, default=None, help='Only return questions about this table')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        index, added = update_question_index(args.archive, args.index_dir, rebuild=args.rebuild)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{len(index.entries)} questions from {len(index.runs)} runs indexed "
+          f"({added} new) in {time.perf_counter() - start:.2f}s")
+
+    if args.query:
+        index.prepare()
+        start = time.perf_counter()
+        results = index.search(args.query, k=args.k, category=args.category, table=args.table)
+        elapsed = time.perf_counter() - start
+        for result in results:
+            print(f"{result['score']:.3f}  [{result['table']}/{result['category']}] {result['question']}")
+        print(f"{len(results)} result(s) in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
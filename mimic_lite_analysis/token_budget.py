@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import math
+import threading
+import contextvars
+from contextlib import contextmanager
+import pandas as pd
+
+# Use tiktoken for exact counts when it is installed; otherwise estimate from characters
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Characters per token assumed when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+# Default token budget for the data sample in a prompt
+DEFAULT_SAMPLE_TOKEN_BUDGET = 6000
+
+# Cell lengths tried, longest first, when truncating long text values
+CELL_CHAR_LIMITS = (200, 80, 30)
+
+# Rows never dropped below this many when shrinking a sample
+MIN_SAMPLE_ROWS = 3
+
+# Columns never dropped below this many when summarizing a wide table
+MIN_SAMPLE_COLUMNS = 5
+
+# USD per million tokens: (prompt, completion). Unknown models get no cost estimate.
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+}
+
+# Batch API requests are billed at half price
+BATCH_PRICE_FACTOR = 0.5
+
+encodings = {}
+encodings_lock = threading.Lock()
+
+def get_encoding(model):
+    """
+    Returns the tiktoken encoding for a model (cl100k_base for unknown models), or None without tiktoken
+    """
+    if tiktoken is None:
+        return None
+    with encodings_lock:
+        if model not in encodings:
+            try:
+                encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encodings[model] = tiktoken.get_encoding('cl100k_base')
+        return encodings[model]
+
+def count_tokens(text, model='gpt-4o-mini'):
+    """
+    Returns the number of tokens in text: exact with tiktoken, otherwise estimated
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages, model='gpt-4o-mini'):
+    """
+    Returns the prompt tokens of a chat request, including the few tokens of per-message overhead
+    """
+    return sum(count_tokens(m['content'], model) + 4 for m in messages) + 3
+
+def estimate_cost(model, prompt_tokens, completion_tokens, batch=False):
+    """
+    Returns the estimated cost in USD, or None for models without a known price
+    """
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    cost = (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1000000
+    return cost * BATCH_PRICE_FACTOR if batch else cost
+
+def truncate_cells(df, max_chars):
+    """
+    Returns a copy of df with text values longer than max_chars cut short
+    """
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column]):
+            df[column] = df[column].map(
+                lambda v: v[:max_chars - 1] + '…' if isinstance(v, str) and len(v) > max_chars else v
+            )
+    return df
+
+def fit_to_budget(df, render, budget, model='gpt-4o-mini'):
+    """
+    Renders a sample DataFrame with render(df, note) and shrinks it until it fits
+    in budget tokens, in order: truncate long cells, drop rows, show fewer columns
+    (noting how many are hidden), and finally cut the text.
+    Returns (text, tokens, actions) where actions lists what was done.
+    """
+    actions = []
+    text = render(df, '')
+    tokens = count_tokens(text, model)
+    if budget is None or tokens <= budget:
+        return text, tokens, actions
+
+    def attempt(candidate, note=''):
+        candidate_text = render(candidate, note)
+        return candidate_text, count_tokens(candidate_text, model)
+
+    # 1. Truncate long cells
+    truncated_to = None
+    for max_chars in CELL_CHAR_LIMITS:
+        truncated = truncate_cells(df, max_chars)
+        candidate_text, candidate_tokens = attempt(truncated)
+        if candidate_tokens < tokens:
+            df, text, tokens, truncated_to = truncated, candidate_text, candidate_tokens, max_chars
+        if tokens <= budget:
+            break
+    if truncated_to is not None:
+        actions.append(f'cells truncated to {truncated_to} chars')
+    if tokens <= budget:
+        return text, tokens, actions
+
+    # 2. Drop rows
+    rows = len(df)
+    while tokens > budget and rows > MIN_SAMPLE_ROWS:
+        rows = max(MIN_SAMPLE_ROWS, rows // 2)
+        text, tokens = attempt(df.head(rows))
+    if rows < len(df):
+        actions.append(f'rows reduced to {rows}')
+        df = df.head(rows)
+    if tokens <= budget:
+        return text, tokens, actions
+
+    # 3. Summarize wide tables: rows show only the first columns
+    total_columns = columns = len(df.columns)
+    while tokens > budget and columns > MIN_SAMPLE_COLUMNS:
+        columns = max(MIN_SAMPLE_COLUMNS, columns // 2)
+        text, tokens = attempt(df.iloc[:, :columns],
+                               f'(rows show the first {columns} of {total_columns} columns)')
+    if columns < total_columns:
+        actions.append(f'rows limited to {columns} of {total_columns} columns')
+    if tokens <= budget:
+        return text, tokens, actions
+
+    # 4. Last resort: cut the text itself
+    max_chars = max(1, int(len(text) * budget / tokens))
+    while tokens > budget and max_chars > 1:
+        text = text[:max_chars] + '\n[truncated]'
+        tokens = count_tokens(text, model)
+        max_chars = int(max_chars * 0.9)
+    actions.append('text cut to fit')
+    return text, tokens, actions
+
+class UsageTracker:
+    """
+    Accumulates the prompt and completion tokens of the requests made for one file
+    """
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests = 0
+        self.cached = 0
+        self.lock = threading.Lock()
+
+    def add(self, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.requests += 1
+
+    def add_cached(self):
+        with self.lock:
+            self.cached += 1
+
+    def summary_fields(self, model, batch=False):
+        """
+        Returns the token and cost columns of a summary row
+        """
+        cost = estimate_cost(model, self.prompt_tokens, self.completion_tokens, batch=batch)
+        return {
+            'Prompt Tokens': self.prompt_tokens,
+            'Completion Tokens': self.completion_tokens,
+            'Estimated Cost (USD)': round(cost, 6) if cost is not None else '',
+        }
+
+# Tracker of the file currently being analyzed in this thread/context
+current_usage = contextvars.ContextVar('current_usage', default=None)
+
+@contextmanager
+def track_usage():
+    """
+    Records the token usage of all requests made inside the block
+    """
+    tracker = UsageTracker()
+    token = current_usage.set(tracker)
+    try:
+        yield tracker
+    finally:
+        current_usage.reset(token)
+
+def record_usage(prompt_tokens, completion_tokens):
+    """
+    Adds a request's usage to the active tracker, if any
+    """
+    tracker = current_usage.get()
+    if tracker is not None:
+        tracker.add(prompt_tokens, completion_tokens)
+
+def record_cached():
+    """
+    Notes a request answered from the cache (no tokens billed) on the active tracker
+    """
+    tracker = current_usage.get()
+    if tracker is not None:
+        tracker.add_cached()
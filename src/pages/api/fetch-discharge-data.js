@@ -1,5 +1,6 @@
 import Database from "better-sqlite3";
 import path from "path";
+import fs from "fs";
 
 export default async function handler(req, res) {
   try {
@@ -12,7 +13,14 @@ export default async function handler(req, res) {
 
     // Connect to the dc_data.db database
     const dbPath = path.resolve(process.cwd(), "db", "dc_data.db");
-    const db = new Database(dbPath);
+    // Prefer the read-only snapshot built by db/finalize_db.py when there is one
+    const snapshotPath = path.resolve(process.cwd(), "db", "dc_data.readonly.db");
+    const db = fs.existsSync(snapshotPath)
+      ? new Database(snapshotPath, { readonly: true, fileMustExist: true })
+      : new Database(dbPath);
+    if (db.readonly) {
+      db.pragma("mmap_size = 1073741824");
+    }
 
     try {
       // Prepare the query
@@ -457,7 +457,14 @@ export default async function handler(req, res) {
 
     // Execute the generated SQL query against the database
     const dbPath = path.resolve(process.cwd(), "db", "data.db");
-    const db = new Database(dbPath);
+    // Prefer the read-only snapshot built by db/finalize_db.py when there is one
+    const snapshotPath = path.resolve(process.cwd(), "db", "data.readonly.db");
+    const db = fs.existsSync(snapshotPath)
+      ? new Database(snapshotPath, { readonly: true, fileMustExist: true })
+      : new Database(dbPath);
+    if (db.readonly) {
+      db.pragma("mmap_size = 1073741824");
+    }
 
     try {
       // Execute the SQL query
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'mimic_lite_analysis'))
+import hospital_data_analyzer
+from column_profile import profile_csv, render_profile
+from token_budget import count_tokens
+
+NOTE = ' '.join(['Patient presented with shortness of breath and was treated with IV antibiotics.'] * 40)
+
+def write_notes(path, rows=50):
+    lines = ['note_id,subject_id,hadm_id,text']
+    lines += [f'{10000032 + i}-DS-1,{10000032 + i},{22595853 + i},"{NOTE} {i}"' for i in range(rows)]
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+def test_render_profile_prints_whole_numbers_exactly(tmp_path):
+    rendered = render_profile(profile_csv(write_notes(tmp_path / 'discharge.csv')))
+
+    subject_line = next(line for line in rendered.splitlines() if line.startswith('- subject_id'))
+    assert 'range 10000032..10000081' in subject_line
+    assert 'e+' not in rendered
+
+def test_profile_prompt_is_smaller_than_rows_prompt_for_long_text(tmp_path, monkeypatch):
+    path = write_notes(tmp_path / 'discharge.csv')
+    monkeypatch.setattr(hospital_data_analyzer, 'profile_columns', False)
+
+    tokens = {}
+    for style in ('rows', 'profile'):
+        monkeypatch.setattr(hospital_data_analyzer, 'prompt_style', style)
+        data_sample, _ = hospital_data_analyzer.build_data_sample(path)
+        tokens[style] = count_tokens(data_sample)
+
+    assert tokens['profile'] < tokens['rows']
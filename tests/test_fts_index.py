@@ -0,0 +1,59 @@
+import sys
+import subprocess
+import sqlite3
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'db'))
+from fts_index import build_fts_index, fts_table_name, plan_fts_update, search
+
+IMPORT_SCRIPT = Path(__file__).resolve().parent.parent / 'db' / 'import_csvs.py'
+
+NOTES = [
+    ('1-DS-1', 'Admitted with urinary tract infections, started on antibiotics.'),
+    ('2-DS-1', 'Elective knee replacement, uneventful recovery.'),
+    ('3-DS-1', 'Pneumonia; chest x-ray shows a right lower lobe infection.'),
+    ('4-DS-1', 'Chest pain ruled out for myocardial infarction.'),
+]
+
+def note_ids(results):
+    return sorted(result['note_id'] for result in results)
+
+def test_import_builds_fts_index_over_text_columns(tmp_path):
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    (csv_dir / 'discharge.csv').write_text(
+        'note_id,subject_id,text\n' + ''.join(f'{note_id},{i},"{text}"\n' for i, (note_id, text) in enumerate(NOTES))
+    )
+    db_path = tmp_path / 'test.db'
+
+    def run_import():
+        return subprocess.run([sys.executable, str(IMPORT_SCRIPT), '--csv-dir', str(csv_dir), '--db', str(db_path),
+                               '--incremental', '--type-overrides', '', '--fts', 'discharge:text'],
+                              capture_output=True, text=True, check=True).stdout
+
+    run_import()
+    conn = sqlite3.connect(db_path)
+    assert [row[1] for row in conn.execute(f'PRAGMA table_info({fts_table_name("discharge")})')] == ['text']
+    assert note_ids(search(conn, 'discharge', 'infection')) == ['1-DS-1', '3-DS-1']
+    assert note_ids(search(conn, 'discharge', 'chest infection')) == ['3-DS-1']
+    assert note_ids(search(conn, 'discharge', 'chest NOT pneumonia', raw=True)) == ['4-DS-1']
+    conn.close()
+
+    # Tracked by the import manifest, so an unchanged table is not indexed again
+    assert 'discharge_fts is up to date' in run_import()
+
+def test_tables_without_csv_hash_are_always_rebuilt(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'test.db', isolation_level=None)
+    conn.execute('CREATE TABLE notes (note_id TEXT, text TEXT)')
+    conn.executemany('INSERT INTO notes VALUES (?, ?)', NOTES)
+
+    assert build_fts_index(conn, 'notes', ['text']) == 'rebuild'
+
+    # Edit a row between the first and last, which the edge hash does not cover
+    conn.execute("UPDATE notes SET text = 'Discharged after sepsis treatment.' WHERE note_id = '2-DS-1'")
+    assert plan_fts_update(conn, 'notes', ['text']) == ('rebuild', None)
+    assert build_fts_index(conn, 'notes', ['text']) == 'rebuild'
+
+    assert note_ids(search(conn, 'notes', 'sepsis')) == ['2-DS-1']
+    assert search(conn, 'notes', 'knee') == []
+    conn.close()
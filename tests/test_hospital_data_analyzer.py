@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'mimic_lite_analysis'))
+import hospital_data_analyzer
+from hospital_data_analyzer import LocalBatchClient, SummaryWriter, chat_completion, load_previous_summary, scan_directory
+from llm_backends import FakeBackend
+
+def write_inputs(data_dir, files=3):
+    data_dir.mkdir()
+    for i in range(files):
+        (data_dir / f'table{i}.csv').write_text('subject_id,hadm_id\n' + ''.join(f'{j},{100 + j}\n' for j in range(5)))
+
+def run_analysis(data_dir, run_folder, failure_rate, batch, previous=None):
+    """
+    Analyzes data_dir with the fake backend and returns the summary DataFrame
+    """
+    hospital_data_analyzer.backend = FakeBackend(failure_rate=failure_rate)
+    batch_client = None
+    if batch:
+        batch_client = LocalBatchClient(
+            responder=lambda body: chat_completion(body['messages'], body['temperature'], body['model'],
+                                                  body.get('response_format')),
+            storage_dir=run_folder / 'batches' / 'local_files'
+        )
+    summary = SummaryWriter(run_folder)
+    try:
+        _, summary_df = scan_directory(data_dir, run_folder, summary, previous=previous, batch_client=batch_client)
+    finally:
+        summary.close()
+    return summary_df
+
+@pytest.mark.parametrize('mode', ['chained', 'single'])
+@pytest.mark.parametrize('batch', [False, True])
+def test_resume_retries_files_whose_annotation_failed(tmp_path, monkeypatch, mode, batch):
+    monkeypatch.setattr(hospital_data_analyzer, 'MAX_RETRIES', 0)
+    monkeypatch.setattr(hospital_data_analyzer, 'annotation_mode', mode)
+    monkeypatch.setattr(hospital_data_analyzer, 'batch_poll_interval', 0)
+    monkeypatch.setattr(hospital_data_analyzer, 'backend', None)
+    data_dir = tmp_path / 'data'
+    write_inputs(data_dir)
+    run_folder = tmp_path / 'run'
+    run_folder.mkdir()
+
+    failed = run_analysis(data_dir, run_folder, failure_rate=1.0, batch=batch)
+    assert list(failed['File Type']) == ['CSV (Error)'] * 3
+    assert all(description.startswith('Error generating') for description in failed['Description'])
+
+    resumed = run_analysis(data_dir, run_folder, failure_rate=0.0, batch=batch,
+                           previous=load_previous_summary(run_folder))
+    assert list(resumed['File Type']) == ['CSV'] * 3
+    assert not any(description.startswith('Error generating') for description in resumed['Description'])
+    assert hospital_data_analyzer.backend.calls > 0
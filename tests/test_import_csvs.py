@@ -0,0 +1,105 @@
+import sys
+import subprocess
+import sqlite3
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'db'))
+from import_csvs import import_tables_parallel, import_table_streaming, infer_column_types
+
+def write_csv(path, header, rows):
+    path.write_text('\n'.join([header] + rows) + '\n')
+    return path
+
+def csv_files(tmp_path):
+    """
+    A bad table with more batches than the queue holds, so its worker is still blocked
+    on put when the writer gives up on it, and a good table next to it
+    """
+    bad = write_csv(tmp_path / 'bad.csv', 'a,b', [f'{i},x' for i in range(500)])
+    ok = write_csv(tmp_path / 'ok.csv', 'x,y', [f'{i},y' for i in range(300)])
+    return [('bad.csv', 'bad', str(bad)), ('ok.csv', 'ok', str(ok))]
+
+def test_parallel_import_skips_table_failing_in_writer(tmp_path):
+    db_path = tmp_path / 'test.db'
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    # create_table cannot drop a view, so the writer fails on the 'start' message of bad
+    conn.execute('CREATE VIEW bad AS SELECT 1')
+
+    imported = import_tables_parallel(conn, csv_files(tmp_path), workers=2, batch_size=10)
+
+    assert imported == ['ok']
+    assert conn.execute('SELECT count(*) FROM ok').fetchone()[0] == 300
+    assert not conn.in_transaction
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 2
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    conn.close()
+
+def test_parallel_import_skips_table_failing_in_on_table_done(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'test.db', isolation_level=None)
+
+    def on_table_done(table_name, row_count):
+        if table_name == 'bad':
+            raise RuntimeError('swap failed')
+
+    imported = import_tables_parallel(conn, csv_files(tmp_path), workers=2, batch_size=10,
+                                      on_table_done=on_table_done)
+
+    assert imported == ['ok']
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 2
+    conn.close()
+
+def test_typed_import_keeps_zero_padded_codes_and_stores_nulls(tmp_path):
+    path = write_csv(tmp_path / 'codes.csv', 'icd_code,valuenum,hadm_id',
+                     ['0010,1.5,100', '0420,,101', '4019,2,'])
+    column_types = infer_column_types(str(path), 'codes')
+    assert column_types == {'icd_code': 'TEXT', 'valuenum': 'REAL', 'hadm_id': 'INTEGER'}
+
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    import_table_streaming(conn, str(path), 'codes', column_types=column_types)
+
+    assert conn.execute('SELECT icd_code, valuenum, hadm_id FROM codes ORDER BY rowid').fetchall() == [
+        ('0010', 1.5, 100), ('0420', None, 101), ('4019', 2.0, None),
+    ]
+
+IMPORT_SCRIPT = Path(__file__).resolve().parent.parent / 'db' / 'import_csvs.py'
+
+def run_incremental_import(csv_dir, db_path, *args):
+    """
+    Runs import_csvs.py --incremental and returns the tables it rebuilt
+    """
+    result = subprocess.run([sys.executable, str(IMPORT_SCRIPT), '--csv-dir', str(csv_dir), '--db', str(db_path),
+                             '--incremental', '--type-overrides', '', *args],
+                            capture_output=True, text=True, check=True)
+    return sorted(line.split('table: ')[1] for line in result.stdout.splitlines()
+                  if line.startswith('✅ Imported table: '))
+
+def test_incremental_import_rebuilds_only_changed_tables(tmp_path):
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    write_csv(csv_dir / 'admissions.csv', 'subject_id,hadm_id', ['1,100', '2,200'])
+    write_csv(csv_dir / 'labevents.csv', 'itemid,value', ['50912,1.0'])
+    db_path = tmp_path / 'test.db'
+
+    assert run_incremental_import(csv_dir, db_path) == ['admissions', 'labevents']
+    assert run_incremental_import(csv_dir, db_path) == []
+
+    write_csv(csv_dir / 'admissions.csv', 'subject_id,hadm_id', ['1,100', '2,200', '3,300'])
+    assert run_incremental_import(csv_dir, db_path) == ['admissions']
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT count(*) FROM admissions').fetchone()[0] == 3
+    conn.close()
+
+def test_incremental_import_rebuilds_when_options_change(tmp_path):
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    write_csv(csv_dir / 'labevents.csv', 'itemid,value', ['50912,1.0'])
+    db_path = tmp_path / 'test.db'
+
+    assert run_incremental_import(csv_dir, db_path) == ['labevents']
+    assert run_incremental_import(csv_dir, db_path, '--typed') == ['labevents']
+    assert run_incremental_import(csv_dir, db_path, '--typed') == []
+
+    conn = sqlite3.connect(db_path)
+    assert [row[2] for row in conn.execute('PRAGMA table_info(labevents)')] == ['INTEGER', 'REAL']
+    conn.close()